@@ -9,15 +9,39 @@ __version__ = "0.1.0"  # 项目版本号
 __author__ = "your-name-here"  # 作者名称
 __license__ = "MIT"  # 开源协议
 
-# 导入核心模块
-from agents.plan_agent import PlanAgent
-from agents.data_query_agent import DataQueryAgent
-from agents.rule_config_agent import RuleConfigAgent
-from agents.rule_executor_agent import RuleExecutorAgent
-from utils.context_manager import ContextManager
-from utils.logger import logger
-from utils.database import Database
-from utils.llm_utils import LLMClient
-
-# 主程序入口
-from main import main
\ No newline at end of file
+import importlib
+
+# 核心模块在首次访问时才导入（PEP 562），导入包本身不会加载代理、数据库驱动和大模型客户端
+_LAZY_IMPORTS = {
+    'PlanAgent': 'agents.plan_agent',
+    'DataQueryAgent': 'agents.data_query_agent',
+    'RuleConfigAgent': 'agents.rule_config_agent',
+    'RuleExecutorAgent': 'agents.rule_executor_agent',
+    'ContextManager': 'utils.context_manager',
+    'logger': 'utils.logger',
+    'Database': 'utils.database',
+    'AsyncDatabase': 'utils.database',
+    'LLMClient': 'utils.llm_utils',
+    'AsyncLLMClient': 'utils.llm_utils',
+    'QueryPipeline': 'pipeline',
+    'AsyncQueryPipeline': 'pipeline',
+    'QueryService': 'server',
+    'QueryServer': 'server',
+    # 主程序入口
+    'main': 'main',
+}
+
+__all__ = list(_LAZY_IMPORTS)
+
+
+def __getattr__(name):
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
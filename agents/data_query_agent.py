@@ -1,165 +1,339 @@
-import logging
+import asyncio
 from utils.logger import logger
-from utils.database import Database  # 添加缺失的导入
-from utils.llm_utils import LLMClient  # 添加缺失的导入
+from utils.database import Database, AsyncDatabase  # 添加缺失的导入
+from utils.llm_utils import LLMClient, AsyncLLMClient  # 添加缺失的导入
+from utils.schema_retriever import get_schema_retriever
+from utils.sql_guard import get_sql_guard, SQLGuardError
+from utils.result_digest import ResultDigest, create_result_digest
+from utils.tracing import get_tracer
+from utils.lazy import lazy_property
 
 logger.debug("Initializing DataQueryAgent module")
 
+
 class DataQueryAgent:
     """
     负责将自然语言查询转换为 SQL 查询并返回结果。
 
     属性:
-        db (Database): 数据库连接实例
-        llm (LLMClient): 大模型客户端实例
+        db (Database): 数据库连接实例，首次使用时创建
+        llm (LLMClient): 大模型客户端实例，首次使用时创建
+        similar_questions (SimilarityIndex): 共享的相似问题索引，未启用时为 None
+        schema_retriever (SchemaRetriever): 共享的表结构检索器，未启用时为 None
+        sql_guard (SQLGuard): 共享的 SQL 安全检查，执行前限制返回行数并按 EXPLAIN 估计的扫描行数拒绝或降级查询
+        tracer (Tracer): 共享的追踪器，记录表结构获取、SQL 生成、执行和回答生成各阶段的耗时
 
     方法:
         handle_query: 处理用户输入的自然语言查询，生成并执行 SQL，返回格式化结果
+        select_relevant_schema: 只保留与问题相关的表，缩小生成 SQL 的提示词
+        build_answer_prompt: 用结果摘要构建生成自然语言回答的提示词
         format_natural_language_response: 将 SQL 查询结果格式化为自然语言回答
         generate_natural_language: 使用大模型生成自然语言回答
+        stream_natural_language: 流式生成自然语言回答并逐段交给回调
+        explain_sql: 执行 EXPLAIN，供 SQL 安全检查估计扫描行数
         escape_special_characters: 转义 SQL 中的特殊字符
         extract_params_from_sql: 提取 SQL 中的参数
     """
 
-    def __init__(self):
+    def __init__(self, db=None, llm=None):
+        """
+        初始化 DataQueryAgent 实例，绑定共享数据库连接池和 LLM 客户端。
+
+        未传入的依赖在首次处理查询时才创建，构造代理本身不读取配置、不连接数据库。
+
+        参数:
+            db (Database, optional): 数据库操作对象，默认新建一个（共享连接池）。
+            llm (LLMClient, optional): 大模型客户端，默认新建一个。
         """
-        初始化 DataQueryAgent 实例，建立数据库连接和 LLM 客户端。
+        if db is not None:
+            self.db = db
+        if llm is not None:
+            self.llm = llm
+        self.tracer = get_tracer()
+
+    @lazy_property
+    def db(self):
+        return Database()
+
+    @lazy_property
+    def llm(self):
+        return LLMClient()
+
+    @lazy_property
+    def similar_questions(self):
+        # 相似问题索引依赖 numpy，在首次查询时才导入
+        from utils.similarity_cache import get_similarity_index
+        return get_similarity_index()
+
+    @lazy_property
+    def schema_retriever(self):
+        return get_schema_retriever()
+
+    @lazy_property
+    def sql_guard(self):
+        return get_sql_guard()
+
+    def handle_query(self, user_input, table_schema=None, on_chunk=None):
         """
-        self.db = Database()
-        self.llm = LLMClient()
+        处理自然语言查询：生成 SQL、执行并生成自然语言回答。
 
-    def handle_query(self, user_input):
+        参数:
+            user_input (str): 用户输入（已经过上下文扩展）。
+            table_schema (dict, optional): 预先获取的表结构，为 None 时从缓存获取。
+            on_chunk (callable, optional): 指定时流式生成回答，每收到一个片段调用一次 on_chunk(片段)；
+                只有大模型生成的回答会经由 on_chunk 输出，错误提示等只作为返回值。
+
+        返回:
+            str: 完整的自然语言回答或错误提示。
+        """
         # 获取表结构信息
-        table_schema = self.db.get_table_schema()
-        
+        if table_schema is None:
+            with self.tracer.span("schema.fetch") as span:
+                table_schema = self.db.get_table_schema()
+                span.set(tables=len(table_schema or {}))
+
         # 记录表结构信息
-        logger.debug(f"获取到的表结构: {table_schema}")
-        
-        # 调用大模型生成SQL
-        logger.info("调用LLM生成SQL")
-        logger.debug(f"传给LLM的提示词: {user_input}")
-        
-        raw_sql = self.llm.generate_sql(user_input, table_schema)
-        
+        logger.debug("获取到的表结构: %s", table_schema)
+
+        # 先查找相似的已回答问题，命中则复用其已验证的SQL
+        match = None
+        prompt_schema = table_schema
+        if self.similar_questions is not None:
+            with self.tracer.span("similarity.lookup") as span:
+                match = self.similar_questions.lookup(user_input, table_schema)
+                span.set(hit=bool(match))
+            self.tracer.count("cache_lookups", cache="similarity", result="hit" if match else "miss")
+        if match:
+            raw_sql, score, matched_question = match
+            logger.info("命中相似问题缓存（相似度 %.2f，原问题: %s），跳过SQL生成", score, matched_question)
+        else:
+            # 调用大模型生成SQL
+            logger.info("调用LLM生成SQL")
+            logger.debug("传给LLM的提示词: %s", user_input)
+
+            # 只把相关的表放进提示词
+            with self.tracer.span("schema.select") as span:
+                prompt_schema = self.select_relevant_schema(user_input, table_schema)
+                span.set(tables=len(prompt_schema or {}))
+            with self.tracer.span("sql.generate") as span:
+                raw_sql = self.llm.generate_sql(user_input, prompt_schema)
+                span.set(sql_chars=len(raw_sql or ""))
+                if not raw_sql:
+                    span.fail("无法生成有效的SQL语句")
+
         if not raw_sql:
             logger.warning("无法生成有效的SQL语句")
             return "无法生成有效的SQL语句，请重新描述您的查询需求。"
-        
-        # 打印原始生成的SQL，便于调试
-        logger.info(f"Raw SQL generated: {raw_sql}")
 
-        # 新增：转义SQL中的特殊字符
-        raw_sql = self.escape_special_characters(raw_sql)
+        # 打印原始生成的SQL，便于调试
+        logger.info("Raw SQL generated: %s", raw_sql)
+        validated_sql = raw_sql
 
         try:
             # 解析SQL并提取参数
             params = self.extract_params_from_sql(raw_sql)
-            
-            # 如果用户问的是"分别是哪几张"，则执行单独的表名查询
-            if "分别" in user_input and "哪几张" in user_input:
-                results = self.db.query("SELECT table_name FROM information_schema.tables WHERE table_schema = DATABASE()")
-            # 如果用户问的是"有多少张表"，则执行单独的表数量查询
-            elif "多少张表" in user_input or "多少个表" in user_input:
-                results = self.db.query("SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = DATABASE()")
-            # 否则执行原来的查询
-            else:
-                results = self.db.query(raw_sql, params)
-            
-            # 构建自然语言输出
-            prompt = f"用户输入: {user_input}\nSQL查询结果: {results}"
-            
+
+            # 查询结果直接汇总为摘要，不在内存中保留全部行
+            results = create_result_digest()
+
+            with self.tracer.span("sql.execute") as span:
+                # 如果用户问的是"分别是哪几张"，则执行单独的表名查询
+                if "分别" in user_input and "哪几张" in user_input:
+                    results.add_rows(self.db.query("SELECT table_name FROM information_schema.tables WHERE table_schema = DATABASE()"))
+                # 如果用户问的是"有多少张表"，则执行单独的表数量查询
+                elif "多少张表" in user_input or "多少个表" in user_input:
+                    results.add_rows(self.db.query("SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = DATABASE()"))
+                # 否则以服务端游标分批执行原来的查询
+                else:
+                    # 执行前检查：只读、限制返回行数、按 EXPLAIN 估计的扫描行数拒绝或降级
+                    with self.tracer.span("sql.guard") as guard_span:
+                        guarded = self.sql_guard.check(raw_sql, explain=self.explain_sql)
+                        guard_span.set(limit=guarded.limit, limited=guarded.limited,
+                                       explain_rows=guarded.explain_rows, downgraded=guarded.downgraded)
+                    self.tracer.count("sql_guard", result="downgraded" if guarded.downgraded else "limited" if guarded.limited else "passed")
+                    if guarded.sql != raw_sql:
+                        logger.info("SQL经安全检查改写为: %s", guarded.sql)
+                    # 多读一行：只有超过行数上限时才算截断，恰好 max_rows 行的结果完整读完并正常归还连接；
+                    # 安全检查加上（或收紧）的 LIMIT 同样多取了一行，取两者中较小的作为上限
+                    max_rows = self.db.stream_config['max_rows']
+                    if guarded.limited and (max_rows <= 0 or guarded.limit < max_rows):
+                        max_rows = guarded.limit
+                    probe_rows = max_rows + 1 if max_rows > 0 else max_rows
+                    # 转义SQL中的特殊字符
+                    for batch in self.db.stream(self.escape_special_characters(guarded.sql), params, max_rows=probe_rows):
+                        if 0 < max_rows < results.row_count + len(batch):
+                            batch = batch[:max_rows - results.row_count]
+                            results.truncated = True
+                        results.add_rows(batch)
+                    # 执行成功的SQL加入相似问题索引，供改写后的同类问题复用
+                    if self.similar_questions is not None and not match:
+                        self.similar_questions.add(user_input, validated_sql, table_schema)
+                span.set(rows=results.row_count, truncated=results.truncated)
+
+            # 构建自然语言输出：只传大小固定的结果摘要，而不是全部行
+            prompt = self.build_answer_prompt(user_input, results)
+
             # 使用LLM生成自然语言回答
-            try:
-                llm_response = self.llm.generate_natural_language(prompt)
-                logger.info(f"LLM生成的自然语言回答: {llm_response}")
-                return llm_response
-            except Exception as e:
-                logger.error(f"使用LLM生成自然语言时出错: {str(e)}")
-                return "无法生成自然语言回答，请查看原始表格数据。"
+            with self.tracer.span("answer.generate", prompt_chars=len(prompt), stream=on_chunk is not None) as span:
+                try:
+                    if on_chunk is None:
+                        llm_response = self.llm.generate_natural_language(prompt)
+                    else:
+                        llm_response = self.stream_natural_language(prompt, on_chunk)
+                    logger.info("LLM生成的自然语言回答: %s", llm_response)
+                    span.set(response_chars=len(llm_response))
+                    return llm_response
+                except Exception as e:
+                    logger.error("使用LLM生成自然语言时出错: %s", e)
+                    span.fail(str(e))
+                    return "无法生成自然语言回答，请查看原始表格数据。"
 
+        except SQLGuardError as e:
+            # 未通过检查的SQL同样不应继续留在缓存中
+            logger.warning("SQL未通过安全检查: %s", e)
+            self.tracer.count("sql_guard", result="rejected")
+            self.llm.forget_sql(user_input, prompt_schema)
+            if self.similar_questions is not None:
+                self.similar_questions.discard(validated_sql)
+            return f"SQL未通过安全检查：{str(e)}"
         except Exception as e:
+            # 执行失败的SQL不应继续留在缓存中
+            self.llm.forget_sql(user_input, prompt_schema)
+            if self.similar_questions is not None:
+                self.similar_questions.discard(validated_sql)
             return f"执行SQL时出错：{str(e)}"
 
+    def select_relevant_schema(self, user_input, table_schema):
+        """
+        只保留与问题相关的表，缩小生成SQL的提示词。
+
+        参数:
+            user_input (str): 用户输入。
+            table_schema (dict): 完整表结构。
+
+        返回:
+            dict: 裁剪后的表结构；检索器未启用或无命中时返回完整表结构。
+        """
+        if self.schema_retriever is None or not table_schema:
+            return table_schema
+        try:
+            comments = self.db.get_schema_comments()
+        except Exception as e:
+            logger.warning("获取表注释失败，仅按表名和列名检索: %s", e)
+            comments = None
+        pruned_schema, report = self.schema_retriever.select(user_input, table_schema, comments)
+        logger.debug("表结构裁剪结果: %s", report)
+        return pruned_schema
+
+    def build_answer_prompt(self, user_input, results):
+        """
+        构建生成自然语言回答的提示词。
+
+        查询结果先在本地汇总为摘要（行数、列类型、数值统计、高频值和首尾样例），
+        提示词大小与结果行数无关。
+
+        参数:
+            user_input (str): 用户输入。
+            results (list | ResultDigest): 查询结果（字典列表）或已汇总的摘要。
+
+        返回:
+            str: 提示词。
+        """
+        if isinstance(results, ResultDigest):
+            digest = results
+        else:
+            digest = create_result_digest()
+            digest.add_rows(results)
+        return f"用户输入: {user_input}\nSQL查询结果: {digest.to_prompt_text()}"
+
     def format_natural_language_response(self, user_input, results):
         """将SQL执行结果格式化为自然语言回答"""
         if not results:
             logger.debug("查询结果为空")
             return "未找到匹配的数据。"
-        
+
         # 记录完整的用户输入和结果，便于调试
-        logger.debug(f"原始用户输入: {user_input}")
-        logger.debug(f"查询结果: {results}")
-        
+        logger.debug("原始用户输入: %s", user_input)
+        logger.debug("查询结果: %s", results)
+
         # 构建自然语言输出
-        prompt = f"用户输入: {user_input}\nSQL查询结果: {results}"
-        
+        prompt = self.build_answer_prompt(user_input, results)
+
         # 使用LLM生成自然语言回答
         try:
             llm_response = self.generate_natural_language(prompt)
-            logger.info(f"LLM生成的自然语言回答: {llm_response}")
+            logger.info("LLM生成的自然语言回答: %s", llm_response)
             return llm_response
         except Exception as e:
-            logger.error(f"使用LLM生成自然语言时出错: {str(e)}")
+            logger.error("使用LLM生成自然语言时出错: %s", e)
             return "无法生成自然语言回答，请查看原始表格数据。"
 
     def generate_natural_language(self, prompt):
         """
-        使用大模型生成自然语言回答。
-        
+        使用大模型生成自然语言回答，委托给 LLMClient 的共享传输层。
+
         参数:
             prompt (str): 包含用户输入和SQL查询结果的提示词。
-        
+
         返回:
             str: 生成的自然语言回答。
         """
-        payload = {
-            "model": "qwen-max",
-            "input": {
-                "prompt": f"""
-                根据以下信息生成自然语言的回答：
-                {prompt}
-                
-                请确保回答通顺、易于理解，并符合中文表达习惯。
-                不要使用代码块或特殊格式，只返回自然语言描述。
-                """
-            }
-        }
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        response = requests.post(self.base_url, json=payload, headers=headers)
-        if response.status_code == 200:
-            return response.json()['output']['text'].strip()
-        else:
-            logger.error(f"API调用失败，状态码: {response.status_code}")
-            return "无法生成自然语言回答。"
+        return self.llm.generate_natural_language(prompt)
+
+    def stream_natural_language(self, prompt, on_chunk):
+        """
+        流式生成自然语言回答：每个片段到达后交给 on_chunk，同时拼接完整回答。
+
+        参数:
+            prompt (str): 包含用户输入和SQL查询结果的提示词。
+            on_chunk (callable): 接收回答片段的回调，如逐段打印。
+
+        返回:
+            str: 完整的自然语言回答（用于更新上下文和记录日志）。
+        """
+        chunks = []
+        for chunk in self.llm.stream_natural_language(prompt):
+            chunks.append(chunk)
+            on_chunk(chunk)
+        return "".join(chunks)
 
     def handle_rule_config(self, user_input):
         """
         处理规则配置相关的请求。
-        
+
         参数:
             user_input (str): 用户输入的自然语言描述。
-        
+
         返回:
             str: 生成的自然语言回答。
         """
         logger.info("处理规则配置请求")
-        logger.debug(f"用户输入: {user_input}")
-        
+        logger.debug("用户输入: %s", user_input)
+
         # 示例逻辑：返回固定的规则配置信息
         rule_config_info = "规则配置功能正在开发中，当前暂不支持实际操作。"
-        logger.info(f"规则配置响应: {rule_config_info}")
+        logger.info("规则配置响应: %s", rule_config_info)
         return rule_config_info
 
+    def explain_sql(self, sql):
+        """
+        执行 EXPLAIN，供 SQL 安全检查估计扫描行数。
+
+        参数:
+            sql (str): 要估计的 SQL 语句（未转义）。
+
+        返回:
+            list: EXPLAIN 的结果行。
+        """
+        return self.db.query("EXPLAIN " + self.escape_special_characters(sql))
+
     def escape_special_characters(self, sql):
         """
         转义SQL中的特殊字符，如%，_等。
-        
+
         参数:
             sql (str): 原始SQL语句。
-        
+
         返回:
             str: 转义后的SQL语句。
         """
@@ -169,10 +343,48 @@ class DataQueryAgent:
     def extract_params_from_sql(self, sql):
         """
         提取SQL中的参数。
-        
+
         参数:
             sql (str): 原始SQL语句。
-        
+
         返回:
             tuple: 参数元组，如果没有参数则返回空元组。
         """
+
+
+class AsyncDataQueryAgent:
+    """
+    DataQueryAgent 的 asyncio 版本，行为与同步版本一致。
+
+    表结构获取在事件循环中以协程方式进行，便于与意图识别等步骤并行；
+    SQL 生成、执行与回答生成复用同步代理的逻辑，在线程池中执行。
+
+    属性:
+        agent (DataQueryAgent): 底层同步代理。
+        db (AsyncDatabase): 异步数据库对象。
+        llm (AsyncLLMClient): 异步大模型客户端。
+
+    方法:
+        handle_query: 协程版本的 handle_query
+    """
+
+    def __init__(self, agent=None):
+        """
+        参数:
+            agent (DataQueryAgent, optional): 复用的同步代理，默认新建一个。
+        """
+        self.agent = agent or DataQueryAgent()
+
+    @lazy_property
+    def db(self):
+        return AsyncDatabase(self.agent.db)
+
+    @lazy_property
+    def llm(self):
+        return AsyncLLMClient(self.agent.llm)
+
+    async def handle_query(self, user_input, table_schema=None, on_chunk=None):
+        """协程版本的 handle_query；on_chunk 在线程池中被调用。"""
+        if table_schema is None:
+            table_schema = await self.db.get_table_schema()
+        return await asyncio.to_thread(self.agent.handle_query, user_input, table_schema, on_chunk)
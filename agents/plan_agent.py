@@ -1,6 +1,7 @@
-from utils.llm_utils import LLMClient
 import logging
 from utils.logger import logger
+from utils.intent_router import create_intent_router
+from utils.lazy import lazy_property
 
 logger.debug("Initializing PlanAgent module")
 
@@ -9,12 +10,27 @@ class PlanAgent:
     负责分析用户输入并决定使用哪个代理来处理请求。
 
     属性:
-        None
+        router (IntentRouter): 分层的意图路由（关键词自动机 → 缓存 → 大模型），首次使用时创建
 
     方法:
         determine_agent: 分析输入内容，返回对应的代理类型
+        likely_agent: 只按关键词返回最可能的代理类型（不调用大模型）
     """
 
+    def __init__(self, router=None, llm=None):
+        """
+        参数:
+            router (IntentRouter, optional): 意图路由，默认按 model_config.yaml 的 intent_router 节创建。
+            llm (LLMClient, optional): 关键词无法判定时使用的大模型客户端，默认在首次需要时创建。
+        """
+        if router is not None:
+            self.router = router
+        self._llm = llm
+
+    @lazy_property
+    def router(self):
+        return create_intent_router(self._llm)
+
     def determine_agent(self, user_input):
         """
         分析用户输入并返回对应的代理类型。
@@ -23,14 +39,18 @@ class PlanAgent:
             user_input (str): 用户输入的自然语言描述。
 
         返回:
-            str: 代理类型名称（如'data_query'、'rule_executor'、'rule_config'）
+            str: 代理类型名称（如'data_query'、'rule_executor'、'rule_config'），无法识别时返回'unknown'
+        """
+        return self.router.route(user_input)
+
+    def likely_agent(self, user_input):
+        """
+        只按关键词返回最可能的代理类型，不调用大模型，用于在意图识别完成前决定是否预取表结构。
+
+        参数:
+            user_input (str): 用户输入的自然语言描述。
+
+        返回:
+            str: 关键词得分最高的代理类型，没有关键词命中时返回 None。
         """
-        # 简单的关键词匹配逻辑作为示例
-        if "数据库" in user_input or "表" in user_input or "查询" in user_input:
-            return "data_query"
-        elif "执行规则" in user_input:
-            return "rule_executor"
-        elif "配置规则" in user_input or "设置规则" in user_input:
-            return "rule_config"
-        else:
-            return "unknown"
+        return self.router.keyword_intent(user_input)
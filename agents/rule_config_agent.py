@@ -25,9 +25,9 @@ class RuleConfigAgent:
             str: 生成的自然语言回答。
         """
         logger.info("处理规则配置请求")
-        logger.debug(f"用户输入: {user_input}")
+        logger.debug("用户输入: %s", user_input)
 
         # 示例逻辑：返回固定的规则配置信息
         rule_config_info = "规则配置功能正在开发中，当前暂不支持实际操作。"
-        logger.info(f"规则配置响应: {rule_config_info}")
+        logger.info("规则配置响应: %s", rule_config_info)
         return rule_config_info
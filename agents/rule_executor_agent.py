@@ -1,75 +1,610 @@
+import math
+import time
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from utils.logger import logger
+from utils.config import get_section
 from utils.database import Database
+from utils.rule_registry import RuleRegistry, quote_identifier
+from utils.watermark_store import DEFAULT_WATERMARK_PATH, get_watermark_store
+from utils.sampling import wilson_interval, sample_key_ranges
+from utils.tracing import get_tracer, bind_context
+from utils.lazy import lazy_property
 
 logger.debug("Initializing RuleExecutorAgent module")
 
+# 批量执行规则的默认配置，可在 db_config.yaml 的 rule_executor 节中覆盖
+DEFAULT_RULE_EXECUTOR_CONFIG = {
+    'workers': 4,                # 并发扫描数，不超过连接池大小
+    'rule_timeout': 60,          # 单次规则扫描的超时（秒），<= 0 表示不限制
+    'max_rules_per_scan': 20,    # 单次合并扫描最多包含的规则数
+    'watermark_columns': {},     # 增量校验的水位线列，如 {'employees': 'updated_at'}
+    'watermark_path': DEFAULT_WATERMARK_PATH,  # 水位线存储（相对项目根目录）
+    'rebaseline_interval': 86400,  # 非自增主键水位线列的累计结果是近似值，基线超过该时间（秒）自动重建，<= 0 表示不自动重建
+    'sample_fraction': 0.01,     # 抽样检查的抽样比例
+    'sample_blocks': 20,         # 主键范围抽样的区间个数
+    'sample_max_rows': 200000,   # 随机抽样（无整数主键时）最多读取的行数
+    'sample_min_rows': 100000,   # 表行数低于该值时直接精确检查
+    'confidence': 0.95,          # 置信区间的置信水平
+    'escalate_rate': 0.001,      # 估计违规率达到该值时改为精确检查
+}
+
+# 未配置水位线列时自动使用的列：只有唯一且递增的自增主键能保证增量结果精确。
+# 不唯一的列（如 order_date）在水位线之后到达的同值行会被跳过，可更新的列（如 updated_at）
+# 会重复计入被修改的违规行且不会扣除已修复的行，只能通过配置使用，结果为近似值并定期重建基线
+WATERMARK_CANDIDATES = ('id',)
+
+# 主键范围抽样使用的整数主键列
+SAMPLE_KEY_COLUMN = 'id'
+
+
+def _is_timeout_error(message):
+    """判断是否为 MAX_EXECUTION_TIME 触发的查询中止（MySQL 错误码 3024）。"""
+    return "3024" in message or "maximum statement execution time exceeded" in message
+
+
 class RuleExecutorAgent:
     """
     负责执行预定义的数据质量规则。
 
     属性:
-        db (Database): 数据库连接实例
+        db (Database): 数据库连接实例，首次使用时创建
+        rules (RuleRegistry): 编译后的规则注册表
+        config (dict): 批量执行的并发数、超时、合并扫描大小和水位线设置
+        watermarks (WatermarkStore): 增量校验的水位线存储，首次使用时打开
+        tracer (Tracer): 共享的追踪器，记录精确检查、抽样和合并扫描的耗时
 
     方法:
-        execute_rule: 执行指定的规则并返回结果
+        execute_rule: 执行指定的规则并返回结果（可选抽样估计）
+        estimate_rule: 抽样估计规则的违规数和置信区间
+        execute_all_rules: 按表分组批量执行规则，每张表只扫描一次
+        rule_table_names: 返回定义了规则的表名
+        run_rules: 并发批量执行规则并返回结构化报告
     """
 
-    def __init__(self):
+    def __init__(self, db=None):
         """
-        初始化 RuleExecutorAgent 实例，建立数据库连接。
+        初始化 RuleExecutorAgent 实例，绑定共享数据库连接池。
+
+        数据库、规则注册表和水位线存储在首次执行规则时才创建。
+
+        参数:
+            db (Database, optional): 数据库操作对象，默认新建一个（共享连接池）。
         """
-        self.db = Database()
+        if db is not None:
+            self.db = db
+        self.config = get_section("db_config.yaml", "rule_executor", DEFAULT_RULE_EXECUTOR_CONFIG)
+        self.tracer = get_tracer()
+
+    @lazy_property
+    def db(self):
+        return Database()
+
+    @lazy_property
+    def rules(self):
+        return RuleRegistry(self.db)
+
+    @lazy_property
+    def watermarks(self):
+        return get_watermark_store()
 
-    def execute_rule(self, rule_id):
+    def rule_table_names(self):
+        """返回定义了规则的表名，读取规则失败时返回空列表（由之后的执行报告错误）。"""
+        try:
+            return self.rules.table_names()
+        except Exception as e:
+            logger.warning("读取规则所在的表失败: %s", e)
+            return []
+
+    def execute_rule(self, rule_id, approximate=False):
         """
         执行指定的规则。
 
         参数:
             rule_id (str): 规则标识符。
+            approximate (bool): 为 True 时抽样估计违规数，估计违规率超过阈值才精确检查，参见 estimate_rule。
 
         返回:
             str: 执行结果。
         """
-        logger.info(f"执行规则 {rule_id}")
+        logger.info("执行规则 %s", rule_id)
         
         try:
-            # 从dq_rules表获取规则详情
-            rule_query = f"SELECT * FROM dq_rules WHERE rule_id = '{rule_id}'"
-            rule_result = self.db.query(rule_query)
+            # 从规则注册表获取编译好的规则，未变化时不再查询 dq_rules
+            rule = self.rules.get(rule_id)
             
-            if not rule_result:
+            if rule is None:
                 return f"未找到规则 {rule_id} 的定义。"
-            
-            rule = rule_result[0]
-            table_name = rule['table_name']
-            column_name = rule['column_name']
-            condition_type = rule['condition_type']
-            description = rule['description']
-            
-            # 根据不同的条件类型构建查询
-            if condition_type == 'not_null':
-                query = f"SELECT COUNT(*) FROM {table_name} WHERE {column_name} IS NULL OR {column_name} = ''"
-            elif condition_type == 'not_empty':
-                query = f"SELECT COUNT(*) FROM {table_name} WHERE {column_name} = '' OR {column_name} IS NULL"
-            elif condition_type == 'in_list':
-                # 这里需要从规则描述中提取允许的值列表
-                # 例如，描述应该是类似"地区必须为 East/West/North/South"的形式
-                allowed_values = description.split('必须为 ')[1].split(' ')[0].split('/')
-                values_str = "','".join(allowed_values)
-                query = f"SELECT COUNT(*) FROM {table_name} WHERE {column_name} NOT IN ('{values_str}')"
-            else:
-                return f"不支持的条件类型: {condition_type}"
-            
-            # 执行规则查询
-            result = self.db.query(query)
-            count = result[0]['COUNT(*)'] if isinstance(result[0], dict) else result[0]
+            if rule.condition is None:
+                return rule.error
+            if approximate:
+                return self.estimate_rule(rule)['message']
             
             # 生成结果信息
-            if count == 0:
-                return f"校验通过，不存在异常数据。{description} 的检查已通过，没有发现违规数据。"
-            else:
-                return f"校验不通过，发现了{count}条异常数据。{description} 的检查未通过，发现了{count}条违反规则的数据。"
+            return self.format_rule_result(rule.description, self.count_violations(rule))
                 
         except Exception as e:
-            return f"执行规则时出错：{str(e)}"
\ No newline at end of file
+            return f"执行规则时出错：{str(e)}"
+
+    def count_violations(self, rule):
+        """
+        精确统计单条规则的违规行数。
+
+        参数:
+            rule (CompiledRule): 已编译的规则。
+
+        返回:
+            int: 违规行数。
+        """
+        # 执行参数化的规则查询
+        query, params = rule.count_query()
+        with self.tracer.span("rule.count", rule_id=rule.rule_id) as span:
+            result = self.db.query(self.apply_timeout(query), params)
+            violations = int(result[0]['violations'] or 0)
+            span.set(violations=violations)
+        return violations
+
+    def _table_rows(self, table_name):
+        """从 information_schema 读取表行数估计值（InnoDB 为近似值），读取失败返回 None。"""
+        rows = self.db.query(
+            "SELECT TABLE_ROWS AS table_rows FROM information_schema.tables WHERE table_schema = %s AND table_name = %s",
+            (self.db.db_name, table_name)
+        )
+        return int(rows[0]['table_rows']) if rows and rows[0]['table_rows'] is not None else None
+
+    def _sample_by_key_range(self, rule, table, key_column):
+        """主键范围抽样：随机选取若干个主键区间，每个区间走索引做范围扫描。"""
+        key = quote_identifier(key_column)
+        bounds = self.db.query(f"SELECT MIN({key}) AS min_key, MAX({key}) AS max_key FROM {table}")[0]
+        min_key, max_key = bounds['min_key'], bounds['max_key']
+        if not isinstance(min_key, int) or not isinstance(max_key, int):
+            return None
+        ranges = sample_key_ranges(min_key, max_key, self.config['sample_fraction'], self.config['sample_blocks'])
+        where = " OR ".join(f"({key} >= %s AND {key} < %s)" for _ in ranges)
+        query = (
+            f"SELECT COUNT(*) AS sampled_rows, SUM(CASE WHEN {rule.condition} THEN 1 ELSE 0 END) AS violations "
+            f"FROM {table} WHERE {where}"
+        )
+        params = tuple(rule.params) + tuple(bound for key_range in ranges for bound in key_range)
+        row = self.db.query(self.apply_timeout(query), params)[0]
+        sampled = int(row['sampled_rows'] or 0)
+        covered = sum(end - start for start, end in ranges)
+        # 按样本中的行密度推算总行数，不依赖 TABLE_ROWS 的近似值
+        estimated_rows = sampled * (max_key - min_key + 1) / covered if covered else 0
+        return 'primary_key_range', sampled, int(row['violations'] or 0), estimated_rows
+
+    def _sample_by_rand(self, rule, table, table_rows):
+        """随机抽样：RAND() 过滤并在读够 sample_max_rows 行后提前结束扫描。"""
+        query = (
+            f"SELECT COUNT(*) AS sampled_rows, SUM(CASE WHEN {rule.condition} THEN 1 ELSE 0 END) AS violations "
+            f"FROM (SELECT * FROM {table} WHERE RAND() < %s LIMIT %s) AS sample"
+        )
+        params = tuple(rule.params) + (self.config['sample_fraction'], int(self.config['sample_max_rows']))
+        row = self.db.query(self.apply_timeout(query), params)[0]
+        sampled = int(row['sampled_rows'] or 0)
+        estimated_rows = table_rows if table_rows is not None else sampled / self.config['sample_fraction']
+        return 'rand', sampled, int(row['violations'] or 0), estimated_rows
+
+    def estimate_rule(self, rule):
+        """
+        抽样估计单条规则的违规数。
+
+        有整数主键 id 时使用主键范围抽样，否则使用 RAND() 抽样并以 LIMIT 提前结束；
+        用 Wilson 区间给出违规率的置信区间（区间抽样存在聚集效应，区间为近似值）。
+        表行数低于 sample_min_rows、样本为空或估计违规率达到 escalate_rate 时改为精确检查。
+
+        参数:
+            rule (CompiledRule): 已编译的规则。
+
+        返回:
+            dict: method、sampled_rows、sample_violations、rate、rate_interval、
+                  estimated_violations、violations_interval、exact（是否做了精确检查）和 message。
+        """
+        table = quote_identifier(rule.table_name)
+        table_rows = self._table_rows(rule.table_name)
+        if table_rows is not None and table_rows < self.config['sample_min_rows']:
+            count = self.count_violations(rule)
+            message = self.format_rule_result(rule.description, count) + f"（表约 {table_rows} 行，已直接精确检查）"
+            return {'method': 'exact', 'exact': True, 'violations': count, 'message': message}
+
+        with self.tracer.span("rule.sample", rule_id=rule.rule_id) as span:
+            sample = None
+            columns = (self.db.get_table_schema() or {}).get(rule.table_name) or []
+            if SAMPLE_KEY_COLUMN in columns:
+                sample = self._sample_by_key_range(rule, table, SAMPLE_KEY_COLUMN)
+            if sample is None:
+                sample = self._sample_by_rand(rule, table, table_rows)
+            method, sampled, sample_violations, estimated_rows = sample
+            span.set(method=method, sampled_rows=sampled, sample_violations=sample_violations)
+
+        confidence = self.config['confidence']
+        threshold = self.config['escalate_rate']
+        rate = sample_violations / sampled if sampled else None
+        low, high = wilson_interval(sample_violations, sampled, confidence)
+        estimate = {
+            'method': method,
+            'sampled_rows': sampled,
+            'sample_violations': sample_violations,
+            'rate': rate,
+            'rate_interval': (low, high),
+            'estimated_violations': round(rate * estimated_rows) if rate is not None else None,
+            'violations_interval': (math.floor(low * estimated_rows), math.ceil(high * estimated_rows)),
+        }
+        logger.info("规则 %s 抽样估计: %s", rule.rule_id, estimate)
+
+        if rate is None or rate >= threshold:
+            count = self.count_violations(rule)
+            reason = "样本为空" if rate is None else f"抽样估计违规率 {rate:.4%} 达到阈值 {threshold:.4%}"
+            estimate.update({
+                'exact': True,
+                'violations': count,
+                'message': self.format_rule_result(rule.description, count) + f"（{reason}，已改为精确检查）",
+            })
+            return estimate
+
+        estimate.update({
+            'exact': False,
+            'message': (
+                f"抽样检查（抽样 {sampled} 行，发现 {sample_violations} 条违规）：{rule.description} 的估计违规率为 {rate:.4%}"
+                f"（{confidence:.0%} 置信区间 {low:.4%} ~ {high:.4%}），估计约 {estimate['estimated_violations']} 条违规数据"
+                f"（{estimate['violations_interval'][0]} ~ {estimate['violations_interval'][1]} 条），"
+                f"低于精确检查阈值 {threshold:.4%}。"
+            ),
+        })
+        return estimate
+
+    def format_rule_result(self, description, count):
+        """
+        生成单条规则的结果信息。
+
+        参数:
+            description (str): 规则描述。
+            count (int): 违规行数。
+
+        返回:
+            str: 结果信息。
+        """
+        if count == 0:
+            return f"校验通过，不存在异常数据。{description} 的检查已通过，没有发现违规数据。"
+        else:
+            return f"校验不通过，发现了{count}条异常数据。{description} 的检查未通过，发现了{count}条违反规则的数据。"
+
+    def build_fused_query(self, table_name, rules, watermark_column=None, low_watermark=None):
+        """
+        将同一张表上的多条规则合并为一次扫描，每条规则对应一个 SUM(CASE ...) 列。
+
+        指定水位线列时，额外返回扫描行数（rows_scanned）和本次扫描到的最大水位线（high_watermark），
+        并且只扫描水位线大于 low_watermark 的行。
+
+        参数:
+            table_name (str): 表名。
+            rules (list): 已编译的规则，顺序与结果列 rule_0、rule_1…… 对应。
+            watermark_column (str, optional): 水位线列。
+            low_watermark (optional): 上次检查到的水位线，为 None 时扫描全表。
+
+        返回:
+            tuple: (合并后的查询语句, 参数)。
+        """
+        columns = [
+            f"SUM(CASE WHEN {rule.condition} THEN 1 ELSE 0 END) AS rule_{index}"
+            for index, rule in enumerate(rules)
+        ]
+        params = [param for rule in rules for param in rule.params]
+        where = ""
+        if watermark_column:
+            column = quote_identifier(watermark_column)
+            columns += ["COUNT(*) AS rows_scanned", f"MAX({column}) AS high_watermark"]
+            if low_watermark is not None:
+                where = f"\nWHERE {column} > %s"
+                params.append(low_watermark)
+        columns = ",\n       ".join(columns)
+        return f"SELECT {columns}\nFROM {quote_identifier(table_name)}{where}", tuple(params)
+
+    def apply_timeout(self, query):
+        """
+        为 SELECT 语句加上 MAX_EXECUTION_TIME 提示，超时后由 MySQL 服务端中止查询。
+
+        参数:
+            query (str): 以 SELECT 开头的查询语句。
+
+        返回:
+            str: 带超时提示的查询语句；未配置超时时原样返回。
+        """
+        timeout = self.config['rule_timeout']
+        if not timeout or timeout <= 0:
+            return query
+        return f"SELECT /*+ MAX_EXECUTION_TIME({int(timeout * 1000)}) */" + query[len("SELECT"):]
+
+    def resolve_watermark_column(self, table_name):
+        """
+        确定增量校验使用的水位线列。
+
+        优先使用配置 watermark_columns 中为该表指定的列（如 updated_at），
+        否则只在表有自增主键 id 时使用 id。
+
+        参数:
+            table_name (str): 表名。
+
+        返回:
+            str: 水位线列名；没有合适的列时返回 None（该表只能全量检查）。
+        """
+        configured = (self.config.get('watermark_columns') or {}).get(table_name)
+        if configured:
+            return configured
+        columns = (self.db.get_table_schema() or {}).get(table_name) or []
+        for candidate in WATERMARK_CANDIDATES:
+            if candidate in columns:
+                return candidate
+        return None
+
+    def plan_scans(self, rules, scan_key=None):
+        """
+        将规则划分为扫描任务并安排执行顺序。
+
+        scan_key 相同的规则（默认同一张表）按 max_rules_per_scan 切分为若干次合并扫描；
+        各组的扫描任务轮流排列，避免规则很多的大表占满所有工作线程。
+
+        参数:
+            rules (list): 可执行的已编译规则。
+            scan_key (callable, optional): 规则 -> (表名, 水位线列, 起始水位线)，默认按表分组且不使用水位线。
+
+        返回:
+            list: [((表名, 水位线列, 起始水位线), 规则列表)]，按提交顺序排列。
+        """
+        scan_key = scan_key or (lambda rule: (rule.table_name, None, None))
+        chunk_size = max(int(self.config['max_rules_per_scan']), 1)
+        queues = {}
+        for rule in rules:
+            queues.setdefault(scan_key(rule), []).append(rule)
+        queues = [
+            [(key, group[i:i + chunk_size]) for i in range(0, len(group), chunk_size)]
+            for key, group in queues.items()
+        ]
+        scans = []
+        for round_index in range(max((len(queue) for queue in queues), default=0)):
+            scans.extend(queue[round_index] for queue in queues if round_index < len(queue))
+        return scans
+
+    def _run_scan(self, table_name, rules, watermark_column=None, low_watermark=None):
+        """执行一次合并扫描，返回 {rule_id: 结果字典}。"""
+        started = time.monotonic()
+        query, params = self.build_fused_query(table_name, rules, watermark_column, low_watermark)
+        with self.tracer.span("rule.scan", table=table_name, rules=len(rules), incremental=watermark_column is not None) as span:
+            try:
+                row = self.db.query(self.apply_timeout(query), params)[0]
+            except Exception as e:
+                elapsed = time.monotonic() - started
+                message = str(e)
+                if _is_timeout_error(message):
+                    logger.warning("表 %s 的合并扫描超时（%s秒），涉及 %s 条规则", table_name, self.config['rule_timeout'], len(rules))
+                    status, message = 'timeout', f"执行规则超时（超过{self.config['rule_timeout']}秒）"
+                else:
+                    logger.error("表 %s 的合并查询失败: %s", table_name, message)
+                    status, message = 'error', f"执行规则时出错：{message}"
+                span.set(status=status).fail(message)
+                return {rule.rule_id: {'status': status, 'violations': None, 'message': message, 'elapsed': elapsed} for rule in rules}
+            if watermark_column:
+                span.set(rows_scanned=int(row['rows_scanned'] or 0))
+
+        elapsed = time.monotonic() - started
+        logger.info("表 %s 合并执行 %d 条规则，耗时 %.3f 秒", table_name, len(rules), elapsed)
+        outcomes = {}
+        for index, rule in enumerate(rules):
+            # 空表时 SUM 返回 NULL
+            count = int(row[f"rule_{index}"] or 0)
+            outcomes[rule.rule_id] = {
+                'status': 'passed' if count == 0 else 'failed',
+                'violations': count,
+                'message': self.format_rule_result(rule.description, count),
+                'elapsed': elapsed,
+            }
+            if watermark_column:
+                outcomes[rule.rule_id]['rows_scanned'] = int(row['rows_scanned'] or 0)
+                outcomes[rule.rule_id]['high_watermark'] = row['high_watermark']
+        return outcomes
+
+    def _baseline_expired(self, rule, state):
+        """非主键水位线列的基线超过 rebaseline_interval 秒（或没有记录基线时间）时需要重建。"""
+        interval = self.config['rebaseline_interval']
+        if state['watermark_column'] in WATERMARK_CANDIDATES or not interval or interval <= 0:
+            return False
+        baseline_at = state.get('baseline_at')
+        if baseline_at is not None and time.time() - baseline_at < interval:
+            return False
+        logger.info("规则 %s 的水位线（%s）基线已过期，重新全量建立基线", rule.rule_id, state['watermark_column'])
+        return True
+
+    def _merge_incremental(self, rule, outcome, state, watermark_column, low_watermark):
+        """将增量扫描的新增违规数与已保存的累计值合并，并推进水位线。"""
+        if outcome['status'] not in ('passed', 'failed'):
+            return outcome
+        exact = watermark_column in WATERMARK_CANDIDATES
+        new_violations = outcome['violations']
+        rows_scanned = outcome['rows_scanned']
+        baseline = low_watermark is None
+        total = new_violations if baseline else state['violations'] + new_violations
+        rows_checked = rows_scanned if baseline else state['rows_checked'] + rows_scanned
+        high_watermark = outcome['high_watermark']
+        if high_watermark is None:
+            high_watermark = low_watermark
+        baseline_at = time.time() if baseline else state.get('baseline_at')
+        self.watermarks.put(rule.rule_id, rule.table_name, watermark_column, high_watermark,
+                            total, rows_checked, rule.fingerprint(), baseline_at)
+
+        if baseline:
+            note = f"（已建立增量基线，检查 {rows_scanned} 行，水位线 {watermark_column} = {high_watermark}）"
+        else:
+            note = f"（增量检查 {watermark_column} > {low_watermark} 的 {rows_scanned} 行，新增违规 {new_violations} 条）"
+        if not exact:
+            note += f"（{watermark_column} 不是唯一递增的主键，累计违规数为近似值，将定期自动重建基线）"
+        return dict(
+            outcome,
+            status='passed' if total == 0 else 'failed',
+            violations=total,
+            new_violations=new_violations,
+            message=self.format_rule_result(rule.description, total) + note,
+        )
+
+    def run_rules(self, table_name=None, incremental=False, rebaseline=False):
+        """
+        批量执行规则并返回结构化报告。
+
+        规则按表分组合并扫描，不同表（或同一张表的不同批次）的扫描在线程池中并发执行，
+        每次扫描从共享连接池借出独立连接；并发数不超过连接池大小。
+
+        增量模式下每条规则保存一个水位线（见 resolve_watermark_column）和累计违规数，
+        只扫描水位线之后的新行并与累计值合并；首次执行、规则定义变化或 rebaseline 时重新全量建立基线。
+        增量模式只适用于追加写入的表：已检查过的行被修改或删除不会反映在累计值中，需要定期重建基线。
+        使用配置的非主键水位线列时结果为近似值，基线超过 rebaseline_interval 秒后自动重建。
+
+        参数:
+            table_name (str, optional): 只执行该表上的规则，默认执行全部规则。
+            incremental (bool): 是否使用增量模式。
+            rebaseline (bool): 为 True 时清除已保存的水位线并全量重建基线（隐含增量模式）。
+
+        返回:
+            dict: results（按规则顺序的结果列表）、summary（各状态数量）、
+                  tables、scans、workers 和 elapsed（总耗时，秒）。
+
+        抛出:
+            RuntimeError: 如果读取规则失败。
+        """
+        started = time.monotonic()
+        rules = self.rules.rules_for_table(table_name)
+        incremental = incremental or rebaseline
+
+        outcomes = {}
+        runnable = []
+        for rule in rules:
+            if rule.condition is None:
+                outcomes[rule.rule_id] = {'status': 'error', 'violations': None, 'message': rule.error, 'elapsed': 0.0}
+            else:
+                runnable.append(rule)
+
+        # 增量模式下为每条规则确定水位线列和起始水位线
+        scan_keys = {}
+        states = {}
+        if incremental:
+            if rebaseline:
+                self.watermarks.reset([rule.rule_id for rule in runnable])
+            watermark_columns = {}
+            for rule in runnable:
+                if rule.table_name not in watermark_columns:
+                    watermark_columns[rule.table_name] = self.resolve_watermark_column(rule.table_name)
+                watermark_column = watermark_columns[rule.table_name]
+                low_watermark = None
+                state = self.watermarks.get(rule.rule_id) if watermark_column else None
+                if (state and state['watermark_column'] == watermark_column
+                        and state['rule_fingerprint'] == rule.fingerprint()
+                        and not self._baseline_expired(rule, state)):
+                    low_watermark = state['watermark']
+                states[rule.rule_id] = state
+                scan_keys[rule.rule_id] = (rule.table_name, watermark_column, low_watermark)
+        scan_key = (lambda rule: scan_keys[rule.rule_id]) if incremental else None
+
+        scans = self.plan_scans(runnable, scan_key)
+        workers = max(min(int(self.config['workers']), self.db.pool.max_size, len(scans)), 1)
+        logger.info("批量执行 %d 条规则：%d 次扫描，并发数 %d，增量模式: %s", len(rules), len(scans), workers, incremental)
+        if workers == 1:
+            for (scan_table, watermark_column, low_watermark), scan_rules in scans:
+                outcomes.update(self._run_scan(scan_table, scan_rules, watermark_column, low_watermark))
+        else:
+            # 扫描 span 挂在当前请求下
+            run_scan = bind_context(self._run_scan)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rule-executor") as executor:
+                futures = [
+                    executor.submit(run_scan, scan_table, scan_rules, watermark_column, low_watermark)
+                    for (scan_table, watermark_column, low_watermark), scan_rules in scans
+                ]
+                for future in as_completed(futures):
+                    outcomes.update(future.result())
+
+        if incremental:
+            for rule in runnable:
+                _, watermark_column, low_watermark = scan_keys[rule.rule_id]
+                if watermark_column is None:
+                    outcome = outcomes[rule.rule_id]
+                    outcome['message'] += "（该表没有可用的水位线列，已全量检查）"
+                else:
+                    outcomes[rule.rule_id] = self._merge_incremental(
+                        rule, outcomes[rule.rule_id], states[rule.rule_id], watermark_column, low_watermark
+                    )
+
+        results = []
+        summary = {'passed': 0, 'failed': 0, 'error': 0, 'timeout': 0}
+        for rule in rules:
+            outcome = dict(outcomes[rule.rule_id], rule_id=rule.rule_id, table_name=rule.table_name)
+            summary[outcome['status']] += 1
+            results.append(outcome)
+        return {
+            'results': results,
+            'summary': summary,
+            'tables': len({rule.table_name for rule in rules}),
+            'scans': len(scans),
+            'workers': workers,
+            'elapsed': time.monotonic() - started,
+        }
+
+    def execute_all_rules(self, table_name=None, incremental=False, rebaseline=False):
+        """
+        批量执行规则：按表分组合并扫描，并发执行不同表的扫描，参见 run_rules。
+
+        参数:
+            table_name (str, optional): 只执行该表上的规则，默认执行全部规则。
+            incremental (bool): 是否只检查水位线之后的新数据。
+            rebaseline (bool): 是否全量重建增量基线。
+
+        返回:
+            str: 按规则逐条列出的执行结果和汇总信息。
+        """
+        logger.info("批量执行规则，目标表: %s", table_name or '全部')
+
+        try:
+            report = self.run_rules(table_name, incremental, rebaseline)
+        except Exception as e:
+            return f"读取规则时出错：{str(e)}"
+
+        if not report['results']:
+            return f"未找到表 {table_name} 上的规则定义。" if table_name else "未找到任何规则定义。"
+
+        counts = report['summary']
+        summary = (
+            f"共执行 {len(report['results'])} 条规则（{report['tables']} 张表，{report['scans']} 次扫描，"
+            f"并发数 {report['workers']}，耗时 {report['elapsed']:.2f} 秒），"
+            f"通过 {counts['passed']} 条，不通过 {counts['failed']} 条，"
+            f"出错 {counts['error']} 条，超时 {counts['timeout']} 条。"
+        )
+        logger.info(summary)
+        lines = [f"规则 {result['rule_id']}：{result['message']}" for result in report['results']]
+        return "\n".join(lines + [summary])
+
+
+class AsyncRuleExecutorAgent:
+    """
+    RuleExecutorAgent 的 asyncio 版本，行为与同步版本一致。
+
+    属性:
+        agent (RuleExecutorAgent): 底层同步代理。
+
+    方法:
+        execute_rule: 协程版本的 execute_rule
+        execute_all_rules: 协程版本的 execute_all_rules
+        rule_table_names: 协程版本的 rule_table_names
+    """
+
+    def __init__(self, agent=None):
+        """
+        参数:
+            agent (RuleExecutorAgent, optional): 复用的同步代理，默认新建一个。
+        """
+        self.agent = agent or RuleExecutorAgent()
+
+    async def execute_rule(self, rule_id, approximate=False):
+        return await asyncio.to_thread(self.agent.execute_rule, rule_id, approximate)
+
+    async def execute_all_rules(self, table_name=None, incremental=False, rebaseline=False):
+        return await asyncio.to_thread(self.agent.execute_all_rules, table_name, incremental, rebaseline)
+
+    async def rule_table_names(self):
+        return await asyncio.to_thread(self.agent.rule_table_names)
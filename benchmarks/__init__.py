@@ -0,0 +1,8 @@
+"""
+端到端性能基准：本地模拟 DashScope 文本生成接口和 SQLite 数据库，
+驱动 DataQueryAgent、RuleExecutorAgent 和 run_tests，输出各阶段延迟分位数、吞吐量和峰值内存。
+
+运行方式（在项目根目录下）：
+    python -m benchmarks.run_benchmarks --output bench.json
+    python -m benchmarks.run_benchmarks --compare bench.json
+"""
@@ -0,0 +1,244 @@
+import re
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 生成 SQL 提示词中的问题行
+_QUESTION_RE = re.compile(r'自然语言描述：(.*)')
+# 回答提示词中的用户输入行
+_USER_INPUT_RE = re.compile(r'用户输入:\s*(.*)')
+# 结果摘要中的行数和样例行
+_ROW_COUNT_RE = re.compile(r'共 (\d+) 行')
+_SAMPLE_ROW_RE = re.compile(r'^\s*\{(.*)\}\s*$', re.M)
+# 批量验证提示词中的用例编号
+_CASE_RE = re.compile(r'^用例 (\d+):', re.M)
+
+# 问题关键词到 SQL 的映射，按顺序匹配第一条（SQL 同时兼容 MySQL 和 SQLite）
+CANNED_SQL = (
+    (("多少张表",), "SELECT COUNT(*) AS table_count FROM information_schema.tables WHERE table_schema = DATABASE()"),
+    (("哪几张",), "SELECT table_name FROM information_schema.tables WHERE table_schema = DATABASE()"),
+    (("销售", "East"), "SELECT id, region, sales, order_date FROM sales_data WHERE region = 'East'"),
+    (("销售", "第一季度"), "SELECT id, region, sales, order_date FROM sales_data WHERE order_date >= '2024-01-01' AND order_date < '2024-04-01'"),
+    (("销售",), "SELECT id, region, sales, order_date FROM sales_data"),
+    (("员工", "邮箱为空"), "SELECT id, name, email, phone FROM employees WHERE email IS NULL OR email = ''"),
+    (("员工", "电话为空"), "SELECT id, name, email, phone FROM employees WHERE phone IS NULL OR phone = ''"),
+    (("员工",), "SELECT id, name, email, phone FROM employees"),
+    (("规则",), "SELECT rule_id, table_name, column_name, condition_type, description FROM dq_rules"),
+)
+FALLBACK_SQL = "SELECT '未查询到相关数据'"
+
+# 回答中以 psql 表格展示的最大行数
+_MAX_TABLE_ROWS = 5
+
+
+def canned_sql(question):
+    """按关键词返回问题对应的 SQL，没有匹配时返回与真实模型约定一致的兜底 SQL。"""
+    for keywords, sql in CANNED_SQL:
+        if all(keyword in question for keyword in keywords):
+            return sql
+    return FALLBACK_SQL
+
+
+def _parse_sample_rows(prompt):
+    """从结果摘要中解析样例行，如 {id: 1, region: East} -> [('id', '1'), ('region', 'East')]。"""
+    rows = []
+    for body in _SAMPLE_ROW_RE.findall(prompt):
+        cells = []
+        for cell in body.split(", "):
+            name, _, value = cell.partition(": ")
+            cells.append((name, value))
+        rows.append(cells)
+    return rows
+
+
+def _psql_table(rows):
+    """将样例行渲染为 psql 风格的表格。"""
+    header = [name for name, _ in rows[0]]
+    body = [[value for _, value in row] for row in rows[:_MAX_TABLE_ROWS]]
+    widths = [max(len(str(cell)) for cell in column) for column in zip(header, *body)]
+    border = "+" + "+".join("-" * (width + 2) for width in widths) + "+"
+
+    def line(cells):
+        return "| " + " | ".join(str(cell).ljust(width) for cell, width in zip(cells, widths)) + " |"
+
+    return "\n".join([border, line(header), border] + [line(row) for row in body] + [border])
+
+
+def canned_answer(prompt):
+    """根据回答提示词中的用户输入和结果摘要生成确定性的回答。"""
+    match = _USER_INPUT_RE.search(prompt)
+    question = match.group(1) if match else ""
+    count = _ROW_COUNT_RE.search(prompt)
+    row_count = int(count.group(1)) if count else 0
+    rows = _parse_sample_rows(prompt)
+
+    if "张表" in question and rows:
+        return f"数据库中现在有{rows[0][0][1]}张表。"
+    if "哪几张" in question and rows:
+        return "数据库中包含以下表格：" + "、".join(row[0][1] for row in rows) + "。"
+    if "显示" in question and rows:
+        return f"共查询到 {row_count} 条数据，前 {min(row_count, _MAX_TABLE_ROWS)} 条如下：\n{_psql_table(rows)}"
+    return f"共查询到 {row_count} 条数据。"
+
+
+def canned_response(prompt):
+    """
+    按提示词类型返回模拟的模型输出。
+
+    参数:
+        prompt (str): LLMClient 发送的提示词。
+
+    返回:
+        str: 模型输出文本。
+    """
+    if "生成MySQL查询语句" in prompt:
+        match = _QUESTION_RE.search(prompt)
+        return canned_sql(match.group(1) if match else "")
+    if "生成自然语言的回答" in prompt:
+        return canned_answer(prompt)
+    if "判断其意图类型" in prompt:
+        return "data_query"
+    if "JSON 数组" in prompt:
+        return json.dumps(
+            [{"id": int(number), "verdict": "通过", "reason": "输出符合期望格式。"} for number in _CASE_RE.findall(prompt)],
+            ensure_ascii=False,
+        )
+    if "格式验证专家" in prompt:
+        return "通过: 输出符合期望格式。"
+    return "好的。"
+
+
+def split_output(text, chunk_chars):
+    """将模型输出按 chunk_chars 个字符切分为流式输出的片段，空输出也产出一个空片段。"""
+    return [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)] or [""]
+
+
+class FakeDashScopeServer:
+    """
+    本地模拟的 DashScope 文本生成接口，在后台线程中运行。
+
+    每个请求先等待 latency ± jitter 秒模拟首字延迟，再按每 chunk_chars 个字符 token_interval 秒模拟逐段生成，
+    返回按提示词类型生成的确定性输出；按 error_rate 的概率返回 503，用于观察重试开销。
+    请求头带 X-DashScope-SSE: enable 时以 SSE 流式返回（parameters.incremental_output 为真时每段只含新增内容），
+    否则生成完毕后一次返回。支持 HTTP/1.1 keep-alive。
+
+    属性:
+        latency (float): 每次调用的基础延迟（秒），即首字延迟。
+        jitter (float): 延迟的随机抖动幅度（秒）。
+        error_rate (float): 返回 503 的概率。
+        token_interval (float): 相邻两段输出之间的生成耗时（秒）。
+        chunk_chars (int): 每段输出的字符数。
+        url (str): 接口地址，启动后可用。
+        requests (int): 已处理的请求数。
+
+    方法:
+        start: 在后台线程中启动服务
+        stop: 停止服务
+    """
+
+    def __init__(self, latency=0.2, jitter=0.05, error_rate=0.0, seed=0, host="127.0.0.1", port=0,
+                 token_interval=0.0, chunk_chars=4):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.token_interval = token_interval
+        self.chunk_chars = chunk_chars
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/v1/services/aigc/text-generation/generation"
+
+    def _draw(self):
+        """返回本次请求的 (延迟, 是否返回错误)。"""
+        with self._lock:
+            self.requests += 1
+            delay = max(self.latency + self._random.uniform(-self.jitter, self.jitter), 0.0)
+            return delay, self._random.random() < self.error_rate
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                delay, failed = server._draw()
+                time.sleep(delay)
+                if failed:
+                    self._reply(503, {"code": "ServiceUnavailable", "message": "模拟的服务端错误"})
+                    return
+                try:
+                    payload = json.loads(body)
+                    prompt = payload["input"]["prompt"]
+                except (ValueError, KeyError, TypeError):
+                    self._reply(400, {"code": "InvalidParameter", "message": "请求体无法解析"})
+                    return
+                pieces = split_output(canned_response(prompt), server.chunk_chars)
+                if self.headers.get("X-DashScope-SSE") == "enable":
+                    incremental = bool((payload.get("parameters") or {}).get("incremental_output"))
+                    self._stream(pieces, incremental)
+                    return
+                time.sleep(server.token_interval * (len(pieces) - 1))
+                self._reply(200, {"output": {"text": "".join(pieces)}})
+
+            def _stream(self, pieces, incremental):
+                """以 SSE 逐段返回输出，使用分块传输编码以保持 keep-alive。"""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                text = ""
+                for index, piece in enumerate(pieces, 1):
+                    if index > 1:
+                        time.sleep(server.token_interval)
+                    text += piece
+                    output = {
+                        "text": piece if incremental else text,
+                        "finish_reason": "stop" if index == len(pieces) else "null",
+                    }
+                    event = (
+                        f"id:{index}\nevent:result\n:HTTP_STATUS/200\n"
+                        f"data:{json.dumps({'output': output}, ensure_ascii=False)}\n\n"
+                    )
+                    self._write_chunk(event.encode("utf-8"))
+                self._write_chunk(b"")
+
+            def _write_chunk(self, data):
+                self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """在后台线程中启动服务，返回自身便于链式调用。"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-dashscope", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止服务并释放端口。"""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
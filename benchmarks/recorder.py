@@ -0,0 +1,102 @@
+import math
+import time
+import threading
+from contextlib import contextmanager
+
+
+def percentile(values, fraction):
+    """
+    计算分位数（线性插值），与 numpy.percentile 的默认算法一致。
+
+    参数:
+        values (list): 已排序的数值列表。
+        fraction (float): 分位点（0 到 1），如 0.95。
+
+    返回:
+        float: 分位数，列表为空时返回 0.0。
+    """
+    if not values:
+        return 0.0
+    position = (len(values) - 1) * fraction
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    if lower == upper:
+        return values[lower]
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class StageRecorder:
+    """
+    按阶段记录每次调用的耗时，线程安全。
+
+    阶段名采用“组件.操作”的形式，如 llm.sql、db.query、data_query.total。
+
+    方法:
+        record: 记录一次耗时
+        timed: 以上下文管理器方式计时
+        reset: 清空已记录的数据（如预热结束后）
+        summary: 返回各阶段的次数、均值和 p50/p95/p99
+    """
+
+    def __init__(self):
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        """
+        记录一次耗时。
+
+        参数:
+            stage (str): 阶段名。
+            seconds (float): 耗时（秒）。
+        """
+        with self._lock:
+            self._samples.setdefault(stage, []).append(seconds)
+
+    @contextmanager
+    def timed(self, stage):
+        """
+        对 with 语句块计时，异常退出时同样记录。
+
+        参数:
+            stage (str): 阶段名。
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def reset(self):
+        """清空已记录的数据。"""
+        with self._lock:
+            self._samples.clear()
+
+    def summary(self, prefix=None):
+        """
+        返回各阶段的统计信息，耗时单位为毫秒。
+
+        参数:
+            prefix (str, optional): 只返回以该前缀开头的阶段。
+
+        返回:
+            dict: {阶段名: {count, mean_ms, p50_ms, p95_ms, p99_ms, max_ms, total_ms}}，按阶段名排序。
+        """
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self._samples.items()}
+        result = {}
+        for stage in sorted(samples):
+            if prefix and not stage.startswith(prefix):
+                continue
+            values = samples[stage]
+            total = sum(values)
+            result[stage] = {
+                'count': len(values),
+                'mean_ms': total / len(values) * 1000,
+                'p50_ms': percentile(values, 0.50) * 1000,
+                'p95_ms': percentile(values, 0.95) * 1000,
+                'p99_ms': percentile(values, 0.99) * 1000,
+                'max_ms': values[-1] * 1000,
+                'total_ms': total * 1000,
+            }
+        return result
@@ -0,0 +1,473 @@
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import datetime
+import subprocess
+import tracemalloc
+from contextlib import redirect_stdout
+from concurrent.futures import ThreadPoolExecutor
+
+# 将项目根目录添加到Python路径中
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+from utils.config import get_section  # noqa: E402
+from utils.database import schema_cache  # noqa: E402
+from utils.rule_registry import rule_cache  # noqa: E402
+from utils.llm_utils import LLMClient  # noqa: E402
+from utils.sql_cache import SQLCache, DEFAULT_SQL_CACHE_CONFIG  # noqa: E402
+from utils.similarity_cache import SimilarityIndex, DEFAULT_SIMILARITY_CONFIG  # noqa: E402
+from utils.watermark_store import WatermarkStore  # noqa: E402
+from agents.plan_agent import PlanAgent  # noqa: E402
+from agents.data_query_agent import DataQueryAgent  # noqa: E402
+from agents.rule_executor_agent import RuleExecutorAgent  # noqa: E402
+from pipeline import QueryPipeline  # noqa: E402
+from main import TEST_CASES_FILE, run_tests  # noqa: E402
+from benchmarks.recorder import StageRecorder  # noqa: E402
+from benchmarks.fake_dashscope import FakeDashScopeServer  # noqa: E402
+from benchmarks.sqlite_database import SQLiteDatabase  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCENARIOS = ("data_query", "data_query_stream", "rule_executor", "run_tests")
+
+# 数据查询的问题组合及权重：以带条件的查询为主，含改写后的同类问题（命中 SQL 缓存和相似问题索引）
+QUESTION_MIX = (
+    ("数据库中现在有多少张表？", 2),
+    ("数据库中的表分别是哪几张？", 1),
+    ("显示所有销售数据", 1),
+    ("显示East地区的销售数据", 3),
+    ("显示 East 地区的销售数据", 1),
+    ("查询East地区的全部销售记录", 1),
+    ("显示2024年第一季度的销售数据", 2),
+    ("显示所有员工信息", 1),
+    ("显示邮箱为空的员工信息", 2),
+    ("显示电话为空的员工信息", 2),
+)
+
+# 规则执行场景每轮执行的操作：(阶段名, 方法名, 参数)
+RULE_OPERATIONS = (
+    [("rule.exact", "execute_rule", (rule_id,), {}) for rule_id in ("R001", "R002", "R003")]
+    + [("rule.approximate", "execute_rule", (rule_id,), {'approximate': True}) for rule_id in ("R001", "R002", "R003")]
+    + [("rule.batch", "execute_all_rules", (), {}), ("rule.incremental", "execute_all_rules", (), {'incremental': True})]
+)
+
+# 回答中表示失败的前缀
+ERROR_PREFIXES = ("执行SQL时出错", "无法生成", "执行规则时出错", "批量执行规则时出错")
+
+
+class BenchmarkLLMClient(LLMClient):
+    """
+    指向本地模拟接口的 LLMClient，按调用类型记录每次调用的耗时（llm.sql、llm.natural_language 等），
+    流式调用另记首字延迟（llm.first_token）。
+    """
+
+    def __init__(self, base_url, recorder):
+        os.environ.setdefault("DASHSCOPE_API_KEY", "benchmark")
+        super().__init__()
+        # 不把真实密钥发送给模拟接口
+        self.api_key = "benchmark"
+        self.base_url = base_url
+        self.recorder = recorder
+
+    def _call(self, call_type, prompt):
+        with self.recorder.timed(f"llm.{call_type}"):
+            return super()._call(call_type, prompt)
+
+    def _stream(self, call_type, prompt):
+        start = time.perf_counter()
+        first = True
+        try:
+            for chunk in super()._stream(call_type, prompt):
+                if first:
+                    self.recorder.record("llm.first_token", time.perf_counter() - start)
+                    first = False
+                yield chunk
+        finally:
+            self.recorder.record(f"llm.{call_type}", time.perf_counter() - start)
+
+
+class BenchmarkDataQueryAgent(DataQueryAgent):
+    """记录 handle_query 端到端耗时（data_query.total）的 DataQueryAgent。"""
+
+    def __init__(self, recorder, db, llm):
+        super().__init__(db=db, llm=llm)
+        self.recorder = recorder
+
+    def handle_query(self, user_input, table_schema=None, on_chunk=None):
+        with self.recorder.timed("data_query.total"):
+            return super().handle_query(user_input, table_schema, on_chunk)
+
+
+class BenchmarkRuleExecutorAgent(RuleExecutorAgent):
+    """按执行方式记录规则执行耗时（rule.exact / rule.approximate / rule.batch / rule.incremental）。"""
+
+    def __init__(self, recorder, db):
+        super().__init__(db=db)
+        self.recorder = recorder
+
+    def execute_rule(self, rule_id, approximate=False):
+        with self.recorder.timed("rule.approximate" if approximate else "rule.exact"):
+            return super().execute_rule(rule_id, approximate)
+
+    def execute_all_rules(self, table_name=None, incremental=False, rebaseline=False):
+        with self.recorder.timed("rule.incremental" if incremental else "rule.batch"):
+            return super().execute_all_rules(table_name, incremental, rebaseline)
+
+
+class BenchmarkPipeline(QueryPipeline):
+    """记录每条输入处理耗时（pipeline.run）的 QueryPipeline。"""
+
+    def __init__(self, recorder, **agents):
+        super().__init__(**agents)
+        self.recorder = recorder
+
+    def run(self, user_input, context_manager, request_id=None, on_chunk=None):
+        with self.recorder.timed("pipeline.run"):
+            return super().run(user_input, context_manager, request_id, on_chunk)
+
+
+def build_question_mix(count, seed):
+    """按 QUESTION_MIX 的权重生成确定性的问题序列。"""
+    rng = random.Random(seed)
+    questions = [question for question, _ in QUESTION_MIX]
+    weights = [weight for _, weight in QUESTION_MIX]
+    return rng.choices(questions, weights=weights, k=count)
+
+
+def is_error(answer):
+    return answer is None or str(answer).startswith(ERROR_PREFIXES)
+
+
+class BenchmarkEnvironment:
+    """
+    基准测试环境：模拟的 DashScope 接口、SQLite 数据库以及接入二者的代理和处理流程。
+
+    所有组件共用一个 StageRecorder；每个场景开始前 reset_state 清空缓存和记录，
+    保证场景之间、不同提交之间的结果可比。
+    """
+
+    def __init__(self, args, workdir):
+        self.args = args
+        self.workdir = workdir
+        self.recorder = StageRecorder()
+        self.server = FakeDashScopeServer(
+            latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, seed=args.seed,
+            token_interval=args.token_interval, chunk_chars=args.chunk_chars,
+        ).start()
+        self.db = SQLiteDatabase(workdir, max_size=args.pool_size, recorder=self.recorder)
+        self.db.seed(employees=args.rows, sales=args.rows * 2, seed=args.seed)
+        self.llm = BenchmarkLLMClient(self.server.url, self.recorder)
+        self.data_query_agent = BenchmarkDataQueryAgent(self.recorder, self.db, self.llm)
+        self.rule_executor_agent = BenchmarkRuleExecutorAgent(self.recorder, self.db)
+        # 示例表行数远小于默认的 sample_min_rows，降低阈值使抽样路径真正执行
+        self.rule_executor_agent.config = dict(self.rule_executor_agent.config, sample_min_rows=min(args.rows // 2, 100000))
+        self.pipeline = BenchmarkPipeline(
+            self.recorder,
+            plan_agent=PlanAgent(llm=self.llm),
+            data_query_agent=self.data_query_agent,
+            rule_executor_agent=self.rule_executor_agent,
+        )
+
+    def reset_state(self):
+        """清空缓存、水位线和耗时记录，各场景从相同的冷启动状态开始。"""
+        schema_cache.invalidate()
+        rule_cache.invalidate()
+        # 意图路由缓存了大模型的识别结果，每个场景使用新的路由
+        self.pipeline.plan_agent = PlanAgent(llm=self.llm)
+        self.rule_executor_agent.watermarks = WatermarkStore(":memory:")
+        if self.args.no_cache:
+            self.llm.sql_cache = None
+            self.data_query_agent.similar_questions = None
+        else:
+            # 只使用内存缓存，避免读到上一次运行留在磁盘上的 SQL
+            sql_config = get_section("model_config.yaml", "sql_cache", DEFAULT_SQL_CACHE_CONFIG)
+            self.llm.sql_cache = SQLCache(memory_size=sql_config['memory_size'], ttl=sql_config['ttl']) if sql_config['enabled'] else None
+            similarity_config = get_section("model_config.yaml", "similarity_cache", DEFAULT_SIMILARITY_CONFIG)
+            self.data_query_agent.similar_questions = SimilarityIndex(
+                capacity=similarity_config['capacity'],
+                num_perm=similarity_config['num_perm'],
+                band_rows=similarity_config['band_rows'],
+                ngram=similarity_config['ngram'],
+                threshold=similarity_config['threshold'],
+                synonyms=similarity_config['synonyms'],
+            ) if similarity_config['enabled'] else None
+        self.recorder.reset()
+
+    def close(self):
+        self.server.stop()
+        self.db.close()
+
+
+def run_data_query(env):
+    """并发执行问题组合，返回 (操作数, 出错数)。"""
+    args = env.args
+    agent = env.data_query_agent
+    for question in build_question_mix(args.warmup, args.seed + 1):
+        agent.handle_query(question)
+    env.recorder.reset()
+
+    questions = build_question_mix(args.questions, args.seed)
+    with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="bench-query") as executor:
+        answers = list(executor.map(agent.handle_query, questions))
+    return len(questions), sum(1 for answer in answers if is_error(answer))
+
+
+def run_data_query_stream(env):
+    """与 run_data_query 相同的问题组合，回答以流式生成（记录首字延迟 llm.first_token），返回 (操作数, 出错数)。"""
+    args = env.args
+    agent = env.data_query_agent
+
+    def ask(question):
+        return agent.handle_query(question, on_chunk=lambda chunk: None)
+
+    for question in build_question_mix(args.warmup, args.seed + 1):
+        ask(question)
+    env.recorder.reset()
+
+    questions = build_question_mix(args.questions, args.seed)
+    with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="bench-stream") as executor:
+        answers = list(executor.map(ask, questions))
+    return len(questions), sum(1 for answer in answers if is_error(answer))
+
+
+def run_rule_executor(env):
+    """按 RULE_OPERATIONS 依次执行精确、抽样、批量和增量规则检查，返回 (操作数, 出错数)。"""
+    agent = env.rule_executor_agent
+    operations = errors = 0
+    for _ in range(env.args.rule_iterations):
+        for _, method, positional, keywords in RULE_OPERATIONS:
+            answer = getattr(agent, method)(*positional, **keywords)
+            operations += 1
+            errors += 1 if is_error(answer) else 0
+    return operations, errors
+
+
+def run_test_suite(env):
+    """在测试用例文件的临时副本上执行 run_tests（不修改 tests/test_cases.yaml），返回 (操作数, 失败数)。"""
+    test_logger = logging.getLogger("benchmark.test_execution")
+    test_logger.propagate = False
+    if not test_logger.handlers:
+        test_logger.addHandler(logging.NullHandler())
+
+    operations = failed = 0
+    for iteration in range(env.args.test_iterations):
+        test_cases_file = os.path.join(env.workdir, f"test_cases_{iteration}.yaml")
+        shutil.copyfile(TEST_CASES_FILE, test_cases_file)
+        with env.recorder.timed("run_tests.total"), redirect_stdout(io.StringIO()):
+            passed, failures = run_tests(env.pipeline, test_logger, "all", env.args.concurrency, test_cases_file)
+        operations += passed + failures
+        failed += failures
+    return operations, failed
+
+
+SCENARIO_RUNNERS = {
+    "data_query": run_data_query,
+    "data_query_stream": run_data_query_stream,
+    "rule_executor": run_rule_executor,
+    "run_tests": run_test_suite,
+}
+
+
+def run_scenario(env, name, trace_memory):
+    """执行一个场景并返回其结果：墙钟时间、吞吐量、出错数、峰值内存和各阶段统计。"""
+    env.reset_state()
+    if trace_memory:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    operations, errors = SCENARIO_RUNNERS[name](env)
+    wall = time.perf_counter() - start
+    result = {
+        'operations': operations,
+        'errors': errors,
+        'wall_s': wall,
+        'throughput_per_s': operations / wall if wall else 0.0,
+        'peak_traced_mb': tracemalloc.get_traced_memory()[1] / 2 ** 20 if trace_memory else None,
+        'stages': env.recorder.summary(),
+    }
+    env.recorder.reset()
+    return result
+
+
+def max_rss_mb():
+    """进程的峰值常驻内存（MB），平台不支持时返回 None。"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return rss / 2 ** 20 if sys.platform == "darwin" else rss / 2 ** 10
+
+
+def git_revision():
+    """返回当前提交和工作区是否有未提交的修改，不在 git 仓库中时返回 (None, None)。"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout
+        return commit, bool(status.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def format_report(report):
+    """将基准结果格式化为文本表格。"""
+    meta = report['meta']
+    lines = [
+        f"提交: {meta['commit']}{'（有未提交的修改）' if meta['dirty'] else ''}  Python {meta['python']}  {meta['platform']}",
+        f"模拟延迟: {meta['params']['latency']}s ± {meta['params']['jitter']}s  并发: {meta['params']['concurrency']}  "
+        f"数据量: {meta['params']['rows']} 名员工 / {meta['params']['rows'] * 2} 条销售记录",
+    ]
+    for name, result in report['scenarios'].items():
+        peak = f"{result['peak_traced_mb']:.1f} MB" if result['peak_traced_mb'] is not None else "未统计（--trace-memory）"
+        lines.append("")
+        lines.append(
+            f"== {name}: {result['operations']} 次操作，出错 {result['errors']} 次，耗时 {result['wall_s']:.2f}s，"
+            f"吞吐量 {result['throughput_per_s']:.2f}/s，峰值内存 {peak}"
+        )
+        lines.append(f"{'阶段':<28}{'次数':>8}{'均值ms':>10}{'p50ms':>10}{'p95ms':>10}{'p99ms':>10}{'最大ms':>10}")
+        for stage, stats in result['stages'].items():
+            lines.append(
+                f"{stage:<28}{stats['count']:>8}{stats['mean_ms']:>10.1f}{stats['p50_ms']:>10.1f}"
+                f"{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['max_ms']:>10.1f}"
+            )
+    if report['max_rss_mb'] is not None:
+        lines.append("")
+        lines.append(f"进程峰值常驻内存: {report['max_rss_mb']:.1f} MB")
+    return "\n".join(lines)
+
+
+def _change(current, baseline):
+    if not baseline:
+        return "    n/a"
+    return f"{(current - baseline) / baseline:+7.1%}"
+
+
+def format_comparison(report, baseline):
+    """
+    与之前保存的结果逐项比较，给出 p50/p95 和吞吐量的变化（负数表示更快）。
+
+    两次结果的参数（场景列表除外）不同时给出提示，此时的比较没有意义。
+    """
+    lines = [f"与 {baseline['meta']['commit']} 比较（{baseline['meta']['timestamp']}）："]
+    params, old_params = dict(report['meta']['params']), dict(baseline['meta']['params'])
+    params.pop('scenarios', None)
+    old_params.pop('scenarios', None)
+    if params != old_params:
+        lines.append("注意：两次运行的参数不同，结果不可直接比较。")
+    for name, result in report['scenarios'].items():
+        old = baseline['scenarios'].get(name)
+        if old is None:
+            continue
+        lines.append("")
+        lines.append(
+            f"== {name}: 吞吐量 {old['throughput_per_s']:.2f}/s -> {result['throughput_per_s']:.2f}/s "
+            f"({_change(result['throughput_per_s'], old['throughput_per_s'])})"
+        )
+        lines.append(f"{'阶段':<28}{'p50ms':>20}{'变化':>9}{'p95ms':>20}{'变化':>9}")
+        for stage, stats in result['stages'].items():
+            old_stats = old['stages'].get(stage)
+            if old_stats is None:
+                lines.append(f"{stage:<28}{'（新增阶段）':>20}")
+                continue
+            lines.append(
+                f"{stage:<28}{old_stats['p50_ms']:>9.1f} -> {stats['p50_ms']:<7.1f}{_change(stats['p50_ms'], old_stats['p50_ms']):>9}"
+                f"{old_stats['p95_ms']:>9.1f} -> {stats['p95_ms']:<7.1f}{_change(stats['p95_ms'], old_stats['p95_ms']):>9}"
+            )
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="端到端性能基准（本地模拟 DashScope 接口和 SQLite 数据库）")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"逗号分隔的场景列表（默认 {','.join(SCENARIOS)}）")
+    parser.add_argument("--latency", type=float, default=0.2, help="模拟接口每次调用的基础延迟（秒，默认 0.2）")
+    parser.add_argument("--jitter", type=float, default=0.05, help="模拟接口延迟的随机抖动幅度（秒，默认 0.05）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟接口返回 503 的概率（默认 0）")
+    parser.add_argument(
+        "--token-interval", type=float, default=0.005, help="模拟接口相邻两段输出之间的生成耗时（秒，默认 0.005）"
+    )
+    parser.add_argument("--chunk-chars", type=int, default=4, help="模拟接口每段输出的字符数（默认 4）")
+    parser.add_argument("--rows", type=int, default=10000, help="employees 表行数，sales_data 为其两倍（默认 10000）")
+    parser.add_argument("--questions", type=int, default=60, help="数据查询场景的问题数（默认 60）")
+    parser.add_argument("--warmup", type=int, default=0, help="数据查询场景正式计时前的预热问题数（默认 0）")
+    parser.add_argument("--concurrency", type=int, default=4, help="数据查询和测试用例的并发数（默认 4）")
+    parser.add_argument("--pool-size", type=int, default=8, help="数据库最大并发数（默认 8）")
+    parser.add_argument("--rule-iterations", type=int, default=3, help="规则执行场景的轮数（默认 3）")
+    parser.add_argument("--test-iterations", type=int, default=2, help="run_tests 场景的执行次数（默认 2）")
+    parser.add_argument("--seed", type=int, default=0, help="问题组合、示例数据和模拟延迟的随机数种子（默认 0）")
+    parser.add_argument("--no-cache", action="store_true", help="关闭 SQL 缓存和相似问题索引")
+    parser.add_argument(
+        "--trace-memory", action="store_true",
+        help="用 tracemalloc 统计各场景的峰值内存（会明显拖慢执行，延迟数据只能与同样开启该选项的结果比较）",
+    )
+    parser.add_argument("--output", help="将结果保存为 JSON 文件，供之后 --compare 使用")
+    parser.add_argument("--compare", help="与之前保存的 JSON 结果比较")
+    args = parser.parse_args(argv)
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in args.scenarios if name not in SCENARIO_RUNNERS]
+    if unknown:
+        parser.error(f"未知的场景: {', '.join(unknown)}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    trace_memory = args.trace_memory
+    if trace_memory:
+        tracemalloc.start()
+
+    commit, dirty = git_revision()
+    params = {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+    report = {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': params,
+        },
+        'scenarios': {},
+    }
+
+    workdir = tempfile.mkdtemp(prefix="dqa-bench-")
+    env = None
+    try:
+        env = BenchmarkEnvironment(args, workdir)
+        for name in args.scenarios:
+            print(f"运行场景 {name} ...", file=sys.stderr)
+            report['scenarios'][name] = run_scenario(env, name, trace_memory)
+    finally:
+        if env is not None:
+            env.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+    report['max_rss_mb'] = max_rss_mb()
+
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到 {args.output}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        print("")
+        print(format_comparison(report, baseline))
+
+
+if __name__ == "__main__":
+    main()
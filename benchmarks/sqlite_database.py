@@ -0,0 +1,292 @@
+import os
+import re
+import time
+import random
+import zlib
+import sqlite3
+import datetime
+import threading
+from utils.database import Database
+
+# pymysql 风格的占位符：%s 为参数，%% 为字面量 %
+_PLACEHOLDER_RE = re.compile(r'%([%s])')
+_EXPLAIN_RE = re.compile(r'^\s*EXPLAIN\s+(?!QUERY\s+PLAN\b)(.*)$', re.I | re.S)
+_PLAN_STEP_RE = re.compile(r'^(SCAN|SEARCH)\s+(?:TABLE\s+)?(\w+)')
+_TABLE_ALIAS_RE = re.compile(r'\b(?:FROM|JOIN)\s+`?(\w+)`?(?:\s+(?:AS\s+)?(?!(?:WHERE|JOIN|ON|INNER|LEFT|RIGHT|CROSS|GROUP|ORDER|LIMIT|UNION)\b)(\w+))?', re.I)
+
+REGIONS = ("East", "West", "North", "South")
+
+# 与 MySQL 示例库一致的数据质量规则
+SEED_RULES = (
+    ("R001", "employees", "email", "not_null", "邮箱不能为空"),
+    ("R002", "employees", "phone", "not_empty", "电话不能为空"),
+    ("R003", "sales_data", "region", "in_list", "地区必须为 East/West/North/South"),
+)
+
+TABLE_COMMENTS = {
+    "employees": "员工信息表",
+    "sales_data": "销售数据表",
+    "dq_rules": "数据质量规则表",
+}
+
+COLUMN_COMMENTS = {
+    ("employees", "name"): "员工姓名",
+    ("employees", "email"): "员工邮箱",
+    ("employees", "phone"): "员工电话",
+    ("sales_data", "region"): "销售地区",
+    ("sales_data", "sales"): "销售额",
+    ("sales_data", "order_date"): "下单日期",
+}
+
+
+def _concat_ws(separator, *values):
+    """MySQL CONCAT_WS：以 separator 连接非 NULL 的参数。"""
+    return separator.join(str(value) for value in values if value is not None)
+
+
+def to_sqlite(sql):
+    """将 pymysql 风格的 SQL（%s 占位符、%% 转义）转换为 SQLite 的 ? 占位符。"""
+    return _PLACEHOLDER_RE.sub(lambda match: '?' if match.group(1) == 's' else '%', sql)
+
+
+class SQLitePool:
+    """
+    与 ConnectionPool 接口相近的占位对象，供 Database 读取库名和最大并发数。
+
+    连接由 SQLiteDatabase 按线程管理。
+
+    属性:
+        db_name (str): 数据库名称（information_schema 中的 TABLE_SCHEMA）。
+        max_size (int): 允许的最大并发数，RuleExecutorAgent 据此限制并发扫描数。
+    """
+
+    def __init__(self, db_name, max_size=8):
+        self.db_name = db_name
+        self.max_size = max_size
+
+    def stats(self):
+        return {'size': 0, 'idle': 0, 'in_use': 0, 'max_size': self.max_size}
+
+    def close(self):
+        pass
+
+
+class SQLiteDatabase(Database):
+    """
+    基于 SQLite 文件的 Database 实现，用于在没有 MySQL 的环境中运行基准测试。
+
+    每个线程使用独立的连接（WAL 模式，读操作可以并发）；每个连接都挂载一个
+    information_schema 库（tables、columns 两张表），并注册 DATABASE()、RAND()、CRC32() 和 CONCAT_WS() 函数，
+    使 Database 的表结构指纹、注释查询以及规则执行的抽样查询无需修改即可运行。
+    EXPLAIN 用 EXPLAIN QUERY PLAN 模拟（见 _explain）。
+
+    属性:
+        path (str): 数据文件路径。
+        recorder (StageRecorder): 记录 db.query / db.stream 耗时，可以为 None。
+
+    方法:
+        seed: 建表并写入示例数据
+        refresh_statistics: 按实际行数更新 information_schema.tables
+        query / execute / stream: 与 Database 同名方法一致
+        close: 关闭所有连接
+    """
+
+    def __init__(self, directory, db_name="benchmark", max_size=8, recorder=None):
+        self.path = os.path.join(directory, f"{db_name}.sqlite3")
+        self.schema_path = os.path.join(directory, f"{db_name}_information_schema.sqlite3")
+        self.recorder = recorder
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        super().__init__(pool=SQLitePool(db_name, max_size))
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("ATTACH DATABASE ? AS information_schema", (self.schema_path,))
+            conn.execute("PRAGMA information_schema.journal_mode=WAL")
+            conn.create_function("DATABASE", 0, lambda: self.db_name)
+            conn.create_function("RAND", 0, random.random)
+            conn.create_function("CRC32", 1, lambda value: zlib.crc32(str(value).encode('utf-8')))
+            conn.create_function("CONCAT_WS", -1, _concat_ws)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _record(self, stage, start):
+        if self.recorder is not None:
+            self.recorder.record(stage, time.perf_counter() - start)
+
+    def _explain(self, sql, params):
+        """
+        模拟 MySQL 的 EXPLAIN：按 EXPLAIN QUERY PLAN 的每个 SCAN/SEARCH 步骤产出一行，
+        全表扫描（包括 SQLite 为连接临时建立的自动索引）的 rows 取 information_schema.tables 中的行数，
+        按索引查找的 rows 为 1；表别名按 FROM/JOIN 子句还原为表名。
+        """
+        conn = self._connection()
+        table_rows = {
+            row['TABLE_NAME']: row['TABLE_ROWS']
+            for row in conn.execute(
+                "SELECT TABLE_NAME, TABLE_ROWS FROM information_schema.tables WHERE TABLE_SCHEMA = ?", (self.db_name,)
+            )
+        }
+        aliases = {}
+        for table, alias in _TABLE_ALIAS_RE.findall(sql):
+            aliases[table] = table
+            if alias:
+                aliases[alias] = table
+        rows = []
+        for step in conn.execute("EXPLAIN QUERY PLAN " + to_sqlite(sql), tuple(params or ())):
+            match = _PLAN_STEP_RE.match(step['detail'])
+            if match:
+                table = aliases.get(match.group(2), match.group(2))
+                scan = match.group(1).upper() == 'SCAN' or 'AUTOMATIC' in step['detail']
+                rows.append({
+                    'id': 1, 'table': table, 'type': 'ALL' if scan else 'ref',
+                    'rows': table_rows.get(table, 1) if scan else 1,
+                })
+        return rows
+
+    def _run(self, sql, params):
+        match = _EXPLAIN_RE.match(sql)
+        if match:
+            return None, self._explain(match.group(1), params)
+        cursor = self._connection().execute(to_sqlite(sql), tuple(params or ()))
+        return cursor, None
+
+    def query(self, sql, params=None):
+        start = time.perf_counter()
+        try:
+            cursor, rows = self._run(sql, params)
+            if rows is None:
+                rows = [dict(row) for row in cursor.fetchall()]
+            return rows
+        except Exception as e:
+            raise RuntimeError(f"查询SQL时出错：{str(e)}")
+        finally:
+            self._record("db.query", start)
+
+    def execute(self, sql, params=None):
+        start = time.perf_counter()
+        try:
+            cursor, rows = self._run(sql, params)
+            return rows if rows is not None else [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            raise RuntimeError(f"执行SQL时出错：{str(e)}")
+        finally:
+            self._record("db.execute", start)
+
+    def stream(self, sql, params=None, batch_size=None, max_rows=None):
+        """与 Database.stream 一致：分批产出结果，db.stream 只统计数据库侧的耗时。"""
+        batch_size = batch_size or self.stream_config['batch_size']
+        max_rows = self.stream_config['max_rows'] if max_rows is None else max_rows
+        elapsed = 0.0
+        start = time.perf_counter()
+        try:
+            try:
+                cursor, _ = self._run(sql, params)
+            except Exception as e:
+                raise RuntimeError(f"查询SQL时出错：{str(e)}")
+            fetched = 0
+            while True:
+                size = batch_size if max_rows <= 0 else min(batch_size, max_rows - fetched)
+                if size <= 0:
+                    break
+                batch = [dict(row) for row in cursor.fetchmany(size)]
+                fetched += len(batch)
+                elapsed += time.perf_counter() - start
+                if batch:
+                    yield batch
+                start = time.perf_counter()
+                if len(batch) < size:
+                    break
+        finally:
+            if self.recorder is not None:
+                self.recorder.record("db.stream", elapsed + time.perf_counter() - start)
+
+    def seed(self, employees=10000, sales=20000, seed=0):
+        """
+        建表并写入确定性的示例数据，已存在的表会被重建。
+
+        违规数据的比例很低（约 0.05%），使抽样检查通常不会升级为精确检查。
+
+        参数:
+            employees (int): employees 表行数。
+            sales (int): sales_data 表行数。
+            seed (int): 随机数种子。
+        """
+        rng = random.Random(seed)
+        conn = self._connection()
+        conn.executescript(
+            "DROP TABLE IF EXISTS employees;"
+            "DROP TABLE IF EXISTS sales_data;"
+            "DROP TABLE IF EXISTS dq_rules;"
+            "CREATE TABLE employees (id INTEGER PRIMARY KEY, name TEXT, email TEXT, phone TEXT);"
+            "CREATE TABLE sales_data (id INTEGER PRIMARY KEY, region TEXT, sales REAL, order_date TEXT);"
+            "CREATE TABLE dq_rules (rule_id TEXT PRIMARY KEY, table_name TEXT, column_name TEXT,"
+            " condition_type TEXT, description TEXT);"
+        )
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT INTO employees (id, name, email, phone) VALUES (?, ?, ?, ?)",
+            (
+                (i, f"员工{i}", None if i % 2000 == 0 else f"user{i}@example.com", "" if i % 5000 == 0 else f"138{i:08d}")
+                for i in range(1, employees + 1)
+            ),
+        )
+        start_date = datetime.date(2023, 7, 1)
+        conn.executemany(
+            "INSERT INTO sales_data (id, region, sales, order_date) VALUES (?, ?, ?, ?)",
+            (
+                (
+                    i,
+                    "Unknown" if i % 2500 == 0 else rng.choice(REGIONS),
+                    round(rng.uniform(100, 10000), 2),
+                    (start_date + datetime.timedelta(days=rng.randrange(365))).isoformat(),
+                )
+                for i in range(1, sales + 1)
+            ),
+        )
+        conn.executemany("INSERT INTO dq_rules VALUES (?, ?, ?, ?, ?)", SEED_RULES)
+        conn.execute("COMMIT")
+        self.refresh_statistics()
+
+    def refresh_statistics(self):
+        """按实际表结构和行数重建 information_schema（表行数、列信息和注释）。"""
+        conn = self._connection()
+        now = datetime.datetime.now().isoformat(sep=' ', timespec='seconds')
+        conn.executescript(
+            "DROP TABLE IF EXISTS information_schema.tables;"
+            "DROP TABLE IF EXISTS information_schema.columns;"
+            "CREATE TABLE information_schema.tables (TABLE_SCHEMA TEXT, TABLE_NAME TEXT, TABLE_ROWS INTEGER,"
+            " UPDATE_TIME TEXT, CREATE_TIME TEXT, TABLE_COMMENT TEXT);"
+            "CREATE TABLE information_schema.columns (TABLE_SCHEMA TEXT, TABLE_NAME TEXT, COLUMN_NAME TEXT,"
+            " ORDINAL_POSITION INTEGER, COLUMN_TYPE TEXT, COLUMN_COMMENT TEXT);"
+        )
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM main.sqlite_master WHERE type = 'table' ORDER BY name"
+        )]
+        conn.execute("BEGIN")
+        for table in tables:
+            rows = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            conn.execute(
+                "INSERT INTO information_schema.tables VALUES (?, ?, ?, ?, ?, ?)",
+                (self.db_name, table, rows, now, now, TABLE_COMMENTS.get(table, "")),
+            )
+            for position, column in enumerate(conn.execute(f"PRAGMA table_info({table})"), 1):
+                conn.execute(
+                    "INSERT INTO information_schema.columns VALUES (?, ?, ?, ?, ?, ?)",
+                    (self.db_name, table, column[1], position, column[2].lower(), COLUMN_COMMENTS.get((table, column[1]), "")),
+                )
+        conn.execute("COMMIT")
+
+    def close(self):
+        """关闭所有线程的连接。"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
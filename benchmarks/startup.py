@@ -0,0 +1,185 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import datetime
+import subprocess
+
+# 将项目根目录添加到Python路径中
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+from benchmarks.recorder import percentile  # noqa: E402
+from benchmarks.run_benchmarks import git_revision, _change  # noqa: E402
+
+# 启动阶段开销较大的第三方模块，用于观察哪些场景提前加载了它们
+HEAVY_MODULES = ("numpy", "requests", "pymysql", "yaml")
+
+# 导入包根目录（__init__.py）：与其他场景不同，需要从上级目录按包名导入
+_IMPORT_PACKAGE = (
+    "import importlib\n"
+    f"sys.path.insert(0, {os.path.dirname(PROJECT_ROOT)!r})\n"
+    f"importlib.import_module({os.path.basename(PROJECT_ROOT)!r})\n"
+)
+
+# 场景名 -> 在新进程中计时执行的代码
+SCENARIOS = {
+    'import_package': _IMPORT_PACKAGE,
+    'import_main': "import main\n",
+    'construct_pipeline': "from pipeline import QueryPipeline\nQueryPipeline()\n",
+    'route_rule_input': (
+        "from pipeline import QueryPipeline\n"
+        "pipeline = QueryPipeline()\n"
+        "pipeline.plan_agent.determine_agent('执行规则 R001')\n"
+    ),
+}
+
+# 子进程模板：计时执行场景代码，最后一行输出 JSON 结果
+_CHILD_TEMPLATE = """\
+import sys, time, json
+sys.path.insert(0, {root!r})
+_start = time.perf_counter()
+{code}
+_elapsed = time.perf_counter() - _start
+print(json.dumps({{
+    'seconds': _elapsed,
+    'modules': len(sys.modules),
+    'heavy_modules': [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def run_child(code, env):
+    """
+    在新的 Python 进程中执行场景代码。
+
+    参数:
+        code (str): 场景代码。
+        env (dict): 子进程的环境变量。
+
+    返回:
+        dict: 进程内耗时（seconds）、进程总耗时（process_seconds）、已加载模块数和已加载的重量级模块。
+
+    抛出:
+        RuntimeError: 如果子进程执行失败。
+    """
+    script = _CHILD_TEMPLATE.format(root=PROJECT_ROOT, code=code, heavy=HEAVY_MODULES)
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-c", script], cwd=PROJECT_ROOT, env=env, capture_output=True, text=True
+    )
+    process_seconds = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"子进程执行失败：{completed.stderr.strip()}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['process_seconds'] = process_seconds
+    return result
+
+
+def summarize(samples):
+    """汇总同一场景多次运行的结果（毫秒）。"""
+    in_process = sorted(sample['seconds'] * 1000 for sample in samples)
+    process = sorted(sample['process_seconds'] * 1000 for sample in samples)
+    return {
+        'runs': len(samples),
+        'p50_ms': percentile(in_process, 0.5),
+        'min_ms': in_process[0],
+        'max_ms': in_process[-1],
+        'process_p50_ms': percentile(process, 0.5),
+        'modules': samples[-1]['modules'],
+        'heavy_modules': samples[-1]['heavy_modules'],
+    }
+
+
+def run_scenario(name, repeat, env):
+    """先运行一次预热（生成字节码缓存，不计入结果），再运行 repeat 次并汇总。"""
+    run_child(SCENARIOS[name], env)
+    return summarize([run_child(SCENARIOS[name], env) for _ in range(repeat)])
+
+
+def format_report(report):
+    """将启动基准结果格式化为文本表格。"""
+    meta = report['meta']
+    lines = [
+        f"提交: {meta['commit']}{'（有未提交的修改）' if meta['dirty'] else ''}  Python {meta['python']}  {meta['platform']}",
+        f"每个场景运行 {meta['params']['repeat']} 次（另有 1 次预热）",
+        "",
+        f"{'场景':<22}{'p50ms':>10}{'最小ms':>10}{'最大ms':>10}{'进程ms':>10}{'模块数':>8}  已加载",
+    ]
+    for name, result in report['scenarios'].items():
+        lines.append(
+            f"{name:<22}{result['p50_ms']:>10.1f}{result['min_ms']:>10.1f}{result['max_ms']:>10.1f}"
+            f"{result['process_p50_ms']:>10.1f}{result['modules']:>8}  {', '.join(result['heavy_modules']) or '-'}"
+        )
+    return "\n".join(lines)
+
+
+def format_comparison(report, baseline):
+    """与之前保存的结果逐项比较进程内耗时和进程总耗时的 p50（负数表示更快）。"""
+    lines = [f"与 {baseline['meta']['commit']} 比较（{baseline['meta']['timestamp']}）："]
+    lines.append(f"{'场景':<22}{'p50ms':>20}{'变化':>9}{'进程ms':>20}{'变化':>9}")
+    for name, result in report['scenarios'].items():
+        old = baseline['scenarios'].get(name)
+        if old is None:
+            continue
+        lines.append(
+            f"{name:<22}{old['p50_ms']:>9.1f} -> {result['p50_ms']:<7.1f}{_change(result['p50_ms'], old['p50_ms']):>9}"
+            f"{old['process_p50_ms']:>9.1f} -> {result['process_p50_ms']:<7.1f}"
+            f"{_change(result['process_p50_ms'], old['process_p50_ms']):>9}"
+        )
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="启动开销基准：在新进程中测量导入和构造各组件的耗时")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"逗号分隔的场景列表（默认 {','.join(SCENARIOS)}）")
+    parser.add_argument("--repeat", type=int, default=10, help="每个场景的运行次数（默认 10）")
+    parser.add_argument("--output", help="将结果保存为 JSON 文件，供之后 --compare 使用")
+    parser.add_argument("--compare", help="与之前保存的 JSON 结果比较")
+    args = parser.parse_args(argv)
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知的场景: {', '.join(unknown)}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # 旧版本在构造 LLMClient 时就要求设置密钥，这里提供一个占位值，使修改前后的结果可以比较
+    env = dict(os.environ)
+    env.setdefault("DASHSCOPE_API_KEY", "benchmark")
+
+    commit, dirty = git_revision()
+    report = {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': {'scenarios': args.scenarios, 'repeat': args.repeat},
+        },
+        'scenarios': {},
+    }
+    for name in args.scenarios:
+        print(f"运行场景 {name} ...", file=sys.stderr)
+        report['scenarios'][name] = run_scenario(name, args.repeat, env)
+
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到 {args.output}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        print("")
+        print(format_comparison(report, baseline))
+
+
+if __name__ == "__main__":
+    main()
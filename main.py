@@ -1,20 +1,61 @@
-from agents.plan_agent import PlanAgent
-from agents.data_query_agent import DataQueryAgent
-from agents.rule_config_agent import RuleConfigAgent
-from agents.rule_executor_agent import RuleExecutorAgent
-from utils.context_manager import ContextManager
-from utils.logger import logger  # 导入日志模块
+from pipeline import QueryPipeline
+from utils.context_manager import ContextManager, get_context_store
+from utils.output_verifier import create_output_verifier, verdict_passed
+from utils.tracing import get_tracer, bind_context
+from utils.logger import logger, add_file_handler, configure_logging, DEFAULT_LOGGING_CONFIG, LOGS_DIR  # 导入日志模块
+from utils.config import get_section
+from concurrent.futures import ThreadPoolExecutor
 import traceback  # 用于错误追踪
+import argparse
 import yaml
 import os
+import threading
 import logging  # 缺失的logging模块已补全
 
-def load_test_cases():
+# 测试模式下默认并发执行的依赖链数量
+DEFAULT_TEST_CONCURRENCY = 4
+
+# 并发执行测试用例时避免多个线程的输出交错
+_print_lock = threading.Lock()
+
+# 交互模式的会话编号（配置了会话快照时，重新启动后可以继续上一次的对话）
+CLI_SESSION_ID = "cli"
+
+# 默认的测试用例文件
+TEST_CASES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tests', 'test_cases.yaml')
+
+
+def load_test_cases(test_cases_file=TEST_CASES_FILE):
     """加载测试用例文件"""
-    test_cases_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tests', 'test_cases.yaml')
     with open(test_cases_file, 'r', encoding='utf-8') as file:
         return yaml.safe_load(file)
 
+
+def parse_selection(choice, test_cases):
+    """
+    解析测试用例选择：数字n执行第n个，0执行全部，m,n执行第m到n个
+    返回值: (起始编号, 结束编号)，输入无效时返回 None
+    """
+    choice = str(choice).strip()
+    if choice.lower() == 'all':
+        choice = '0'
+    # 如果输入包含逗号，则作为范围处理
+    if ',' in choice:
+        start, end = map(int, choice.split(','))
+        if 1 <= start <= end <= len(test_cases):
+            return start, end
+    # 否则作为单个数字处理
+    else:
+        num = int(choice)
+        if num == 0:
+            # 执行所有测试用例
+            return 1, len(test_cases)
+        elif 1 <= num <= len(test_cases):
+            # 只执行指定的测试用例
+            return num, num
+    return None
+
+
 def select_test_cases(test_cases):
     """
     让用户选择要执行的测试用例
@@ -22,163 +63,264 @@ def select_test_cases(test_cases):
     """
     print("共有 {} 个测试用例可用:".format(len(test_cases)))
     for i, test_case in enumerate(test_cases):
-        print("{}. {} ({})".format(i+1, test_case['input'], test_case['purpose']))
+        print("{}. {} ({})".format(i + 1, test_case['input'], test_case['purpose']))
 
     while True:
         choice = input("请输入您想执行的测试用例(输入数字n执行第n个，输入0执行全部，输入m,n执行第m到n个): ")
         try:
-            # 如果输入包含逗号，则作为范围处理
-            if ',' in choice:
-                start, end = map(int, choice.split(','))
-                if 1 <= start <= end <= len(test_cases):
-                    return test_cases[start-1:end], start, end
-            # 否则作为单个数字处理
-            else:
-                num = int(choice)
-                if num == 0:
-                    # 执行所有测试用例
-                    return test_cases, 1, len(test_cases)
-                elif 1 <= num <= len(test_cases):
-                    # 只执行指定的测试用例
-                    return [test_cases[num-1]], num, num
+            selection = parse_selection(choice, test_cases)
+            if selection:
+                start, end = selection
+                return test_cases[start - 1:end], start, end
 
             print("输入无效，请输入有效的测试用例编号")
         except ValueError:
             print("输入格式错误，请输入数字")
 
-def run_tests(data_query_agent, plan_agent, rule_executor_agent, rule_config_agent, context_manager, test_logger):
+
+def build_dependency_chains(test_cases, start, end):
+    """
+    将第start到end个测试用例划分为依赖链
+    含有上下文引用的用例（如“分别是哪几张？”）或通过 depends_on 指定前置用例 id 的用例，
+    与其前置用例归入同一条链；链内按原顺序执行并共享 ContextManager，不同的链互不影响
+    返回值: 依赖链列表，每条链是按顺序排列的用例编号（从1开始）
+    """
+    chain_of = {}
+    chains = []
+    ids = {test_case.get('id'): idx for idx, test_case in enumerate(test_cases, 1) if test_case.get('id') is not None}
+    for idx in range(start, end + 1):
+        test_case = test_cases[idx - 1]
+        parent = None
+        if test_case.get('depends_on') is not None:
+            parent = ids.get(test_case['depends_on'])
+        elif ContextManager.references_context(test_case['input']) and idx > start:
+            parent = idx - 1
+        if parent in chain_of:
+            chain = chain_of[parent]
+        else:
+            chain = []
+            chains.append(chain)
+        chain.append(idx)
+        chain_of[idx] = chain
+    return chains
+
+
+def run_test_case(pipeline, context_manager, test_case, idx):
+    """
+    执行单个测试用例，实际输出写入 test_case 的 actual_output 字段（格式验证在全部用例执行完后统一进行）
+    返回值: (改写后的输入, 代理类型)
+    """
+    with _print_lock:
+        print(f"执行测试用例: {test_case['input']} (第{idx}项)")
+
+    # 上下文扩展 → 意图识别 → 代理执行 → 更新上下文
+    expanded_input, agent_type, result = pipeline.run(test_case['input'], context_manager)
+
+    # 更新测试用例实际输出
+    test_case['actual_output'] = str(result)  # 确保输出是字符串格式
+    test_case['status'] = None
+    return expanded_input, agent_type
+
+
+def verify_test_cases(pipeline, test_cases, indices, concurrency):
+    """
+    验证测试用例的输出格式：可机器检查的格式在本地判定，其余用例批量交给大模型验证
+    结果写入 test_case 的 status 字段，返回值: {用例编号: 验证结果}
+    """
+    # 执行出错的用例已标记为失败，无需验证
+    pending = [idx for idx in indices if test_cases[idx - 1]['status'] is None]
+    verifier = create_output_verifier(pipeline.data_query_agent.llm)
+    items = [(test_cases[idx - 1].get('expected_output_format', ''), test_cases[idx - 1]['actual_output']) for idx in pending]
+    verdicts = {}
+    with get_tracer().span("tests.verify", cases=len(items)) as span:
+        results = verifier.verify_all(items, concurrency)
+        span.set(**verifier.stats())
+    for idx, (verdict, source) in zip(pending, results):
+        verdict = verdict or ""
+        logger.info("第%s项验证结果（%s）：%s", idx, source, verdict)
+        # 解析结果：只看验证结果开头的状态，“未通过”“失败: 未通过格式要求”均为失败
+        test_cases[idx - 1]['status'] = "通过" if verdict_passed(verdict) else "失败"
+        verdicts[idx] = verdict
+    logger.info("输出格式验证统计: %s", verifier.stats())
+    return verdicts
+
+
+def run_chain(pipeline, test_cases, chain):
+    """
+    按顺序执行一条依赖链上的测试用例，链内共享一个 ContextManager
+    返回值: {用例编号: (改写后的输入, 代理类型)}
+    """
+    context_manager = ContextManager()
+    runs = {}
+    for idx in chain:
+        test_case = test_cases[idx - 1]
+        try:
+            runs[idx] = run_test_case(pipeline, context_manager, test_case, idx)
+        except Exception as e:
+            logger.error("测试用例 %s 执行异常: %s", test_case['input'], traceback.format_exc())
+            test_case['actual_output'] = f"执行测试用例时出错：{str(e)}"
+            test_case['status'] = "失败"
+            runs[idx] = (test_case['input'], None)
+    return runs
+
+
+def run_tests(pipeline, test_logger, selection=None, concurrency=DEFAULT_TEST_CONCURRENCY, test_cases_file=TEST_CASES_FILE):
     """
     执行测试用例函数
-    读取测试用例文件，执行每个测试用例，并记录结果
+    读取测试用例文件，按依赖链并发执行选定的测试用例，并按原顺序记录结果
+    selection 为 None 时交互式选择，否则按 parse_selection 的格式解析
+    返回值: (通过数, 失败数)
     """
     # 获取测试用例文件路径
-    test_cases = load_test_cases()
+    test_cases = load_test_cases(test_cases_file)
     
     # 选择要执行的测试用例
-    selected_test_cases, start, end = select_test_cases(test_cases)
+    if selection is None:
+        _, start, end = select_test_cases(test_cases)
+    else:
+        parsed = parse_selection(selection, test_cases)
+        if not parsed:
+            raise ValueError(f"无效的测试用例选择: {selection}")
+        start, end = parsed
+
+    # 独立的依赖链在线程池中并发执行
+    chains = build_dependency_chains(test_cases, start, end)
+    workers = max(min(concurrency, len(chains)), 1)
+    logger.info("共 %s 个测试用例，%s 条依赖链，并发数 %s", end - start + 1, len(chains), workers)
+    runs = {}
+    # 整次测试是一个请求，每个用例的处理流程是其下的子请求
+    with get_tracer().request("tests.run", cases=end - start + 1, chains=len(chains)):
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="test-runner") as executor:
+            for future in [executor.submit(bind_context(run_chain), pipeline, test_cases, chain) for chain in chains]:
+                runs.update(future.result())
+
+        # 全部执行完后统一验证输出格式
+        verdicts = verify_test_cases(pipeline, test_cases, range(start, end + 1), concurrency)
     
     # 输出测试摘要
     passed = 0
     failed = 0
     
-    # 执行每个测试用例
-    for idx in range(start, end+1):
-        test_case = test_cases[idx-1]  # 转换为0-based索引
-        print(f"执行测试用例: {test_case['input']} (第{idx}项)")
-        
-        # 使用上下文扩展用户输入
-        expanded_input = context_manager.expand_query_with_context(test_case['input'])
+    # 按原顺序记录每个测试用例的结果
+    for idx in range(start, end + 1):
+        test_case = test_cases[idx - 1]  # 转换为0-based索引
+        expanded_input, agent_type = runs[idx]
+        expected_format = test_case.get('expected_output_format', '')
+        actual_output = test_case['actual_output']
         
         # 记录改写后的输入
-        logger.info(f"改写后的输入: {expanded_input}")
-        test_logger.info(f"改写后的输入: {expanded_input}")
-        test_logger.debug(f"改写后的输入详细记录: {expanded_input}")
+        test_logger.info("改写后的输入: %s", expanded_input)
+        test_logger.debug("改写后的输入详细记录: %s", expanded_input)
         
-        # 确定代理类型
-        agent_type = plan_agent.determine_agent(expanded_input)
-        logger.info(f"识别到的代理类型: {agent_type}")
-        test_logger.info(f"识别到的代理类型: {agent_type}")
-        test_logger.debug(f"代理类型识别详情：输入内容: {expanded_input}, 识别结果: {agent_type}")
-        
-        # 执行查询
-        if agent_type == "data_query":
-            result = data_query_agent.handle_query(expanded_input)
-        elif agent_type == "rule_executor":
-            rule_id = test_case['input'].replace("执行规则", "").strip()
-            result = rule_executor_agent.execute_rule(rule_id)
-        elif agent_type == "rule_config":
-            result = rule_config_agent.handle_rule_config(expanded_input)
-        else:
-            result = "无法识别您的需求类型，请重新描述。"
-            
-        # 更新上下文
-        context_manager.update_context(expanded_input, result)
+        # 记录代理类型
+        test_logger.info("识别到的代理类型: %s", agent_type)
+        test_logger.debug("代理类型识别详情：输入内容: %s, 识别结果: %s", expanded_input, agent_type)
         
         # 记录输出结果
-        logger.info(f"给用户的输出: {result}")
-        test_logger.info(f"测试结果: {result}")
-        test_logger.debug(f"完整输出结果: {result}")
+        test_logger.info("测试结果: %s", actual_output)
+        test_logger.debug("完整输出结果: %s", actual_output)
         
-        # 更新测试用例实际输出
-        test_case['actual_output'] = str(result)  # 确保输出是字符串格式
+        test_logger.info("验证结果: %s", verdicts.get(idx, '执行出错，未验证'))
         
-        # 检查输出是否符合预期
-        expected_format = test_case.get('expected_output_format', '')
-        actual_output = test_case['actual_output']
-        
-        # 使用LLM判断输出是否符合期望格式
-        prompt = f"你是一个格式验证专家。请严格按以下步骤验证实际输出是否符合期望格式要求：\n\n1. 期望输出格式: {expected_format}\n2. 实际输出: {actual_output}\n\n请回答'通过'或'失败'，然后给出验证理由。\n\n注意：只返回验证结果和理由，不要包含其他内容。\n\n示例回答：\n通过: 输出符合期望的自然语言描述格式，正确报告了表数量。\n或者\n失败: 输出不符合表格格式要求，缺少psql风格的表格边框。\n\n"
-        
-        logger.info(f"使用大模型验证输出格式，提示词内容：{prompt}")
-        result = data_query_agent.llm.verify_output_format(expected_format, actual_output)
-        logger.info(f"大模型验证结果：{result}")
-        
-        # 解析结果
-        if result.startswith("通过"):
-            test_case['status'] = "通过"
+        print(f"测试用例: {test_case['input']} (第{idx}项)")
+        if test_case['status'] == "通过":
             passed += 1
             print("测试结果: 通过")
-            test_logger.info(f"测试用例 {test_case['input']} 执行成功。")
+            test_logger.info("测试用例 %s 执行成功。", test_case['input'])
         else:
-            # 检查大模型返回的结果是否包含'通过'关键词（可能在理由部分）
-            if "通过" in result:
-                test_case['status'] = "通过"
-                passed += 1
-                print("测试结果: 通过")
-                test_logger.info(f"测试用例 {test_case['input']} 执行成功。")
-            else:
-                test_case['status'] = "失败"
-                failed += 1
-                print("测试结果: 失败")
-                print(f"期望输出格式: {expected_format}")
-                print(f"实际输出: {actual_output}")
-                test_logger.info(f"测试用例 {test_case['input']} 执行失败。")
-                test_logger.info(f"  期望输出格式: {expected_format}")
-                test_logger.info(f"  实际输出: {actual_output}")
+            failed += 1
+            print("测试结果: 失败")
+            print(f"期望输出格式: {expected_format}")
+            print(f"实际输出: {actual_output}")
+            test_logger.info("测试用例 %s 执行失败。", test_case['input'])
+            test_logger.info("  期望输出格式: %s", expected_format)
+            test_logger.info("  实际输出: %s", actual_output)
         print("-----------------------------")
-        test_logger.info(f"测试用例 {test_case['input']} 原始数据：")
-        test_logger.info(f"  输入: {test_case['input']}")
-        test_logger.info(f"  测试目的: {test_case['purpose']}")
-        test_logger.info(f"  期望输出格式: {test_case['expected_output_format']}")
-        test_logger.info(f"  实际输出: {test_case['actual_output']}")
-        test_logger.info(f"  测试状态: {test_case['status']}")
+        test_logger.info("测试用例 %s 原始数据：", test_case['input'])
+        test_logger.info("  输入: %s", test_case['input'])
+        test_logger.info("  测试目的: %s", test_case['purpose'])
+        test_logger.info("  期望输出格式: %s", test_case['expected_output_format'])
+        test_logger.info("  实际输出: %s", test_case['actual_output'])
+        test_logger.info("  测试状态: %s", test_case['status'])
         test_logger.info("----------------------------------------")
     
     # 写回所有测试结果（不仅仅是选中的）
-    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tests', 'test_cases.yaml'), 'w', encoding='utf-8') as file:
+    with open(test_cases_file, 'w', encoding='utf-8') as file:
         yaml.dump(test_cases, file, allow_unicode=True, sort_keys=False)
     
     # 输出测试摘要
     summary = f"\n测试完成: 通过={passed}, 失败={failed}"
     print(summary)
     test_logger.info(summary)
+    return passed, failed
 
-def main():
-    # 创建日志记录器
-    test_logger = None
-    logs_dir = os.path.join(os.path.dirname(__file__), 'logs')
-    if not os.path.exists(logs_dir):
-        os.makedirs(logs_dir)
-    
-    # 创建文件处理器
-    log_filename = os.path.join(logs_dir, 'test_execution.log')
-    file_handler = logging.FileHandler(log_filename, encoding='utf-8')
-    formatter = logging.Formatter('%(asctime)s - %(message)s')
-    file_handler.setFormatter(formatter)
-    
-    # 将处理器添加到记录器
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="智能查询与数据校验代理")
+    parser.add_argument(
+        "--tests", metavar="SELECTION",
+        help="非交互地执行 test_cases.yaml 中的测试用例：all 或 0 执行全部，n 执行第n个，m,n 执行第m到n个",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=DEFAULT_TEST_CONCURRENCY,
+        help=f"并发执行的依赖链数量（默认 {DEFAULT_TEST_CONCURRENCY}）",
+    )
+    parser.add_argument(
+        "--no-stream", action="store_true",
+        help="交互模式下等回答完整生成后再输出（默认边生成边输出）",
+    )
+    return parser.parse_args(argv)
+
+
+def print_streamed(pipeline, user_input, context_manager):
+    """
+    处理一条输入，数据查询的回答边生成边打印，其余输出在处理完成后打印。
+
+    返回:
+        str: 完整输出。
+    """
+    printed = []
+
+    def print_chunk(chunk):
+        printed.append(chunk)
+        print(chunk, end="", flush=True)
+
+    result = pipeline.run(user_input, context_manager, on_chunk=print_chunk).result
+    if not printed:
+        print(result)
+    else:
+        print()
+        # 流式输出中途失败时，返回的是错误提示而不是已打印的内容
+        if "".join(printed) != result:
+            print(result)
+    return result
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # 按 model_config.yaml 的 logging 节调整日志级别、格式、轮转和截断
+    configure_logging(get_section("model_config.yaml", "logging", DEFAULT_LOGGING_CONFIG))
+
+    # 创建测试日志记录器，经由日志队列写入单独的文件（首次写入时才创建logs目录和文件）
     test_logger = logging.getLogger('test_execution')
     test_logger.setLevel(logging.INFO)
-    test_logger.addHandler(file_handler)
+    add_file_handler(
+        os.path.join(LOGS_DIR, 'test_execution.log'), 'test_execution', logging.Formatter('%(asctime)s - %(message)s')
+    )
     
     try:
-        plan_agent = PlanAgent()
-        data_query_agent = DataQueryAgent()
-        rule_config_agent = RuleConfigAgent()  # 添加这一行来创建rule_config_agent实例
-        rule_executor_agent = RuleExecutorAgent()
-        context_manager = ContextManager()
+        pipeline = QueryPipeline()
+        context_manager = get_context_store().get(CLI_SESSION_ID)
 
         logger.info("程序初始化成功")
+
+        # 指定 --tests 时非交互地执行测试用例后退出
+        if args.tests is not None:
+            logger.info("命令行指定执行测试用例: %s", args.tests)
+            run_tests(pipeline, test_logger, args.tests, args.concurrency)
+            return
         
         # 新增逻辑：让用户选择是从测试用例运行还是从终端输入
         while True:
@@ -186,7 +328,7 @@ def main():
             if mode_choice == '1':
                 logger.info("用户选择从测试用例运行")
                 # 运行测试用例
-                run_tests(data_query_agent, plan_agent, rule_executor_agent, rule_config_agent, context_manager, test_logger)
+                run_tests(pipeline, test_logger, concurrency=args.concurrency)
                 break  # 测试完成后退出
             elif mode_choice == '' or mode_choice == '2':
                 logger.info("用户选择从终端获取用户输入")
@@ -209,35 +351,20 @@ def main():
                 logger.info("用户请求退出程序")
                 break
 
-            # 使用上下文扩展用户输入
-            expanded_input = context_manager.expand_query_with_context(user_input)
-            
-            # 记录用户输入和改写后的输入
-            logger.info(f"用户输入: {user_input}")
-            logger.info(f"改写后的输入: {expanded_input}")
+            logger.info("用户输入: %s", user_input)
             
-            agent_type = plan_agent.determine_agent(expanded_input)
-            logger.info(f"识别到的代理类型: {agent_type}")
-            
-            if agent_type == "data_query":
-                result = data_query_agent.handle_query(expanded_input)
-            elif agent_type == "rule_executor":
-                rule_id = user_input.replace("执行规则", "").strip()
-                result = rule_executor_agent.execute_rule(rule_id)
-            elif agent_type == "rule_config":
-                result = rule_config_agent.handle_rule_config(expanded_input)
+            # 上下文扩展 → 意图识别 → 代理执行 → 更新上下文
+            if args.no_stream:
+                print(pipeline.run(user_input, context_manager).result)
             else:
-                result = "无法识别您的需求类型，请重新描述。"
-                
-            # 更新上下文
-            context_manager.update_context(expanded_input, result)
-            
-            # 记录输出结果
-            logger.info(f"给用户的输出: {result}")
-            print(result)
+                print_streamed(pipeline, user_input, context_manager)
+
+    except Exception:
+        logger.error("程序运行时发生错误: %s", traceback.format_exc())
+    finally:
+        # 写出会话快照（未配置 snapshot_path 时不做任何事）
+        get_context_store().close()
 
-    except Exception as e:
-        logger.error("程序运行时发生错误: {}".format(traceback.format_exc()))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,273 @@
+import re
+import asyncio
+from collections import namedtuple
+from agents.plan_agent import PlanAgent
+from agents.rule_config_agent import RuleConfigAgent
+from utils.logger import logger
+from utils.tracing import get_tracer, current_request_id
+from utils.lazy import lazy_property
+
+logger.debug("Initializing pipeline module")
+
+# 单次处理的结果：改写后的输入、识别到的代理类型、给用户的输出
+PipelineResult = namedtuple("PipelineResult", ["expanded_input", "agent_type", "result"])
+
+UNKNOWN_INTENT_MESSAGE = "无法识别您的需求类型，请重新描述。"
+
+
+_TABLE_NAME_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+# 显式指定表名的写法，如“employees 表”、“employees表”
+_EXPLICIT_TABLE_RE = re.compile(r'([A-Za-z_][A-Za-z0-9_]*)\s*表')
+_RULE_ID_RE = re.compile(r'[A-Za-z0-9_\-]+')
+
+# 要求抽样估计而不是精确检查的关键词
+APPROXIMATE_KEYWORDS = ("抽样", "估算", "近似")
+
+
+def extract_rule_id(user_input):
+    """从“执行规则 R001”形式的原始输入中提取规则编号。"""
+    remainder = user_input.replace("执行规则", "").strip()
+    match = _RULE_ID_RE.search(remainder)
+    return match.group(0) if match else remainder
+
+
+def is_approximate_rule_request(user_input):
+    """判断输入是否要求抽样估计，如“抽样执行规则 R001”。"""
+    return any(keyword in user_input for keyword in APPROXIMATE_KEYWORDS)
+
+
+def is_batch_rule_request(user_input):
+    """判断输入是否为“执行全部规则”形式的批量执行请求。"""
+    return "全部规则" in user_input or "所有规则" in user_input
+
+
+def extract_batch_rule_options(user_input):
+    """从批量执行请求中提取执行方式：“增量执行全部规则”只检查新数据，“重建基线”全量重新建立增量基线。"""
+    return {'incremental': "增量" in user_input, 'rebaseline': "重建基线" in user_input}
+
+
+def extract_rule_table(user_input, table_names=()):
+    """
+    从批量执行请求中提取表名：优先取“执行 employees 表的全部规则”形式的显式写法，
+    否则取输入中与定义了规则的表同名（不区分大小写）的单词，如“执行全部规则 for employees”。
+
+    参数:
+        user_input (str): 原始用户输入。
+        table_names (iterable): 定义了规则的表名。
+
+    返回:
+        str: 表名，未指定表时返回 None。
+    """
+    match = _EXPLICIT_TABLE_RE.search(user_input)
+    if match:
+        return match.group(1)
+    known = {name.lower(): name for name in table_names}
+    for word in _TABLE_NAME_RE.findall(user_input):
+        if word.lower() in known:
+            return known[word.lower()]
+    return None
+
+
+class QueryPipeline:
+    """
+    串联上下文扩展、意图识别和代理执行的同步处理流程。
+
+    属性（代理在首次使用时创建）:
+        plan_agent (PlanAgent): 意图识别代理
+        data_query_agent (DataQueryAgent): 数据查询代理
+        rule_executor_agent (RuleExecutorAgent): 规则执行代理
+        rule_config_agent (RuleConfigAgent): 规则配置代理
+        tracer (Tracer): 共享的追踪器，每条输入作为一个请求记录各阶段耗时
+
+    方法:
+        run: 处理一条用户输入并更新上下文
+        dispatch: 将输入交给对应代理处理
+    """
+
+    def __init__(self, plan_agent=None, data_query_agent=None, rule_executor_agent=None, rule_config_agent=None):
+        # 未传入的代理在第一次分派到它时才创建，只处理规则的会话不会创建大模型客户端
+        for name, agent in (
+            ("plan_agent", plan_agent),
+            ("data_query_agent", data_query_agent),
+            ("rule_executor_agent", rule_executor_agent),
+            ("rule_config_agent", rule_config_agent),
+        ):
+            if agent is not None:
+                setattr(self, name, agent)
+        self.tracer = get_tracer()
+
+    @lazy_property
+    def plan_agent(self):
+        return PlanAgent()
+
+    @lazy_property
+    def data_query_agent(self):
+        # 数据查询代理依赖 numpy、requests 等较重的模块，在首次使用时才导入
+        from agents.data_query_agent import DataQueryAgent
+        return DataQueryAgent()
+
+    @lazy_property
+    def rule_executor_agent(self):
+        from agents.rule_executor_agent import RuleExecutorAgent
+        return RuleExecutorAgent()
+
+    @lazy_property
+    def rule_config_agent(self):
+        return RuleConfigAgent()
+
+    def dispatch(self, agent_type, user_input, expanded_input, on_chunk=None):
+        """
+        将输入交给对应代理处理。
+
+        参数:
+            agent_type (str): 代理类型。
+            user_input (str): 原始用户输入（用于提取规则编号）。
+            expanded_input (str): 经过上下文扩展的输入。
+            on_chunk (callable, optional): 数据查询的回答流式输出时接收每个片段的回调。
+
+        返回:
+            str: 代理的输出。
+        """
+        if agent_type == "data_query":
+            return self.data_query_agent.handle_query(expanded_input, on_chunk=on_chunk)
+        elif agent_type == "rule_executor":
+            if is_batch_rule_request(user_input):
+                table_name = extract_rule_table(user_input, self.rule_executor_agent.rule_table_names())
+                return self.rule_executor_agent.execute_all_rules(table_name, **extract_batch_rule_options(user_input))
+            return self.rule_executor_agent.execute_rule(
+                extract_rule_id(user_input), approximate=is_approximate_rule_request(user_input)
+            )
+        elif agent_type == "rule_config":
+            return self.rule_config_agent.handle_rule_config(expanded_input)
+        return UNKNOWN_INTENT_MESSAGE
+
+    def run(self, user_input, context_manager, request_id=None, on_chunk=None):
+        """
+        处理一条用户输入：上下文扩展 → 意图识别 → 代理执行 → 更新上下文。
+
+        参数:
+            user_input (str): 原始用户输入。
+            context_manager (ContextManager): 当前会话的上下文管理器。
+            request_id (str, optional): 请求编号，默认自动生成。
+            on_chunk (callable, optional): 指定时数据查询的回答以流式生成，每个片段到达后调用 on_chunk(片段)；
+                完整回答仍作为 result 返回并用于更新上下文。
+
+        返回:
+            PipelineResult: 改写后的输入、代理类型和输出。
+        """
+        with self.tracer.request("pipeline.run", request_id, input_chars=len(user_input)) as request:
+            logger.info("请求编号: %s", current_request_id())
+            with self.tracer.span("context.expand"):
+                expanded_input = context_manager.expand_query_with_context(user_input)
+            logger.info("改写后的输入: %s", expanded_input)
+
+            with self.tracer.span("intent.route") as span:
+                agent_type = self.plan_agent.determine_agent(expanded_input)
+                span.set(agent_type=agent_type)
+            logger.info("识别到的代理类型: %s", agent_type)
+
+            with self.tracer.span(f"agent.{agent_type}"):
+                result = self.dispatch(agent_type, user_input, expanded_input, on_chunk)
+
+            with self.tracer.span("context.update"):
+                context_manager.update_context(expanded_input, result)
+            request.set(agent_type=agent_type, output_chars=len(str(result)))
+            logger.info("给用户的输出: %s", result)
+            return PipelineResult(expanded_input, agent_type, result)
+
+
+class AsyncQueryPipeline:
+    """
+    QueryPipeline 的 asyncio 版本，行为与同步版本一致。
+
+    关键词层倾向数据查询时，表结构获取与意图识别（可能需要调用大模型）并行进行，
+    若最终不是数据查询则丢弃预取结果；规则请求等其他输入不预取，
+    不会因此创建数据查询代理、连接池或加载表结构。
+    同一事件循环中可以并发处理多条输入，每个会话使用各自的 ContextManager。
+
+    局限：大模型和数据库调用仍是同步实现，经 asyncio.to_thread 放到默认线程池执行，
+    每个进行中的调用占用一个线程，并发度受线程池大小和连接池上限约束，而不是由事件循环决定。
+
+    属性:
+        pipeline (QueryPipeline): 底层同步流程，代理实例与其共享。
+        data_query_agent (AsyncDataQueryAgent): 异步数据查询代理
+        rule_executor_agent (AsyncRuleExecutorAgent): 异步规则执行代理
+
+    方法:
+        run: 协程版本的 run
+    """
+
+    def __init__(self, pipeline=None):
+        self.pipeline = pipeline or QueryPipeline()
+
+    @lazy_property
+    def data_query_agent(self):
+        from agents.data_query_agent import AsyncDataQueryAgent
+        return AsyncDataQueryAgent(self.pipeline.data_query_agent)
+
+    @lazy_property
+    def rule_executor_agent(self):
+        from agents.rule_executor_agent import AsyncRuleExecutorAgent
+        return AsyncRuleExecutorAgent(self.pipeline.rule_executor_agent)
+
+    async def dispatch(self, agent_type, user_input, expanded_input, schema_task=None, on_chunk=None):
+        """
+        协程版本的 dispatch。
+
+        参数:
+            schema_task (asyncio.Task, optional): 预取表结构的任务。
+            on_chunk (callable, optional): 回答片段的回调，在线程池中被调用。
+        """
+        if agent_type == "data_query":
+            table_schema = None
+            if schema_task is not None:
+                try:
+                    table_schema = await schema_task
+                except Exception as e:
+                    # 预取失败时由代理重新获取，错误处理与同步版本保持一致
+                    logger.warning("预取表结构失败: %s", e)
+            return await self.data_query_agent.handle_query(expanded_input, table_schema, on_chunk)
+        elif agent_type == "rule_executor":
+            if is_batch_rule_request(user_input):
+                table_name = extract_rule_table(user_input, await self.rule_executor_agent.rule_table_names())
+                return await self.rule_executor_agent.execute_all_rules(
+                    table_name, **extract_batch_rule_options(user_input)
+                )
+            return await self.rule_executor_agent.execute_rule(
+                extract_rule_id(user_input), approximate=is_approximate_rule_request(user_input)
+            )
+        elif agent_type == "rule_config":
+            return self.pipeline.rule_config_agent.handle_rule_config(expanded_input)
+        return UNKNOWN_INTENT_MESSAGE
+
+    async def run(self, user_input, context_manager, request_id=None, on_chunk=None):
+        tracer = self.pipeline.tracer
+        with tracer.request("pipeline.run", request_id, input_chars=len(user_input)) as request:
+            logger.info("请求编号: %s", current_request_id())
+            with tracer.span("context.expand"):
+                expanded_input = context_manager.expand_query_with_context(user_input)
+            logger.info("改写后的输入: %s", expanded_input)
+
+            # 只有关键词层倾向数据查询时才预取表结构
+            schema_task = None
+            if self.pipeline.plan_agent.likely_agent(expanded_input) == "data_query":
+                schema_task = asyncio.ensure_future(self.data_query_agent.db.get_table_schema())
+                # 未被使用的预取结果也要取走异常，避免 "exception was never retrieved" 警告
+                schema_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+            with tracer.span("intent.route") as span:
+                agent_type = await asyncio.to_thread(self.pipeline.plan_agent.determine_agent, expanded_input)
+                span.set(agent_type=agent_type)
+            logger.info("识别到的代理类型: %s", agent_type)
+
+            if agent_type != "data_query" and schema_task is not None:
+                schema_task.cancel()
+                schema_task = None
+            with tracer.span(f"agent.{agent_type}"):
+                result = await self.dispatch(agent_type, user_input, expanded_input, schema_task, on_chunk)
+
+            with tracer.span("context.update"):
+                context_manager.update_context(expanded_input, result)
+            request.set(agent_type=agent_type, output_chars=len(str(result)))
+            logger.info("给用户的输出: %s", result)
+            return PipelineResult(expanded_input, agent_type, result)
@@ -0,0 +1,422 @@
+import json
+import time
+import uuid
+import signal
+import argparse
+import threading
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pipeline import QueryPipeline
+from utils.context_manager import get_context_store
+from utils.config import get_section
+from utils.database import close_pool, get_pool_stats
+from utils.tracing import get_tracer
+from utils.logger import logger, configure_logging, flush_logs, get_log_stats, DEFAULT_LOGGING_CONFIG
+
+logger.debug("Initializing server module")
+
+# 服务默认配置，可在 model_config.yaml 的 server 节中覆盖
+DEFAULT_SERVER_CONFIG = {
+    'host': '127.0.0.1',          # 监听地址
+    'port': 8000,                 # 监听端口
+    'max_concurrency': 16,        # 同时处理的请求数，超出的请求排队等待
+    'queue_timeout': 30,          # 排队等待的最长时间（秒），超时返回 503
+    'max_body_bytes': 65536,      # 请求体的最大字节数
+    'max_session_id_chars': 128,  # 会话编号的最大长度
+    'idle_timeout': 60,           # keep-alive 连接的空闲超时（秒）
+    'shutdown_timeout': 30,       # 停止服务时等待处理中请求完成的最长时间（秒）
+    'warmup': True,               # 启动时预先创建代理、数据库连接池和大模型会话
+}
+
+
+class HTTPError(Exception):
+    """请求无法处理时抛出，由请求处理器转换为对应状态码的 JSON 错误响应。"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class QueryService:
+    """
+    常驻的多会话查询服务：所有请求共享一个 QueryPipeline（代理、连接池和缓存只创建一次），
+    每个会话有各自的上下文，同一会话的请求按顺序处理，不同会话的请求并发处理。
+
+    属性:
+        pipeline (QueryPipeline): 共享的处理流程。
+        sessions (ContextStore): 按会话编号保存的上下文（会话数、闲置超时和快照见 model_config.yaml 的 context 节）。
+        config (dict): 服务配置，见 DEFAULT_SERVER_CONFIG。
+        draining (bool): 是否正在停止服务，停止期间拒绝新请求。
+
+    方法:
+        query: 在会话中处理一条输入
+        warmup: 预先创建代理、连接池和大模型会话
+        health: 返回服务状态
+        render_metrics: 生成 Prometheus 文本格式的指标
+        drain: 拒绝新请求并等待处理中的请求完成
+    """
+
+    def __init__(self, pipeline=None, config=None, sessions=None):
+        self.config = dict(DEFAULT_SERVER_CONFIG, **(config or {}))
+        self.pipeline = pipeline or QueryPipeline()
+        self.sessions = sessions if sessions is not None else get_context_store()
+        self.draining = False
+        self.started = time.time()
+        self._slots = threading.BoundedSemaphore(self.config['max_concurrency'])
+        self._in_flight = 0
+        self._idle = threading.Condition()
+
+    def warmup(self):
+        """预先创建代理、数据库连接池和大模型会话，使第一个请求不承担启动开销；失败时只记录警告。"""
+        start = time.perf_counter()
+        for name, action in (
+            ("意图识别代理", lambda: self.pipeline.plan_agent),
+            ("表结构", lambda: self.pipeline.data_query_agent.db.get_table_schema()),
+            ("大模型会话", lambda: self.pipeline.data_query_agent.llm.session),
+            ("规则执行代理", lambda: self.pipeline.rule_executor_agent),
+            ("规则配置代理", lambda: self.pipeline.rule_config_agent),
+        ):
+            try:
+                action()
+            except Exception as e:
+                logger.warning("预热%s失败，将在首次使用时重试: %s", name, e)
+        logger.info("服务预热完成，耗时 %.2f 秒", time.perf_counter() - start)
+
+    def _enter(self):
+        if self.draining:
+            raise HTTPError(503, "服务正在停止")
+        if not self._slots.acquire(timeout=self.config['queue_timeout']):
+            raise HTTPError(503, "服务繁忙，请稍后重试")
+        with self._idle:
+            self._in_flight += 1
+
+    def _exit(self):
+        self._slots.release()
+        with self._idle:
+            self._in_flight -= 1
+            self._idle.notify_all()
+
+    def query(self, user_input, session_id=None, request_id=None, on_chunk=None):
+        """
+        在会话中处理一条输入：上下文扩展 → 意图识别 → 代理执行 → 更新会话上下文。
+
+        参数:
+            user_input (str): 用户输入。
+            session_id (str, optional): 会话编号，未指定时创建新会话。
+            request_id (str, optional): 请求编号。
+            on_chunk (callable, optional): 数据查询的回答流式输出时接收每个片段的回调。
+
+        返回:
+            dict: session_id、request_id、expanded_input、agent_type 和 result。
+
+        抛出:
+            HTTPError: 如果服务正在停止或排队超时。
+        """
+        self._enter()
+        try:
+            session = self.sessions.get(session_id)
+            with session.lock:
+                result = self.pipeline.run(user_input, session, request_id, on_chunk)
+            return {
+                'session_id': session.session_id,
+                'request_id': request_id,
+                'expanded_input': result.expanded_input,
+                'agent_type': result.agent_type,
+                'result': str(result.result),
+            }
+        finally:
+            self._exit()
+
+    def health(self):
+        """返回服务状态：status（ok 或 draining）、运行时长、会话数和处理中的请求数。"""
+        with self._idle:
+            in_flight = self._in_flight
+        return {
+            'status': 'draining' if self.draining else 'ok',
+            'uptime_seconds': round(time.time() - self.started, 3),
+            'sessions': len(self.sessions),
+            'in_flight': in_flight,
+        }
+
+    def render_metrics(self):
+        """
+        生成 Prometheus 文本格式的指标：追踪器的各阶段指标，加上服务、日志队列和连接池的当前状态。
+
+        返回:
+            str: 指标文本。
+        """
+        health = self.health()
+        metrics = [
+            ("server_up", "gauge", "服务是否在接受请求", 0 if self.draining else 1),
+            ("server_uptime_seconds", "gauge", "服务运行时长（秒）", health['uptime_seconds']),
+            ("server_sessions", "gauge", "当前会话数", health['sessions']),
+            ("server_in_flight_requests", "gauge", "处理中的请求数", health['in_flight']),
+        ]
+        for key, value in sorted(self.sessions.stats().items()):
+            if key != 'sessions':
+                metrics.append((f"server_sessions_{key}_total", "counter", f"会话统计：{key}", value))
+        for key, value in sorted(get_log_stats().items()):
+            if key == 'queued':
+                metrics.append(("log_queue_queued", "gauge", "日志队列中待写出的条数", value))
+            else:
+                metrics.append((f"log_queue_{key}_total", "counter", f"日志队列统计：{key}", value))
+        for key, value in sorted((get_pool_stats() or {}).items()):
+            metrics.append((f"db_pool_{key}", "gauge", f"数据库连接池状态：{key}", value))
+        lines = []
+        for name, metric_type, help_text, value in metrics:
+            lines.extend([f"# HELP dqa_{name} {help_text}", f"# TYPE dqa_{name} {metric_type}", f"dqa_{name} {value}"])
+        return get_tracer().render_prometheus() + "\n".join(lines) + "\n"
+
+    def drain(self, timeout=None):
+        """
+        拒绝新请求并等待处理中的请求完成。
+
+        参数:
+            timeout (float, optional): 最长等待时间（秒），默认使用配置中的 shutdown_timeout。
+
+        返回:
+            bool: 处理中的请求是否全部完成。
+        """
+        self.draining = True
+        timeout = self.config['shutdown_timeout'] if timeout is None else timeout
+        with self._idle:
+            return self._idle.wait_for(lambda: self._in_flight == 0, timeout)
+
+
+def make_handler(service):
+    """
+    创建绑定到 service 的请求处理器类。
+
+    接口:
+        POST /query            {"input": "...", "session_id": "...", "stream": false}，
+                               stream 为真时以 SSE 返回 chunk 事件和最后的 result 事件
+        DELETE /sessions/<id>  删除会话
+        GET /health            服务状态，停止期间返回 503
+        GET /metrics           Prometheus 文本格式的指标
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        timeout = service.config['idle_timeout']
+
+        def do_GET(self):
+            self._handle(self._get)
+
+        def do_POST(self):
+            self._handle(self._post)
+
+        def do_DELETE(self):
+            self._handle(self._delete)
+
+        def _handle(self, route):
+            try:
+                route()
+            except HTTPError as e:
+                self._reply(e.status, {'error': e.message})
+            except Exception as e:
+                logger.error("处理 %s %s 时出错: %s", self.command, self.path, traceback.format_exc())
+                self._reply(500, {'error': f"处理请求时出错：{str(e)}"})
+
+        def _get(self):
+            if self.path == "/health":
+                health = service.health()
+                self._reply(503 if service.draining else 200, health)
+            elif self.path == "/metrics":
+                self._reply_text(200, service.render_metrics(), "text/plain; version=0.0.4; charset=utf-8")
+            else:
+                raise HTTPError(404, f"未知的接口: {self.path}")
+
+        def _delete(self):
+            prefix = "/sessions/"
+            if not self.path.startswith(prefix) or len(self.path) == len(prefix):
+                raise HTTPError(404, f"未知的接口: {self.path}")
+            session_id = self.path[len(prefix):]
+            if not service.sessions.remove(session_id):
+                raise HTTPError(404, f"会话不存在: {session_id}")
+            self._reply(200, {'session_id': session_id, 'deleted': True})
+
+        def _post(self):
+            if self.path != "/query":
+                raise HTTPError(404, f"未知的接口: {self.path}")
+            payload = self._read_json()
+            user_input = payload.get('input')
+            if not isinstance(user_input, str) or not user_input.strip():
+                raise HTTPError(400, "input 不能为空")
+            session_id = payload.get('session_id')
+            if session_id is not None and not isinstance(session_id, str):
+                raise HTTPError(400, "session_id 必须是字符串")
+            if session_id is not None and len(session_id) > service.config['max_session_id_chars']:
+                raise HTTPError(400, f"session_id 不能超过 {service.config['max_session_id_chars']} 个字符")
+            request_id = self.headers.get("X-Request-ID") or uuid.uuid4().hex[:12]
+            logger.info("HTTP 请求 %s，会话 %s，输入: %s", request_id, session_id, user_input)
+            if payload.get('stream'):
+                self._stream_query(user_input.strip(), session_id, request_id)
+            else:
+                self._reply(200, service.query(user_input.strip(), session_id, request_id))
+
+        def _stream_query(self, user_input, session_id, request_id):
+            """以 SSE 返回回答片段（chunk 事件）和完整结果（result 事件），使用分块传输编码以保持 keep-alive。"""
+            state = {'started': False, 'connected': True}
+
+            def send(event, data):
+                if not state['connected']:
+                    return
+                if not state['started']:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+                    self.send_header("Cache-Control", "no-cache")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.send_header("X-Request-ID", request_id)
+                    self.end_headers()
+                    state['started'] = True
+                try:
+                    self._write_chunk(f"event:{event}\ndata:{json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+                except OSError:
+                    # 客户端断开后继续处理完请求，保证会话上下文完整
+                    state['connected'] = False
+                    logger.warning("请求 %s 的客户端已断开", request_id)
+
+            try:
+                result = service.query(user_input, session_id, request_id, lambda chunk: send("chunk", {'text': chunk}))
+            except HTTPError as e:
+                if not state['started']:
+                    raise
+                result, event = {'error': e.message}, "error"
+            except Exception as e:
+                if not state['started']:
+                    raise
+                logger.error("流式处理请求 %s 时出错: %s", request_id, traceback.format_exc())
+                result, event = {'error': f"处理请求时出错：{str(e)}"}, "error"
+            else:
+                event = "result"
+            send(event, result)
+            if state['connected']:
+                self._write_chunk(b"")
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > service.config['max_body_bytes']:
+                self.close_connection = True
+                raise HTTPError(413, f"请求体超过 {service.config['max_body_bytes']} 字节")
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                raise HTTPError(400, "请求体不是有效的 JSON")
+            if not isinstance(payload, dict):
+                raise HTTPError(400, "请求体必须是 JSON 对象")
+            return payload
+
+        def _write_chunk(self, data):
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def _reply(self, status, payload):
+            self._reply_text(status, json.dumps(payload, ensure_ascii=False), "application/json; charset=utf-8")
+
+        def _reply_text(self, status, text, content_type):
+            data = text.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            if service.draining:
+                self.send_header("Connection", "close")
+                self.close_connection = True
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            logger.debug("%s - %s", self.address_string(), format % args)
+
+    return Handler
+
+
+class QueryServer:
+    """
+    在 ThreadingHTTPServer 上运行 QueryService，每个连接一个线程。
+
+    属性:
+        service (QueryService): 查询服务。
+        url (str): 服务地址。
+
+    方法:
+        serve_forever: 在当前线程中处理请求，直到 shutdown 被调用
+        shutdown: 停止接受新请求（可在其他线程或信号处理中调用）
+        close: 等待处理中的请求完成，然后释放端口和连接池，写出会话快照、指标和日志
+    """
+
+    def __init__(self, service, host=None, port=None):
+        self.service = service
+        address = (
+            service.config['host'] if host is None else host,
+            service.config['port'] if port is None else port,
+        )
+        self._server = ThreadingHTTPServer(address, make_handler(service))
+        # 空闲的 keep-alive 连接不应阻止进程退出，处理中的请求由 service.drain 等待
+        self._server.daemon_threads = True
+        self._shutdown_lock = threading.Lock()
+        self._shutting_down = False
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self):
+        logger.info("查询服务已启动: %s", self.url)
+        self._server.serve_forever()
+
+    def shutdown(self):
+        """停止接受新请求并让 serve_forever 返回；已建立的 keep-alive 连接上的新请求返回 503，可重复调用。"""
+        with self._shutdown_lock:
+            if self._shutting_down:
+                return
+            self._shutting_down = True
+        logger.info("正在停止查询服务")
+        self.service.draining = True
+        self._server.shutdown()
+
+    def close(self):
+        """等待处理中的请求完成（至多 shutdown_timeout 秒），然后关闭端口和连接池，写出会话快照、指标和日志。"""
+        if not self.service.drain():
+            logger.warning("等待 %s 秒后仍有请求未完成，强制停止", self.service.config['shutdown_timeout'])
+        self._server.server_close()
+        self.service.sessions.close()
+        close_pool()
+        get_tracer().close()
+        logger.info("查询服务已停止")
+        flush_logs()
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="以 HTTP 服务方式运行智能查询与数据校验代理")
+    parser.add_argument("--host", help=f"监听地址（默认 {DEFAULT_SERVER_CONFIG['host']}）")
+    parser.add_argument("--port", type=int, help=f"监听端口（默认 {DEFAULT_SERVER_CONFIG['port']}）")
+    parser.add_argument("--no-warmup", action="store_true", help="启动时不预先创建代理、连接池和大模型会话")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_logging(get_section("model_config.yaml", "logging", DEFAULT_LOGGING_CONFIG))
+    service = QueryService(config=get_section("model_config.yaml", "server", DEFAULT_SERVER_CONFIG))
+    if service.config['warmup'] and not args.no_warmup:
+        service.warmup()
+    server = QueryServer(service, args.host, args.port)
+
+    def handle_signal(signum, frame):
+        # serve_forever 运行在主线程中，shutdown 会等待它返回，因此在另一个线程中调用
+        threading.Thread(target=server.shutdown, name="server-shutdown").start()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    print(f"查询服务已启动: {server.url}（Ctrl+C 停止）")
+    try:
+        server.serve_forever()
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import time
+
+import pymysql
+import pytest
+
+from utils.database import ConnectionPool
+
+
+class FakeConnection:
+    def __init__(self):
+        self.open = True
+        self.rollbacks = 0
+
+    def ping(self, reconnect=False):
+        if not self.open:
+            raise pymysql.err.OperationalError(2006, "MySQL server has gone away")
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.open = False
+
+
+class FakePool(ConnectionPool):
+    def __init__(self, **kwargs):
+        super().__init__({'db': 'test'}, **kwargs)
+        self.connections = []
+
+    def _connect(self):
+        conn = FakeConnection()
+        self.connections.append(conn)
+        self._created_at[id(conn)] = time.monotonic()
+        return conn
+
+
+def test_connection_is_reused():
+    pool = FakePool(max_size=2)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        assert second is first
+    assert pool.stats() == {'size': 1, 'idle': 1, 'in_use': 0, 'max_size': 2}
+
+
+def test_checkout_times_out_when_pool_is_full():
+    pool = FakePool(max_size=1)
+    conn = pool.acquire()
+    with pytest.raises(RuntimeError):
+        pool.acquire(timeout=0.01)
+    pool.release(conn)
+    assert pool.acquire(timeout=0.01) is conn
+
+
+def test_connection_is_discarded_when_body_raises():
+    pool = FakePool(max_size=1)
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            raise ValueError("读取结果时出错")
+    assert not conn.open
+    assert pool.stats()['size'] == 0
+    with pool.connection() as replacement:
+        assert replacement is not conn
+
+
+def test_connection_is_rolled_back_and_reused_after_statement_error():
+    pool = FakePool(max_size=1)
+    with pytest.raises(pymysql.err.ProgrammingError):
+        with pool.connection() as conn:
+            raise pymysql.err.ProgrammingError(1064, "You have an error in your SQL syntax")
+    assert conn.open and conn.rollbacks == 1
+    with pool.connection() as again:
+        assert again is conn
+
+
+def test_dead_connection_is_replaced_on_checkout():
+    pool = FakePool(max_size=1)
+    with pool.connection() as conn:
+        pass
+    conn.open = False
+    with pool.connection() as replacement:
+        assert replacement is not conn and replacement.open
+
+
+def test_closed_pool_rejects_checkout():
+    pool = FakePool(max_size=1)
+    conn = pool.acquire()
+    pool.close()
+    with pytest.raises(RuntimeError):
+        pool.acquire()
+    pool.release(conn)
+    assert not conn.open
@@ -0,0 +1,61 @@
+import json
+import time
+
+from utils.context_manager import ContextStore
+
+
+def test_least_recently_used_session_is_evicted():
+    store = ContextStore(max_sessions=2, ttl=0)
+    store.get("a")
+    store.get("b")
+    store.get("a")
+    store.get("c")
+    assert store.peek("a") is not None
+    assert store.peek("b") is None
+    assert store.stats()['evicted'] == 1
+
+
+def test_idle_session_expires():
+    store = ContextStore(ttl=60)
+    session = store.get("a")
+    session.update_context("显示所有员工信息", "3 行")
+    session.last_used -= 120
+    assert store.peek("a") is None
+    assert store.get("a") is not session
+    assert store.stats()['expired'] == 1
+
+
+def test_history_is_bounded_and_clipped():
+    store = ContextStore(history_depth=2, max_result_chars=10)
+    session = store.get("a")
+    for index in range(3):
+        session.update_context(f"查询{index}", "x" * 50)
+    assert [query for query, _ in session.history] == ["查询1", "查询2"]
+    assert session.previous_result.startswith("x" * 10 + "…")
+
+
+def test_snapshot_is_restored(tmp_path):
+    path = str(tmp_path / "sessions.json")
+    store = ContextStore(snapshot_path=path, snapshot_interval=3600)
+    store.update_context("a", "显示所有员工信息", "3 行")
+    store.close()
+    assert len(json.load(open(path, encoding='utf-8'))['sessions']) == 1
+    restored = ContextStore(snapshot_path=path, snapshot_interval=3600)
+    assert restored.peek("a").previous_query == "显示所有员工信息"
+    restored.close()
+
+
+def test_unchanged_sessions_are_not_rewritten(tmp_path):
+    path = tmp_path / "sessions.json"
+    store = ContextStore(snapshot_path=str(path), snapshot_interval=3600)
+    store.get("a")
+    store.snapshot(only_changed=True)
+    assert path.exists()
+    path.unlink()
+    time.sleep(0.01)
+    store.snapshot(only_changed=True)
+    assert not path.exists()
+    store.remove("a")
+    store.snapshot(only_changed=True)
+    assert json.loads(path.read_text(encoding='utf-8'))['sessions'] == []
+    store.close()
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+import yaml
+
+from utils.intent_router import IntentRouter
+
+TEST_CASES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_cases.yaml')
+
+# test_cases.yaml 中各用例的意图，未列出的用例是数据查询
+TEST_CASE_INTENTS = {3: "rule_executor"}
+
+
+class FakeLLM:
+    def __init__(self, intent):
+        self.intent = intent
+        self.calls = []
+
+    def generate_intent(self, user_input):
+        self.calls.append(user_input)
+        return self.intent
+
+
+def load_test_cases():
+    with open(TEST_CASES_FILE, 'r', encoding='utf-8') as file:
+        return yaml.safe_load(file)
+
+
+@pytest.mark.parametrize("case", load_test_cases(), ids=lambda case: str(case['id']))
+def test_test_cases_route_without_llm(case):
+    router = IntentRouter(llm_fallback=False)
+    assert router.route(case['input']) == TEST_CASE_INTENTS.get(case['id'], "data_query")
+
+
+@pytest.mark.parametrize("user_input, intent", [
+    ("执行规则 R001", "rule_executor"),
+    ("运行规则 R002", "rule_executor"),
+    ("执行全部规则", "rule_executor"),
+    ("添加规则：员工邮箱不能为空", "rule_config"),
+    ("显示所有规则", "data_query"),
+    ("显示所有员工信息", "data_query"),
+])
+def test_keywords_decide_without_llm(user_input, intent):
+    llm = FakeLLM("unknown")
+    router = IntentRouter(llm=llm)
+    assert router.route(user_input) == intent
+    assert llm.calls == []
+
+
+@pytest.mark.parametrize("user_input", ["规则执行情况怎么样", "执行结果有哪些"])
+def test_bare_execute_is_not_enough_for_rule_executor(user_input):
+    llm = FakeLLM("data_query")
+    router = IntentRouter(llm=llm)
+    assert router.route(user_input) == "data_query"
+    assert llm.calls == [user_input]
+
+
+def test_llm_result_is_cached():
+    llm = FakeLLM("data_query")
+    router = IntentRouter(llm=llm)
+    router.route("规则执行情况怎么样")
+    assert router.route("规则执行情况怎么样？") == "data_query"
+    assert len(llm.calls) == 1
+    assert router.stats()['cache']['count'] == 1
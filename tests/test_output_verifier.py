@@ -0,0 +1,109 @@
+import pytest
+
+from utils.output_verifier import OutputVerifier, check_format_locally, verdict_passed
+
+TABLE_FORMAT = "表格格式，包含id、region、sales、order_date字段，使用psql风格的表格"
+SENTENCE_FORMAT = "自然语言描述，如'数据库中现在有X张表。'"
+
+PSQL_TABLE = """+----+--------+-------+------------+
+| id | region | sales | order_date |
++----+--------+-------+------------+
+| 1  | 华东   | 100   | 2024-01-01 |
++----+--------+-------+------------+"""
+
+
+class FakeLLM:
+    def __init__(self):
+        self.calls = []
+
+    def verify_output_format(self, expected_format, actual_output):
+        self.calls.append([(expected_format, actual_output)])
+        return "通过: 大模型判定"
+
+    def verify_output_formats(self, items):
+        self.calls.append(items)
+        return ["通过: 大模型判定"] * len(items)
+
+
+@pytest.mark.parametrize("verdict, passed", [
+    ("通过: 输出符合要求", True),
+    ("**通过**: 输出符合要求", True),
+    ("【通过】输出符合要求", True),
+    ("失败: 未通过格式检查", False),
+    ("失败: 理由中提到通过也不算", False),
+    ("", False),
+    (None, False),
+])
+def test_verdict_passed_only_looks_at_the_leading_status(verdict, passed):
+    assert verdict_passed(verdict) is passed
+
+
+def test_psql_table_with_required_columns_passes():
+    assert verdict_passed(check_format_locally(TABLE_FORMAT, PSQL_TABLE))
+
+
+def test_table_missing_a_required_column_fails():
+    output = PSQL_TABLE.replace("order_date", "created_at")
+    verdict = check_format_locally(TABLE_FORMAT, output)
+    assert not verdict_passed(verdict)
+    assert "order_date" in verdict
+
+
+def test_table_without_psql_borders_fails():
+    output = "| id | region | sales | order_date |\n| 1 | 华东 | 100 | 2024-01-01 |"
+    assert not verdict_passed(check_format_locally(TABLE_FORMAT, output))
+
+
+def test_plain_text_for_a_table_format_fails():
+    assert not verdict_passed(check_format_locally(TABLE_FORMAT, "共有 1 条记录。"))
+
+
+@pytest.mark.parametrize("output", [
+    "数据库中现在有12张表。",
+    "数据库中现在有 12 张表",
+    "查询结果：数据库中现在有3张表。",
+])
+def test_numeric_sentence_matching_the_example_passes(output):
+    assert verdict_passed(check_format_locally(SENTENCE_FORMAT, output))
+
+
+def test_table_output_for_a_sentence_format_fails():
+    assert not verdict_passed(check_format_locally(SENTENCE_FORMAT, PSQL_TABLE))
+
+
+@pytest.mark.parametrize("output", [
+    "数据库里一共有十二张表。",
+    "数据库中现在有X张表。",
+])
+def test_undecidable_sentence_is_left_to_the_llm(output):
+    assert check_format_locally(SENTENCE_FORMAT, output) is None
+
+
+def test_format_without_a_numeric_example_is_left_to_the_llm():
+    expected_format = "自然语言列表，如'数据库中包含以下表格：table1、table2、...。'"
+    assert check_format_locally(expected_format, "数据库中包含以下表格：orders、users。") is None
+
+
+def test_verify_all_batches_what_cannot_be_checked_locally():
+    llm = FakeLLM()
+    verifier = OutputVerifier(llm, batch_size=2)
+    items = [
+        (TABLE_FORMAT, PSQL_TABLE),
+        (SENTENCE_FORMAT, "数据库里一共有十二张表。"),
+        (SENTENCE_FORMAT, "数据库中现在有12张表。"),
+        (SENTENCE_FORMAT, "数据库中共有十二张表。"),
+        (SENTENCE_FORMAT, "表的数量是十二。"),
+    ]
+    results = verifier.verify_all(items)
+
+    assert [source for _, source in results] == ['local', 'llm', 'local', 'llm', 'llm']
+    assert all(verdict_passed(verdict) for verdict, _ in results)
+    assert [len(batch) for batch in llm.calls] == [2, 1]
+    assert verifier.stats() == {'local': 2, 'llm': 3, 'llm_calls': 2}
+
+
+def test_verify_all_without_local_checks_sends_everything_to_the_llm():
+    llm = FakeLLM()
+    results = OutputVerifier(llm, local_checks=False).verify_all([(TABLE_FORMAT, PSQL_TABLE)])
+    assert results == [("通过: 大模型判定", 'llm')]
+    assert len(llm.calls) == 1
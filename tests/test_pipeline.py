@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from agents.plan_agent import PlanAgent
+from pipeline import AsyncQueryPipeline, QueryPipeline, extract_rule_table
+from utils.context_manager import ContextManager
+from utils.intent_router import IntentRouter
+
+
+class FakeRuleExecutor:
+    def execute_rule(self, rule_id, approximate=False):
+        return f"规则 {rule_id} 执行完成"
+
+    def execute_all_rules(self, table_name=None, incremental=False, rebaseline=False):
+        return f"{table_name} 的全部规则执行完成"
+
+    def rule_table_names(self):
+        return ["employees", "sales_data"]
+
+
+@pytest.mark.parametrize("user_input, table_name", [
+    ("执行 employees 表的全部规则", "employees"),
+    ("执行sales_data表的所有规则", "sales_data"),
+    ("执行全部规则 for employees", "employees"),
+    ("执行全部规则 for Employees", "employees"),
+    ("执行全部规则 for everything", None),
+    ("增量执行全部规则", None),
+])
+def test_extract_rule_table(user_input, table_name):
+    assert extract_rule_table(user_input, ["employees", "sales_data"]) == table_name
+
+
+def test_async_rule_request_does_not_prefetch_schema():
+    pipeline = QueryPipeline(plan_agent=PlanAgent(router=IntentRouter(llm_fallback=False)),
+                             rule_executor_agent=FakeRuleExecutor())
+    async_pipeline = AsyncQueryPipeline(pipeline)
+    result = asyncio.run(async_pipeline.run("执行规则 R001", ContextManager()))
+    assert result.agent_type == "rule_executor"
+    assert result.result == "规则 R001 执行完成"
+    # 数据查询代理（及其连接池和表结构）没有被创建
+    assert 'data_query_agent' not in vars(pipeline)
+    assert 'data_query_agent' not in vars(async_pipeline)
+
+
+def test_batch_rule_request_targets_known_table():
+    pipeline = QueryPipeline(plan_agent=PlanAgent(router=IntentRouter(llm_fallback=False)),
+                             rule_executor_agent=FakeRuleExecutor())
+    assert pipeline.run("执行全部规则 for employees", ContextManager()).result == "employees 的全部规则执行完成"
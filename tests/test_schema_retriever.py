@@ -0,0 +1,25 @@
+from utils.schema_retriever import SchemaRetriever
+
+SCHEMA = {
+    'emp': ['id', 'name', 'email'],
+    'sales_data': ['id', 'region', 'sales'],
+    'dq_rules': ['rule_id', 'table_name'],
+    'orders': ['id', 'amount'],
+    'products': ['id', 'title'],
+    'warehouses': ['id', 'city'],
+}
+COMMENTS = {'warehouses': {'comment': '库房信息表', 'columns': {'city': '库房所在城市'}}}
+
+
+def test_comments_loaded_later_are_indexed():
+    retriever = SchemaRetriever(top_k=1, min_tables=2, include_related=False)
+    schema, report = retriever.select("库房在哪", SCHEMA, None)
+    assert schema is SCHEMA and report['reason'] == 'no_match'
+    schema, report = retriever.select("库房在哪", SCHEMA, COMMENTS)
+    assert list(schema) == ['warehouses'] and report['pruned']
+
+
+def test_small_schema_is_not_pruned():
+    retriever = SchemaRetriever(min_tables=10)
+    schema, report = retriever.select("库房在哪", SCHEMA, COMMENTS)
+    assert schema is SCHEMA and report['reason'] == 'small_schema'
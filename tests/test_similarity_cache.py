@@ -0,0 +1,22 @@
+from utils.similarity_cache import SimilarityIndex, key_terms
+
+ORDERS = "列出2024年所有订单金额大于100并且订单状态为已完成的订单，按金额从高到低排列"
+
+
+def test_chinese_filter_values_and_comparisons_are_not_reused():
+    index = SimilarityIndex(capacity=16)
+    index.add(ORDERS, "SELECT 1")
+    for changed in (
+        ORDERS.replace("已完成", "未完成"),
+        ORDERS.replace("已完成", "已取消"),
+        ORDERS.replace("大于", "小于"),
+        ORDERS.replace("高到低", "低到高"),
+    ):
+        assert key_terms(index._canonical(changed)) != key_terms(index._canonical(ORDERS))
+        assert index.lookup(changed) is None
+
+
+def test_reworded_question_is_reused():
+    index = SimilarityIndex(capacity=16)
+    index.add("显示所有员工信息", "SELECT 1")
+    assert index.lookup("帮我查看一下全部员工信息")[0] == "SELECT 1"
@@ -0,0 +1,43 @@
+import sqlite3
+
+from utils.sql_cache import SQLCache
+
+SCHEMA = {'employees': ['id', 'name', 'email']}
+
+
+def last_used(path):
+    with sqlite3.connect(path) as conn:
+        return dict(conn.execute("SELECT question, last_used FROM sql_cache").fetchall())
+
+
+def test_normalized_question_hits_cache():
+    cache = SQLCache(memory_size=4)
+    cache.put("显示所有员工信息", "SELECT * FROM employees", SCHEMA)
+    assert cache.get("显示所有员工信息。", SCHEMA) == "SELECT * FROM employees"
+    assert cache.get("显示所有员工信息", {'employees': ['id']}) is None
+
+
+def test_disk_hit_defers_last_used_until_close(tmp_path):
+    path = str(tmp_path / "sql_cache.sqlite3")
+    cache = SQLCache(memory_size=1, disk_path=path)
+    cache.put("显示所有员工信息", "SELECT * FROM employees", SCHEMA)
+    cache.put("显示所有销售数据", "SELECT * FROM sales_data", SCHEMA)
+    before = last_used(path)
+    assert cache.get("显示所有员工信息", SCHEMA) == "SELECT * FROM employees"
+    assert cache.stats()['disk_hits'] == 1
+    assert last_used(path) == before
+    cache.close()
+    after = last_used(path)
+    assert after["显示所有员工信息"] > before["显示所有员工信息"]
+    assert after["显示所有销售数据"] == before["显示所有销售数据"]
+
+
+def test_pending_last_used_is_written_before_eviction(tmp_path):
+    path = str(tmp_path / "sql_cache.sqlite3")
+    cache = SQLCache(memory_size=1, disk_path=path, max_disk_entries=2)
+    cache.put("q1", "SELECT 1")
+    cache.put("q2", "SELECT 2")
+    cache.get("q1")
+    cache.put("q3", "SELECT 3")
+    assert set(last_used(path)) == {"q1", "q3"}
+    cache.close()
@@ -0,0 +1,66 @@
+import pytest
+
+from utils.sql_guard import SQLGuard, SQLGuardError, parse_sql
+
+
+def explain_rows(rows):
+    return lambda sql: [{'id': 1, 'rows': rows}]
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM t /*!50000 UNION SELECT * FROM mysql.user */",
+    "SELECT * FROM t INTO OUTFILE '/tmp/t.csv'",
+    "SELECT * FROM t FOR UPDATE",
+    "SELECT * FROM t; DROP TABLE t",
+    "SELECT * FROM t WHERE name = 'a' OR 1=1",
+    "SELECT * FROM t WHERE name = '' OR '1'='1'",
+    "DELETE FROM t",
+])
+def test_unsafe_sql_is_rejected(sql):
+    with pytest.raises(SQLGuardError):
+        parse_sql(sql)
+
+
+def test_limit_is_added_with_one_probe_row():
+    guarded = SQLGuard(max_rows=100, max_execution_time=0).check("SELECT * FROM t;")
+    assert guarded.sql == "SELECT * FROM t LIMIT 101"
+    assert guarded.limit == 100 and guarded.limited
+
+
+def test_limit_over_max_rows_is_tightened():
+    guarded = SQLGuard(max_rows=100, max_execution_time=0).check("SELECT * FROM t LIMIT 20, 5000")
+    assert guarded.sql == "SELECT * FROM t LIMIT 20, 101"
+    assert guarded.limit == 100 and guarded.limited
+
+
+def test_limit_within_max_rows_is_kept():
+    guarded = SQLGuard(max_rows=100, max_execution_time=0).check("SELECT * FROM t LIMIT 50")
+    assert guarded.sql == "SELECT * FROM t LIMIT 50"
+    assert guarded.limit == 50 and not guarded.limited
+
+
+def test_select_gets_execution_time_hint():
+    guarded = SQLGuard(max_rows=100, max_execution_time=2).check("SELECT * FROM t")
+    assert guarded.sql == "SELECT /*+ MAX_EXECUTION_TIME(2000) */ * FROM t LIMIT 101"
+
+
+def test_large_scan_is_downgraded_when_streamable():
+    guard = SQLGuard(max_rows=100, max_explain_rows=1000, downgrade_rows=10, max_execution_time=0)
+    guarded = guard.check("SELECT * FROM t", explain=explain_rows(5000))
+    assert guarded.sql == "SELECT * FROM t LIMIT 11"
+    assert guarded.limit == 10 and guarded.limited and guarded.downgraded
+
+
+def test_downgrade_keeps_smaller_existing_limit():
+    guard = SQLGuard(max_rows=100, max_explain_rows=1000, downgrade_rows=10, max_execution_time=0)
+    guarded = guard.check("SELECT * FROM t LIMIT 5", explain=explain_rows(5000))
+    assert guarded.sql == "SELECT * FROM t LIMIT 5"
+    assert guarded.downgraded and not guarded.limited
+
+
+def test_large_scan_that_must_read_all_rows_is_rejected():
+    guard = SQLGuard(max_rows=100, max_explain_rows=1000, downgrade_rows=10, max_execution_time=0)
+    for sql in ("SELECT * FROM t ORDER BY name", "SELECT COUNT(*) FROM t",
+                "SELECT * FROM (SELECT * FROM t ORDER BY name) s"):
+        with pytest.raises(SQLGuardError):
+            guard.check(sql, explain=explain_rows(5000))
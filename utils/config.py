@@ -0,0 +1,64 @@
+import os
+import threading
+import yaml
+from utils.logger import logger
+
+logger.debug("Initializing config module")
+
+# 配置文件目录（项目根目录下的 config/）
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config")
+
+_config_cache = {}
+_config_lock = threading.Lock()
+
+
+def load_config(filename, required=True):
+    """
+    读取 config/ 目录下的 YAML 配置文件，结果在进程内缓存。
+
+    参数:
+        filename (str): 配置文件名，如 "db_config.yaml"。
+        required (bool): 为 False 时文件不存在返回空字典，否则抛出异常。
+
+    返回:
+        dict: 配置内容。
+
+    抛出:
+        FileNotFoundError: 如果 required 为 True 且配置文件不存在。
+    """
+    with _config_lock:
+        if filename in _config_cache:
+            return _config_cache[filename]
+
+    config_path = os.path.join(CONFIG_DIR, filename)
+    if not os.path.exists(config_path):
+        if required:
+            raise FileNotFoundError(f"配置文件不存在: {config_path}")
+        logger.debug("可选配置文件不存在，使用默认值: %s", config_path)
+        config = {}
+    else:
+        logger.info("加载配置文件: %s", config_path)
+        with open(config_path, "r", encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+
+    with _config_lock:
+        _config_cache[filename] = config
+    return config
+
+
+def get_section(filename, section, defaults=None, required=False):
+    """
+    读取配置文件中的某一节，并用默认值补全缺失的键。
+
+    参数:
+        filename (str): 配置文件名。
+        section (str): 节名称，如 "pool"。
+        defaults (dict, optional): 默认值。
+        required (bool): 配置文件是否必须存在。
+
+    返回:
+        dict: 合并默认值后的配置。
+    """
+    merged = dict(defaults or {})
+    merged.update(load_config(filename, required=required).get(section) or {})
+    return merged
@@ -1,13 +1,83 @@
+import os
+import json
+import time
+import uuid
+import threading
+from collections import OrderedDict, deque
+from utils.logger import logger
+from utils.config import get_section
+
+logger.debug("Initializing context_manager module")
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 出现这些说法时，当前查询依赖上一轮对话的上下文
+CONTEXT_REFERENCE_PHRASES = ['分别是', '有哪些', '哪几个', '具体是']
+
+# 会话上下文默认配置，可在 config/model_config.yaml 的 context 节中覆盖
+DEFAULT_CONTEXT_CONFIG = {
+    'max_sessions': 10000,       # 最多保存的会话数，超出后淘汰最久未使用的会话
+    'ttl': 1800,                 # 会话闲置多久后清除（秒），<= 0 表示不过期
+    'history_depth': 5,          # 每个会话保留的对话轮数
+    'max_query_chars': 500,      # 每轮保存的查询的最大字符数
+    'max_result_chars': 2000,    # 每轮保存的结果的最大字符数，超长部分替换为大小标记
+    'snapshot_path': '',         # 会话快照文件（相对项目根目录），启动时恢复，留空则不保存
+    'snapshot_interval': 60,     # 快照的最短写出间隔（秒）
+}
+
+
+def _clip(text, limit, marker=False):
+    """截断超过 limit 个字符的文本，limit <= 0 表示不截断；marker 为真时在末尾标注原始长度。"""
+    if limit <= 0 or len(text) <= limit:
+        return text
+    return f"{text[:limit]}…[已截断，共 {len(text)} 字符]" if marker else text[:limit]
+
+
 class ContextManager:
-    """管理对话上下文，用于查询优化和意图识别"""
-    def __init__(self):
-        self.previous_query = None
-        self.previous_result = None
+    """
+    管理一个会话的对话上下文，用于查询优化和意图识别。
+
+    只保留最近 history_depth 轮对话，每轮的查询和结果按 max_query_chars / max_result_chars 截断后保存，
+    占用的内存与查询结果的大小无关。
+
+    属性:
+        session_id (str): 会话编号，单独使用时为 None。
+        history (deque): 最近几轮的 (查询, 结果)。
+        lock (threading.Lock): 处理该会话的请求时持有，保证同一会话的请求按顺序处理。
+            请求期间一直持有，快照不使用该锁，而是在读写 history 的短锁内复制对话记录。
+        last_used (float): 最近一次使用的时间（时间戳）。
+    """
+
+    def __init__(self, session_id=None, history_depth=DEFAULT_CONTEXT_CONFIG['history_depth'],
+                 max_query_chars=DEFAULT_CONTEXT_CONFIG['max_query_chars'],
+                 max_result_chars=DEFAULT_CONTEXT_CONFIG['max_result_chars']):
+        self.session_id = session_id
+        self.history = deque(maxlen=max(history_depth, 1))
+        self.max_query_chars = max_query_chars
+        self.max_result_chars = max_result_chars
+        self.lock = threading.Lock()
+        self._history_lock = threading.Lock()
+        self.last_used = time.time()
+
+    @property
+    def previous_query(self):
+        return self.history[-1][0] if self.history else None
+
+    @property
+    def previous_result(self):
+        return self.history[-1][1] if self.history else None
 
     def update_context(self, query, result):
-        """更新上下文信息"""
-        self.previous_query = query
-        self.previous_result = result
+        """更新上下文信息（查询和结果截断后保存）"""
+        turn = (_clip(query or "", self.max_query_chars), _clip(str(result), self.max_result_chars, marker=True))
+        with self._history_lock:
+            self.history.append(turn)
+        self.last_used = time.time()
+
+    @staticmethod
+    def references_context(query):
+        """判断查询是否包含模糊的上下文引用，需要结合上一轮对话才能理解"""
+        return bool(query) and any(phrase in query.lower() for phrase in CONTEXT_REFERENCE_PHRASES)
 
     def expand_query_with_context(self, current_query):
         """使用上下文信息扩写当前查询"""
@@ -15,7 +85,247 @@ class ContextManager:
             return current_query
 
         # 如果检测到模糊的上下文引用，则扩展查询
-        if any(phrase in current_query.lower() for phrase in ['分别是', '有哪些', '哪几个', '具体是']):
+        if self.references_context(current_query):
             return f"{self.previous_query} {current_query}"
-            
-        return current_query
\ No newline at end of file
+
+        return current_query
+
+    def to_dict(self):
+        """转换为可 JSON 序列化的字典（用于快照）。"""
+        with self._history_lock:
+            history = [list(turn) for turn in self.history]
+        return {'session_id': self.session_id, 'last_used': self.last_used, 'history': history}
+
+
+class ContextStore:
+    """
+    按会话编号保存 ContextManager，查找为 O(1)。
+
+    会话按最近使用的顺序排列：会话数超过 max_sessions 时淘汰最久未使用的会话，
+    闲置超过 ttl 秒的会话在之后的访问中从最久未使用的一端清除。
+    指定 snapshot_path 时，由后台线程每 snapshot_interval 秒检查一次，自上次快照以来有会话被使用、
+    创建或删除时把全部会话写入 JSON 快照（先写临时文件再替换），请求线程不写文件；
+    关闭时停止后台线程并再写一次，创建时从快照恢复未过期的会话。
+
+    属性:
+        max_sessions (int): 最多保存的会话数。
+        ttl (float): 会话闲置超时（秒），<= 0 表示不过期。
+
+    方法:
+        get: 获取或创建会话
+        peek: 获取会话，不存在时返回 None
+        remove: 删除会话
+        expand_query_with_context: 用会话的上下文扩写查询
+        update_context: 更新会话的上下文
+        snapshot: 立即写出快照
+        stats: 返回会话数、淘汰数等统计信息
+        close: 停止后台线程并写出快照
+    """
+
+    def __init__(self, max_sessions=DEFAULT_CONTEXT_CONFIG['max_sessions'], ttl=DEFAULT_CONTEXT_CONFIG['ttl'],
+                 history_depth=DEFAULT_CONTEXT_CONFIG['history_depth'],
+                 max_query_chars=DEFAULT_CONTEXT_CONFIG['max_query_chars'],
+                 max_result_chars=DEFAULT_CONTEXT_CONFIG['max_result_chars'],
+                 snapshot_path=None, snapshot_interval=DEFAULT_CONTEXT_CONFIG['snapshot_interval']):
+        self.max_sessions = max(max_sessions, 1)
+        self.ttl = ttl
+        self.history_depth = history_depth
+        self.max_query_chars = max_query_chars
+        self.max_result_chars = max_result_chars
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self._sessions = OrderedDict()  # 会话编号 -> ContextManager，最久未使用的在前
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._last_snapshot = time.time()
+        self._removed = False  # 自上次快照以来是否有会话被淘汰、清除或删除
+        self._stats = {'created': 0, 'evicted': 0, 'expired': 0, 'restored': 0, 'snapshots': 0}
+        self._stop = threading.Event()
+        self._snapshotter = None
+        if snapshot_path:
+            self._restore()
+            self._snapshotter = threading.Thread(target=self._snapshot_loop, name="context-snapshot", daemon=True)
+            self._snapshotter.start()
+
+    def _new_session(self, session_id):
+        return ContextManager(session_id, self.history_depth, self.max_query_chars, self.max_result_chars)
+
+    def _expire(self, now):
+        if self.ttl <= 0:
+            return
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_used <= self.ttl:
+                break
+            del self._sessions[session.session_id]
+            self._stats['expired'] += 1
+            self._removed = True
+
+    def get(self, session_id=None):
+        """
+        获取会话，不存在（或已过期、已被淘汰）时创建。
+
+        参数:
+            session_id (str, optional): 会话编号，未指定时创建新会话。
+
+        返回:
+            ContextManager: 会话的上下文管理器。
+        """
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id) if session_id else None
+            if session is None:
+                session = self._new_session(session_id or uuid.uuid4().hex)
+                self._sessions[session.session_id] = session
+                self._stats['created'] += 1
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self._stats['evicted'] += 1
+                    self._removed = True
+            else:
+                self._sessions.move_to_end(session.session_id)
+            session.last_used = now
+        return session
+
+    def peek(self, session_id):
+        """返回会话的上下文管理器，不存在或已过期时返回 None（不创建会话，也不更新使用时间）。"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or (self.ttl > 0 and time.time() - session.last_used > self.ttl):
+                return None
+            return session
+
+    def remove(self, session_id):
+        """删除会话，返回会话是否存在。"""
+        with self._lock:
+            removed = self._sessions.pop(session_id, None) is not None
+            self._removed = self._removed or removed
+            return removed
+
+    def expand_query_with_context(self, session_id, current_query):
+        """用会话的上下文扩写查询，会话不存在时原样返回。"""
+        session = self.peek(session_id)
+        return session.expand_query_with_context(current_query) if session is not None else current_query
+
+    def update_context(self, session_id, query, result):
+        """更新会话的上下文，会话不存在时创建。"""
+        self.get(session_id).update_context(query, result)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def stats(self):
+        """
+        返回会话统计信息。
+
+        返回:
+            dict: sessions（当前会话数）、created、evicted（超出数量被淘汰）、expired（闲置超时）、restored、snapshots。
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['sessions'] = len(self._sessions)
+        return stats
+
+    def _snapshot_loop(self):
+        """后台线程：每 snapshot_interval 秒写出一次有变化的快照，直到 close。"""
+        while not self._stop.wait(max(self.snapshot_interval, 1)):
+            self.snapshot(only_changed=True)
+
+    def snapshot(self, blocking=True, only_changed=False):
+        """
+        把所有会话写入快照文件（先写临时文件再替换），未配置 snapshot_path 时不做任何事。
+
+        参数:
+            blocking (bool): 为 False 时若其他线程正在写出则直接返回。
+            only_changed (bool): 为 True 时，自上次快照以来没有会话被使用、创建或删除则不写出。
+        """
+        if not self.snapshot_path:
+            return
+        if not self._snapshot_lock.acquire(blocking=blocking):
+            return
+        try:
+            started = time.time()
+            with self._lock:
+                sessions = list(self._sessions.values())
+                changed = self._removed or any(session.last_used >= self._last_snapshot for session in sessions)
+                self._removed = False
+            if only_changed and not changed:
+                return
+            self._last_snapshot = started
+            data = {'saved_at': self._last_snapshot, 'sessions': [session.to_dict() for session in sessions]}
+            os.makedirs(os.path.dirname(self.snapshot_path) or '.', exist_ok=True)
+            temp_path = f"{self.snapshot_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(data, file, ensure_ascii=False)
+            os.replace(temp_path, self.snapshot_path)
+            with self._lock:
+                self._stats['snapshots'] += 1
+            logger.debug("已写出 %s 个会话的快照: %s", len(sessions), self.snapshot_path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning("写出会话快照失败: %s", e)
+            with self._lock:
+                self._removed = True
+        finally:
+            self._snapshot_lock.release()
+
+    def _restore(self):
+        """从快照恢复未过期的会话，按最近使用时间排列并受 max_sessions 和 history_depth 限制。"""
+        if not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            now = time.time()
+            records = sorted(data.get('sessions') or [], key=lambda record: record['last_used'])
+            for record in records[-self.max_sessions:]:
+                if self.ttl > 0 and now - record['last_used'] > self.ttl:
+                    continue
+                session = self._new_session(record['session_id'])
+                for query, result in record['history']:
+                    session.update_context(query, result)
+                session.last_used = record['last_used']
+                self._sessions[session.session_id] = session
+            self._stats['restored'] = len(self._sessions)
+            logger.info("从快照恢复了 %s 个会话: %s", len(self._sessions), self.snapshot_path)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("读取会话快照失败，忽略快照: %s", e)
+            self._sessions.clear()
+
+    def close(self):
+        """停止后台线程并写出快照（未配置 snapshot_path 时不做任何事）。"""
+        self._stop.set()
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+        self.snapshot()
+
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+
+def get_context_store():
+    """
+    获取进程内共享的会话上下文存储，首次调用时根据 model_config.yaml 的 context 节创建。
+
+    返回:
+        ContextStore: 共享存储。
+    """
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            config = get_section("model_config.yaml", "context", DEFAULT_CONTEXT_CONFIG)
+            snapshot_path = config['snapshot_path']
+            if snapshot_path and not os.path.isabs(snapshot_path):
+                snapshot_path = os.path.join(PROJECT_ROOT, snapshot_path)
+            _shared_store = ContextStore(
+                max_sessions=config['max_sessions'],
+                ttl=config['ttl'],
+                history_depth=config['history_depth'],
+                max_query_chars=config['max_query_chars'],
+                max_result_chars=config['max_result_chars'],
+                snapshot_path=snapshot_path or None,
+                snapshot_interval=config['snapshot_interval'],
+            )
+        return _shared_store
@@ -1,54 +1,430 @@
-import os
-import yaml
+import time
+import asyncio
+import threading
+from collections import deque
+from contextlib import contextmanager
 import pymysql
 import logging
 from utils.logger import logger  # 导入日志模块
+from utils.config import get_section, load_config
+from utils.tracing import get_tracer
+from utils.lazy import lazy_property
 
 logger.debug("Initializing Database module")
 
+# 服务端对单条语句返回的错误：连接本身仍然可用，回滚后可以放回连接池
+_STATEMENT_ERRORS = (
+    pymysql.err.ProgrammingError, pymysql.err.IntegrityError, pymysql.err.DataError, pymysql.err.NotSupportedError,
+)
+
+
+class SchemaCache:
+    """
+    表结构缓存，按数据库名缓存 get_table_schema 的结果。
+
+    缓存项带有一个指纹（由调用方提供，如表结构的列定义哈希和 CREATE_TIME），
+    在 revalidate_interval 秒内直接命中；超过该间隔后只查询一次指纹，
+    指纹未变化则继续使用缓存，否则重新加载完整表结构。
+
+    属性:
+        revalidate_interval (float): 免校验的时间窗口（秒）。
+        name (str): 缓存名称，作为 dqa_cache_lookups_total 的 cache 标签。
+        hits (int): 缓存命中次数（含指纹校验后命中）。
+        misses (int): 缓存未命中、重新加载表结构的次数。
+        revalidations (int): 执行指纹校验的次数。
+
+    方法:
+        get: 获取指定数据库的表结构，必要时校验指纹或重新加载
+        invalidate: 使指定数据库（或全部）的缓存失效
+        stats: 返回命中/未命中统计信息
+    """
+
+    def __init__(self, revalidate_interval=5.0, name="schema"):
+        self.revalidate_interval = revalidate_interval
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, db_name, load_fingerprint, load_schema, force_refresh=False):
+        """
+        获取指定数据库的表结构。
+
+        参数:
+            db_name (str): 数据库名称，作为缓存键。
+            load_fingerprint (callable): 无参函数，返回当前表结构指纹。
+            load_schema (callable): 无参函数，返回完整表结构。
+            force_refresh (bool): 为 True 时跳过缓存直接重新加载。
+
+        返回:
+            dict: 表结构信息，格式为 {表名: [列名列表]}，调用方不应修改。
+        """
+        now = time.monotonic()
+        if not force_refresh:
+            with self._lock:
+                entry = self._entries.get(db_name)
+                if entry and now - entry['checked_at'] < self.revalidate_interval:
+                    self.hits += 1
+                    get_tracer().count("cache_lookups", cache=self.name, result="hit")
+                    return entry['schema']
+
+            fingerprint = load_fingerprint()
+            with self._lock:
+                self.revalidations += 1
+                entry = self._entries.get(db_name)
+                if entry and entry['fingerprint'] == fingerprint:
+                    entry['checked_at'] = now
+                    self.hits += 1
+                    get_tracer().count("cache_lookups", cache=self.name, result="revalidated")
+                    return entry['schema']
+        else:
+            fingerprint = load_fingerprint()
+        get_tracer().count("cache_lookups", cache=self.name, result="miss")
+
+        logger.info("%s 缓存未命中，重新加载 %s", self.name, db_name)
+        schema = load_schema()
+        with self._lock:
+            self._entries[db_name] = {
+                'fingerprint': fingerprint,
+                'schema': schema,
+                'checked_at': now,
+            }
+            self.misses += 1
+        return schema
+
+    def invalidate(self, db_name=None):
+        """
+        使缓存失效。
+
+        参数:
+            db_name (str, optional): 数据库名称，为 None 时清空全部缓存。
+        """
+        with self._lock:
+            if db_name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(db_name, None)
+
+    def stats(self):
+        """
+        返回缓存统计信息。
+
+        返回:
+            dict: 包含 hits、misses、revalidations、hit_rate 和缓存的数据库数量。
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidations': self.revalidations,
+                'hit_rate': self.hits / total if total else 0.0,
+                'databases': len(self._entries),
+            }
+
+
+# 进程内共享的表结构缓存
+schema_cache = SchemaCache()
+
+
+class ConnectionPool:
+    """
+    线程安全的 MySQL 连接池，由所有 Database 实例共享。
+
+    连接以 autocommit 模式创建，避免归还的连接带着旧事务快照被复用。
+    借出连接时按需 ping 检测失效连接（例如超过 MySQL wait_timeout），
+    存活时间超过 recycle 秒的连接会被关闭并重建。
+
+    属性:
+        db_name (str): 连接的数据库名称。
+        max_size (int): 连接池最大连接数。
+        checkout_timeout (float): 借出连接的默认等待超时（秒）。
+        recycle (float): 连接最长存活时间（秒），<= 0 表示不回收。
+        ping_on_checkout (bool): 借出前是否 ping 检测连接。
+
+    方法:
+        acquire: 借出一个连接
+        release: 归还连接，或在连接异常时丢弃
+        connection: 以上下文管理器方式借出并自动归还（或在出错时丢弃）连接
+        close: 关闭所有空闲连接
+        stats: 返回连接池状态
+    """
+
+    def __init__(self, connect_kwargs, max_size=8, checkout_timeout=10.0, recycle=3600, ping_on_checkout=True):
+        self.connect_kwargs = dict(connect_kwargs)
+        self.db_name = self.connect_kwargs.get('db')
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.recycle = recycle
+        self.ping_on_checkout = ping_on_checkout
+        self._idle = deque()  # (conn, created_at)
+        self._created_at = {}  # id(conn) -> created_at
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _connect(self):
+        conn = pymysql.connect(
+            cursorclass=pymysql.cursors.DictCursor,
+            autocommit=True,
+            **self.connect_kwargs
+        )
+        self._created_at[id(conn)] = time.monotonic()
+        return conn
+
+    def _close_quietly(self, conn):
+        self._created_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self, timeout=None):
+        """
+        借出一个可用连接。
+
+        参数:
+            timeout (float, optional): 等待空闲连接的超时（秒），默认使用 checkout_timeout。
+
+        返回:
+            pymysql.Connection: 数据库连接。
+
+        抛出:
+            RuntimeError: 如果连接池已关闭，或在超时时间内没有可用连接。
+        """
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("数据库连接池已关闭")
+                if self._idle:
+                    conn, created_at = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn, created_at = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.error("获取数据库连接超时（%s秒），连接池已满: %s", timeout, self.max_size)
+                    raise RuntimeError(f"获取数据库连接超时（{timeout}秒）")
+                self._cond.wait(remaining)
+
+        try:
+            if conn is not None and self.recycle > 0 and time.monotonic() - created_at > self.recycle:
+                logger.debug("连接超过最长存活时间，重新建立连接")
+                self._close_quietly(conn)
+                conn = None
+            if conn is not None and self.ping_on_checkout:
+                try:
+                    conn.ping(reconnect=False)
+                except Exception:
+                    logger.info("检测到失效的数据库连接，重新建立连接")
+                    self._close_quietly(conn)
+                    conn = None
+            if conn is None:
+                conn = self._connect()
+            return conn
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, discard=False):
+        """
+        归还连接。
+
+        参数:
+            conn (pymysql.Connection): 通过 acquire 借出的连接。
+            discard (bool): 为 True 时关闭该连接而不放回连接池。
+        """
+        if discard or self._closed or not conn.open:
+            self._close_quietly(conn)
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append((conn, self._created_at.get(id(conn), time.monotonic())))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """
+        借出连接并在使用完毕后自动归还；连接已断开（如网络错误）时由 release 丢弃。
+
+        with 语句块抛出异常时：服务端返回的语句错误（语法错误、约束冲突等）回滚后归还，
+        其他异常（网络错误、读取结果中途退出等）可能留下未读完的结果或未结束的事务，直接丢弃连接。
+
+        参数:
+            timeout (float, optional): 借出连接的等待超时（秒）。
+        """
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        except BaseException as e:
+            self.release(conn, discard=not self._rollback(conn, e))
+            raise
+        self.release(conn)
+
+    def _rollback(self, conn, error):
+        """语句错误后回滚连接，返回连接是否可以放回连接池。"""
+        if not isinstance(error, _STATEMENT_ERRORS):
+            return False
+        try:
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def close(self):
+        """关闭所有空闲连接，借出中的连接在归还时直接关闭。"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def stats(self):
+        """
+        返回连接池状态。
+
+        返回:
+            dict: 包含 size（已建立连接数）、idle（空闲连接数）、in_use 和 max_size。
+        """
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'max_size': self.max_size,
+            }
+
+
+# 连接池默认配置，可在 db_config.yaml 的 pool 节中覆盖
+DEFAULT_POOL_CONFIG = {
+    'max_size': 8,
+    'checkout_timeout': 10.0,
+    'recycle': 3600,
+    'ping_on_checkout': True,
+}
+
+# 流式查询默认配置，可在 db_config.yaml 的 stream 节中覆盖
+DEFAULT_STREAM_CONFIG = {
+    'batch_size': 1000,     # 每批读取的行数
+    'max_rows': 1000000,    # 单次流式查询的行数上限，<= 0 表示不限制
+}
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    获取进程内共享的连接池，首次调用时根据 db_config.yaml 创建。
+
+    返回:
+        ConnectionPool: 共享连接池。
+
+    抛出:
+        ValueError: 如果配置文件缺失必要字段。
+    """
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            config = load_config("db_config.yaml")
+            required_keys = ['host', 'port', 'user', 'password', 'db']
+            if not all(key in (config.get('database') or {}) for key in required_keys):
+                logger.error("数据库配置文件缺少必要字段")
+                raise ValueError("数据库配置文件缺少必要字段")
+
+            db_config = config['database']
+            pool_config = get_section("db_config.yaml", "pool", DEFAULT_POOL_CONFIG)
+            logger.debug("创建数据库连接池: %s:%s - %s，最大连接数: %s", db_config['host'], db_config['port'], db_config['db'], pool_config['max_size'])
+            _shared_pool = ConnectionPool(
+                {key: db_config[key] for key in required_keys},
+                max_size=pool_config['max_size'],
+                checkout_timeout=pool_config['checkout_timeout'],
+                recycle=pool_config['recycle'],
+                ping_on_checkout=pool_config['ping_on_checkout'],
+            )
+        return _shared_pool
+
+
+def close_pool():
+    """关闭共享连接池的空闲连接，通常在进程退出前调用。"""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is not None:
+            _shared_pool.close()
+            _shared_pool = None
+
+
+def get_pool_stats():
+    """
+    返回共享连接池的状态，不会因此创建连接池。
+
+    返回:
+        dict: 见 ConnectionPool.stats；连接池尚未创建时返回 None。
+    """
+    with _shared_pool_lock:
+        pool = _shared_pool
+    return pool.stats() if pool is not None else None
+
+
 class Database:
     """
-    数据库操作类，用于加载配置、建立连接并执行 SQL 查询。
+    数据库操作类，基于共享连接池执行 SQL 查询。
 
     属性:
-        conn (pymysql.Connection): 数据库连接对象。
+        pool (ConnectionPool): 使用的连接池，默认每次访问时取进程内共享连接池（close_pool 后自动换用新建的连接池）。
+        db_name (str): 当前连接的数据库名称。
+        stream_config (dict): 流式查询的默认批大小和行数上限。
+        tracer (Tracer): 共享的追踪器，每次执行 SQL 是一个 db.query / db.execute / db.stream span。
 
     方法:
-        __init__: 初始化数据库连接
+        __init__: 绑定连接池（默认的共享连接池在首次使用时创建）
         execute: 执行写操作（INSERT, UPDATE, DELETE）并提交事务
         query: 执行查询操作并返回结果
+        stream: 基于服务端游标分批读取查询结果
+        stream_rows: 基于服务端游标逐行读取查询结果
+        get_table_schema: 获取表结构信息（经由 schema_cache 缓存）
+        refresh_table_schema: 强制重新加载表结构
+        get_schema_comments: 获取表和列的注释信息（经由 schema_cache 缓存）
     """
 
-    def __init__(self):
-        """
-        初始化数据库连接。
-        
-        从配置文件中读取数据库连接参数，并建立连接。
-        如果配置文件缺失必要字段，抛出 ValueError。
-        """
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        config_path = os.path.join(current_dir, "..", "config", "db_config.yaml")
-
-        logger.info(f"加载数据库配置文件: {config_path}")
-        
-        with open(config_path, "r") as f:
-            config = yaml.safe_load(f)
-
-        required_keys = ['host', 'port', 'user', 'password', 'db']
-        if not all(key in config['database'] for key in required_keys):
-            logger.error("数据库配置文件缺少必要字段")
-            raise ValueError("数据库配置文件缺少必要字段")
-
-        logger.debug(f"连接数据库: {config['database']['host']}:{config['database']['port']} - {config['database']['db']}")
-        
-        self.conn = pymysql.connect(
-            host=config['database']['host'],
-            port=config['database']['port'],
-            user=config['database']['user'],
-            password=config['database']['password'],
-            db=config['database']['db'],
-            cursorclass=pymysql.cursors.DictCursor
-        )
+    def __init__(self, pool=None):
+        """
+        初始化数据库操作对象。
+
+        共享连接池在首次使用时才创建（读取 db_config.yaml），连接在首次执行 SQL 时从连接池借出，
+        执行完毕立即归还，因此构造 Database 没有开销，多个实例可以在不同线程中并发使用。
+
+        参数:
+            pool (ConnectionPool, optional): 指定连接池，默认使用 get_pool() 返回的共享连接池。
+        """
+        self._pool = pool
+        self.tracer = get_tracer()
+
+    @property
+    def pool(self):
+        """使用的连接池：指定的连接池，或 get_pool() 返回的当前共享连接池（不缓存，关闭后不会继续使用旧连接池）。"""
+        return self._pool if self._pool is not None else get_pool()
+
+    @property
+    def db_name(self):
+        return self.pool.db_name
+
+    @lazy_property
+    def stream_config(self):
+        return get_section("db_config.yaml", "stream", DEFAULT_STREAM_CONFIG)
 
     def execute(self, sql, params=None):
         """
@@ -64,18 +440,24 @@ class Database:
         抛出:
             RuntimeError: 如果 SQL 执行失败。
         """
-        logger.debug(f"执行SQL语句: {sql} 参数: {params}")
-        try:
-            with self.conn.cursor() as cursor:
-                cursor.execute(sql, params or ())
-                result = cursor.fetchall()
-                self.conn.commit()
-                logger.info(f"SQL执行成功，影响行数: {cursor.rowcount}")
-                return result
-        except Exception as e:
-            self.conn.rollback()
-            logger.error(f"执行SQL时出错: {str(e)}")
-            raise RuntimeError(f"执行SQL时出错：{str(e)}")
+        logger.debug("执行SQL语句: %s 参数: %s", sql, params)
+        with self.tracer.span("db.execute", sql_chars=len(sql)) as span:
+            try:
+                with self.pool.connection() as conn:
+                    try:
+                        with conn.cursor() as cursor:
+                            cursor.execute(sql, params or ())
+                            result = cursor.fetchall()
+                            conn.commit()
+                            logger.info("SQL执行成功，影响行数: %s", cursor.rowcount)
+                            span.set(rows=cursor.rowcount)
+                            return result
+                    except Exception:
+                        conn.rollback()
+                        raise
+            except Exception as e:
+                logger.error("执行SQL时出错: %s", e)
+                raise RuntimeError(f"执行SQL时出错：{str(e)}")
 
     def query(self, sql, params=None):
         """
@@ -91,19 +473,231 @@ class Database:
         抛出:
             RuntimeError: 如果 SQL 执行失败。
         """
-        logger.debug(f"查询SQL语句: {sql} 参数: {params}")
+        logger.debug("查询SQL语句: %s 参数: %s", sql, params)
+        with self.tracer.span("db.query", sql_chars=len(sql)) as span:
+            try:
+                with self.pool.connection() as conn:
+                    with conn.cursor() as cursor:
+                        cursor.execute(sql, params or ())
+                        rows = cursor.fetchall()
+                        span.set(rows=len(rows))
+                        return rows
+            except Exception as e:
+                logger.error("查询SQL时出错: %s", e)
+                raise RuntimeError(f"查询SQL时出错：{str(e)}")
+
+    def stream(self, sql, params=None, batch_size=None, max_rows=None):
+        """
+        基于服务端游标（SSDictCursor）分批读取查询结果，客户端内存占用与结果大小无关。
+
+        达到行数上限或调用方提前停止迭代时，直接关闭该连接以终止服务端扫描
+        （未读完的非缓冲结果集若正常归还需要先读完全部剩余行）。
+        db.stream span 从执行 SQL 开始到结果读完为止，包含调用方处理各批结果的时间。
+
+        参数:
+            sql (str): 要执行的 SQL 语句。
+            params (tuple, optional): SQL 参数化查询的参数，默认为 None。
+            batch_size (int, optional): 每批行数，默认使用 stream_config。
+            max_rows (int, optional): 行数上限，默认使用 stream_config，<= 0 表示不限制。
+
+        返回:
+            generator: 逐批产出查询结果列表，每行作为一个字典。
+
+        抛出:
+            RuntimeError: 如果 SQL 执行失败。
+        """
+        batch_size = batch_size or self.stream_config['batch_size']
+        max_rows = self.stream_config['max_rows'] if max_rows is None else max_rows
+        logger.debug("流式查询SQL语句: %s 参数: %s，批大小: %s，行数上限: %s", sql, params, batch_size, max_rows)
+
+        # 生成器会在调用方的上下文中挂起，因此不把该 span 设为当前 span
+        span = self.tracer.start_span("db.stream", sql_chars=len(sql))
+        # 归还到借出连接的同一个连接池
+        pool = self.pool
+        conn = None
+        exhausted = False
+        fetched = 0
         try:
-            with self.conn.cursor() as cursor:
-                cursor.execute(sql, params or ())
-                return cursor.fetchall()
+            conn = pool.acquire()
+            cursor = conn.cursor(pymysql.cursors.SSDictCursor)
+            cursor.execute(sql, params or ())
+            while True:
+                size = batch_size if max_rows <= 0 else min(batch_size, max_rows - fetched)
+                if size <= 0:
+                    logger.warning("流式查询达到行数上限 %s，提前终止服务端扫描", max_rows)
+                    break
+                batch = cursor.fetchmany(size)
+                fetched += len(batch)
+                if batch:
+                    yield batch
+                if len(batch) < size:
+                    exhausted = True
+                    break
         except Exception as e:
-            logger.error(f"查询SQL时出错: {str(e)}")
+            logger.error("流式查询SQL时出错: %s", e)
+            span.fail(str(e))
             raise RuntimeError(f"查询SQL时出错：{str(e)}")
+        finally:
+            if exhausted:
+                cursor.close()
+            if conn is not None:
+                pool.release(conn, discard=not exhausted)
+            span.set(rows=fetched, exhausted=exhausted).end()
+            logger.debug("流式查询结束，共读取 %s 行", fetched)
+
+    def stream_rows(self, sql, params=None, batch_size=None, max_rows=None):
+        """
+        基于服务端游标逐行读取查询结果，参数与 stream 相同。
+
+        返回:
+            generator: 逐行产出字典。
+        """
+        for batch in self.stream(sql, params, batch_size, max_rows):
+            yield from batch
 
-    def get_table_schema(self):
+    def get_table_schema(self, refresh=False):
         """
         获取数据库中的表结构信息。
-        
+
+        缓存在进程内共享，并通过指纹（列定义的哈希、表数量、列数量和最大 CREATE_TIME）
+        判断是否需要重新加载，参见 SchemaCache。
+
+        参数:
+            refresh (bool): 为 True 时忽略缓存，强制重新加载。
+
         返回:
             dict: 表结构信息，格式为 {表名: [列名列表]}
-        """
\ No newline at end of file
+        """
+        return schema_cache.get(
+            self.db_name,
+            self._load_schema_fingerprint,
+            self._load_table_schema,
+            force_refresh=refresh,
+        )
+
+    def refresh_table_schema(self):
+        """
+        强制重新加载表结构并更新缓存，适用于执行 DDL 之后。
+
+        返回:
+            dict: 最新的表结构信息。
+        """
+        schema_cache.invalidate(self._comments_cache_key())
+        return self.get_table_schema(refresh=True)
+
+    def get_schema_comments(self, refresh=False):
+        """
+        获取表和列的注释信息，与表结构共用指纹校验与缓存。
+
+        参数:
+            refresh (bool): 为 True 时忽略缓存，强制重新加载。
+
+        返回:
+            dict: {表名: {'comment': 表注释, 'columns': {列名: 列注释}}}
+        """
+        return schema_cache.get(
+            self._comments_cache_key(),
+            self._load_schema_fingerprint,
+            self._load_schema_comments,
+            force_refresh=refresh,
+        )
+
+    def _comments_cache_key(self):
+        return f"{self.db_name}#comments"
+
+    def _load_schema_fingerprint(self):
+        """
+        查询表结构指纹，用于判断缓存是否仍然有效。
+
+        指纹只包含表结构本身：各列的表名、列名、位置、类型和注释的哈希之和，各表的表名和注释的哈希之和，
+        以及表数量、列数量和最大 CREATE_TIME。不使用 UPDATE_TIME，普通的增删改数据不会使缓存失效。
+        哈希在服务端计算，每次校验只返回一行。
+        """
+        rows = self.query(
+            "SELECT COUNT(*) AS column_count, "
+            "SUM(CRC32(CONCAT_WS('|', TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION, COLUMN_TYPE, COLUMN_COMMENT))) "
+            "AS column_hash, "
+            "(SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = %s) AS table_count, "
+            "(SELECT SUM(CRC32(CONCAT_WS('|', TABLE_NAME, TABLE_COMMENT))) "
+            "FROM information_schema.tables WHERE table_schema = %s) AS table_hash, "
+            "(SELECT MAX(CREATE_TIME) FROM information_schema.tables WHERE table_schema = %s) AS max_create_time "
+            "FROM information_schema.columns WHERE table_schema = %s",
+            (self.db_name, self.db_name, self.db_name, self.db_name)
+        )
+        row = rows[0]
+        return (row['table_count'], row['column_count'], row['table_hash'], row['column_hash'], row['max_create_time'])
+
+    def _load_table_schema(self):
+        """从 information_schema 加载完整表结构。"""
+        rows = self.query(
+            "SELECT TABLE_NAME AS table_name, COLUMN_NAME AS column_name "
+            "FROM information_schema.columns WHERE table_schema = %s "
+            "ORDER BY TABLE_NAME, ORDINAL_POSITION",
+            (self.db_name,)
+        )
+        schema = {}
+        for row in rows:
+            schema.setdefault(row['table_name'], []).append(row['column_name'])
+        logger.info("加载表结构完成，共 %s 张表", len(schema))
+        return schema
+
+    def _load_schema_comments(self):
+        """从 information_schema 加载表和列的注释。"""
+        rows = self.query(
+            "SELECT c.TABLE_NAME AS table_name, c.COLUMN_NAME AS column_name, "
+            "c.COLUMN_COMMENT AS column_comment, t.TABLE_COMMENT AS table_comment "
+            "FROM information_schema.columns c "
+            "JOIN information_schema.tables t "
+            "ON t.TABLE_SCHEMA = c.TABLE_SCHEMA AND t.TABLE_NAME = c.TABLE_NAME "
+            "WHERE c.table_schema = %s",
+            (self.db_name,)
+        )
+        comments = {}
+        for row in rows:
+            table = comments.setdefault(row['table_name'], {'comment': row['table_comment'] or '', 'columns': {}})
+            table['columns'][row['column_name']] = row['column_comment'] or ''
+        return comments
+
+
+class AsyncDatabase:
+    """
+    Database 的 asyncio 版本，行为与同步版本一致。
+
+    pymysql 是阻塞驱动，这里将每次调用放到线程池执行；
+    由于连接从共享连接池借出，多个协程可以同时执行查询。
+    这不是原生的异步驱动：每个进行中的查询占用默认线程池的一个线程和一个连接，
+    并发度受线程池大小和连接池上限 max_size 约束。
+
+    属性:
+        db (Database): 底层同步数据库对象。
+
+    方法:
+        execute / query / get_table_schema / refresh_table_schema:
+            与 Database 同名方法一致的协程版本
+    """
+
+    def __init__(self, db=None):
+        """
+        参数:
+            db (Database, optional): 复用的同步数据库对象，默认新建一个（共享连接池）。
+        """
+        self.db = db or Database()
+
+    @property
+    def db_name(self):
+        return self.db.db_name
+
+    async def execute(self, sql, params=None):
+        return await asyncio.to_thread(self.db.execute, sql, params)
+
+    async def query(self, sql, params=None):
+        return await asyncio.to_thread(self.db.query, sql, params)
+
+    async def get_table_schema(self, refresh=False):
+        return await asyncio.to_thread(self.db.get_table_schema, refresh)
+
+    async def refresh_table_schema(self):
+        return await asyncio.to_thread(self.db.refresh_table_schema)
+
+    async def get_schema_comments(self, refresh=False):
+        return await asyncio.to_thread(self.db.get_schema_comments, refresh)
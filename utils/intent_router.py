@@ -0,0 +1,319 @@
+import time
+import threading
+from collections import OrderedDict, deque
+from utils.logger import logger
+from utils.config import get_section
+from utils.sql_cache import normalize_question
+from utils.tracing import get_tracer
+from utils.lazy import lazy_property
+
+logger.debug("Initializing intent_router module")
+
+# 可识别的意图（代理类型）
+INTENTS = ("data_query", "rule_executor", "rule_config")
+UNKNOWN_INTENT = "unknown"
+
+# 意图路由默认配置，可在 config/model_config.yaml 的 intent_router 节中覆盖
+DEFAULT_INTENT_ROUTER_CONFIG = {
+    'min_score': 2,         # 关键词得分达到该值才直接判定
+    'min_margin': 1,        # 最高得分需比第二高的意图至少高出该值才直接判定
+    'llm_fallback': True,   # 关键词无法判定时是否交给大模型识别
+    'cache_size': 1024,     # 大模型识别结果的缓存条目数，超出后淘汰最久未使用的条目
+    'keywords': {},         # 额外的关键词权重，如 {'data_query': {'报表': 2}}
+    'synonyms': {},         # 额外的同义词：同义词 -> 关键词，如 {'瞅瞅': '显示'}
+}
+
+# 内置关键词权重：输入中出现的每个关键词（重复出现只计一次）为对应意图加分
+DEFAULT_INTENT_KEYWORDS = {
+    'data_query': {
+        '数据库': 2, '查询': 2, '显示': 2, '列出': 2, '统计': 2,
+        '多少': 1, '哪几': 1, '哪些': 1, '表': 1, '数据': 1, '信息': 1, '记录': 1,
+    },
+    # 单独的“执行”和“全部规则”都不足以判定（“执行结果有哪些”、“显示所有规则”仍是数据查询），
+    # 两者同时出现（如“执行全部规则”）才直接判定
+    'rule_executor': {
+        '执行规则': 3, '重建基线': 3, '执行': 1, '全部规则': 1, '所有规则': 1, '抽样': 1, '增量': 1,
+    },
+    'rule_config': {
+        '配置规则': 3, '设置规则': 3, '添加规则': 3, '新增规则': 3, '修改规则': 3, '删除规则': 3,
+    },
+}
+
+# 内置同义词：匹配到同义词时按对应关键词计分
+DEFAULT_INTENT_SYNONYMS = {
+    '展示': '显示', '查看': '显示', '看看': '显示', '给出': '显示',
+    '罗列': '列出', '检索': '查询', '查找': '查询', '搜索': '查询',
+    '运行规则': '执行规则', '运行': '执行', '校验规则': '执行规则', '检查规则': '执行规则',
+    '创建规则': '添加规则', '定义规则': '配置规则',
+}
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick 多模式匹配自动机：一次扫描输入即可找出所有出现的模式，耗时与输入长度成正比，与模式数量无关。
+
+    方法:
+        find_all: 返回输入中出现的所有模式对应的值（每个模式只返回一次）
+    """
+
+    def __init__(self, patterns):
+        """
+        参数:
+            patterns (dict): 模式 -> 值。
+        """
+        self._goto = [{}]      # 状态 -> {字符: 下一状态}
+        self._fail = [0]       # 状态 -> 失配时跳转的状态
+        self._output = [()]    # 状态 -> 在该状态结束的模式 (模式, 值)
+        for pattern, value in patterns.items():
+            if pattern:
+                self._add(pattern, value)
+        self._build()
+
+    def _add(self, pattern, value):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            state = next_state
+        self._output[state] += ((pattern, value),)
+
+    def _build(self):
+        """按广度优先计算失配跳转，并把失配状态的输出合并到当前状态。"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fail
+                self._output[next_state] += self._output[fail]
+
+    def find_all(self, text):
+        """
+        参数:
+            text (str): 输入文本。
+
+        返回:
+            dict: 出现的模式 -> 值。
+        """
+        matches = {}
+        state = 0
+        goto, fail, output = self._goto, self._fail, self._output
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern, value in output[state]:
+                matches[pattern] = value
+        return matches
+
+
+class IntentRouter:
+    """
+    分层的意图路由：
+
+    1. 关键词层：用 Aho-Corasick 自动机一次扫描输入，按关键词（及同义词）权重为各意图计分，
+       最高得分达到 min_score 且领先第二名至少 min_margin 时直接判定；
+    2. 缓存层：关键词无法判定的输入，查找之前大模型的识别结果（按规范化输入缓存，LRU 淘汰）；
+    3. 大模型层：调用 LLMClient.generate_intent 识别并缓存结果；
+    4. 兜底：大模型不可用或调用失败时，取关键词得分最高的意图，没有任何关键词时返回 unknown。
+
+    每层的命中次数和耗时记录在 stats 中，并作为 intent.<层> span 和 dqa_intent_routes_total 计数器导出。
+
+    属性:
+        min_score (int): 直接判定所需的最低得分。
+        min_margin (int): 直接判定所需的领先幅度。
+        llm_fallback (bool): 是否启用大模型层。
+        llm (LLMClient): 大模型层使用的客户端，首次使用大模型层时才创建。
+
+    方法:
+        route: 返回输入对应的意图
+        keyword_intent: 返回关键词层得分最高的意图（不查缓存、不调用大模型）
+        score: 返回关键词层的各意图得分
+        stats: 返回各层命中率和耗时
+    """
+
+    TIERS = ("keyword", "cache", "llm", "fallback")
+
+    def __init__(self, llm=None, llm_fallback=True, keywords=None, synonyms=None, min_score=2, min_margin=1, cache_size=1024):
+        # 只有关键词无法判定时才需要大模型，未传入客户端时在首次使用时创建
+        if llm is not None:
+            self.llm = llm
+        self.llm_fallback = llm_fallback
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.cache_size = cache_size
+        weights = {}
+        for source in (DEFAULT_INTENT_KEYWORDS, keywords or {}):
+            for intent, words in source.items():
+                for word, weight in words.items():
+                    weights[normalize_question(word)] = (intent, weight)
+        patterns = dict(weights)
+        for synonym, word in dict(DEFAULT_INTENT_SYNONYMS, **(synonyms or {})).items():
+            target = weights.get(normalize_question(word))
+            if target is not None:
+                patterns.setdefault(normalize_question(synonym), target)
+        self._matcher = AhoCorasick(patterns)
+        self._cache = OrderedDict()  # 规范化输入 -> 意图
+        self._lock = threading.Lock()
+        self._stats = {tier: {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0} for tier in self.TIERS}
+        self.tracer = get_tracer()
+
+    @lazy_property
+    def llm(self):
+        from utils.llm_utils import LLMClient
+        return LLMClient()
+
+    def score(self, user_input):
+        """
+        计算关键词层的各意图得分。
+
+        参数:
+            user_input (str): 用户输入。
+
+        返回:
+            dict: 意图 -> 得分，只包含有关键词命中的意图。
+        """
+        scores = {}
+        for intent, weight in self._matcher.find_all(normalize_question(user_input)).values():
+            scores[intent] = scores.get(intent, 0) + weight
+        return scores
+
+    def keyword_intent(self, user_input):
+        """
+        返回关键词层得分最高的意图，不查缓存、不调用大模型，也不计入各层统计。
+
+        参数:
+            user_input (str): 用户输入。
+
+        返回:
+            str: 得分最高的意图，没有任何关键词命中时返回 None。
+        """
+        return self._decide(self.score(user_input))[0]
+
+    def _decide(self, scores):
+        """返回 (得分最高的意图, 是否足以直接判定)，没有任何关键词时返回 (None, False)。"""
+        if not scores:
+            return None, False
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        best, best_score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0
+        return best, best_score >= self.min_score and best_score - runner_up >= self.min_margin
+
+    def _record(self, tier, intent, start):
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            stats = self._stats[tier]
+            stats['count'] += 1
+            stats['seconds'] += elapsed
+            stats['max_seconds'] = max(stats['max_seconds'], elapsed)
+        self.tracer.count("intent_routes", tier=tier, intent=intent)
+        self.tracer.current_span().set(tier=tier)
+        return intent
+
+    def route(self, user_input):
+        """
+        返回输入对应的意图。
+
+        参数:
+            user_input (str): 用户输入（已经过上下文扩展）。
+
+        返回:
+            str: data_query、rule_executor、rule_config 或 unknown。
+        """
+        start = time.perf_counter()
+        with self.tracer.span("intent.keyword") as span:
+            scores = self.score(user_input)
+            best, confident = self._decide(scores)
+            span.set(candidates=len(scores))
+        if confident:
+            logger.debug("关键词路由: %s -> %s", scores, best)
+            return self._record("keyword", best, start)
+
+        key = normalize_question(user_input)
+        with self._lock:
+            intent = self._cache.get(key)
+            if intent is not None:
+                self._cache.move_to_end(key)
+        if intent is not None:
+            return self._record("cache", intent, start)
+
+        if self.llm_fallback:
+            with self.tracer.span("intent.llm"):
+                intent = self._ask_llm(user_input)
+            if intent is not None:
+                with self._lock:
+                    self._cache[key] = intent
+                    self._cache.move_to_end(key)
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+                logger.info("关键词无法判定（得分 %s），大模型识别为: %s", scores, intent)
+                return self._record("llm", intent, start)
+
+        return self._record("fallback", best or UNKNOWN_INTENT, start)
+
+    def _ask_llm(self, user_input):
+        """调用大模型识别意图，回答中不含已知意图时返回 unknown，调用失败时返回 None。"""
+        try:
+            response = self.llm.generate_intent(user_input)
+        except Exception as e:
+            logger.warning("大模型意图识别失败: %s", e)
+            return None
+        if response is None:
+            return None
+        response = response.strip().lower()
+        for intent in INTENTS:
+            if intent in response:
+                return intent
+        return UNKNOWN_INTENT
+
+    def stats(self):
+        """
+        返回各层的命中情况。
+
+        返回:
+            dict: {层: {count, rate（占全部路由的比例）, avg_ms, max_ms}}，以及 cache_entries。
+        """
+        with self._lock:
+            total = sum(stats['count'] for stats in self._stats.values())
+            result = {
+                tier: {
+                    'count': stats['count'],
+                    'rate': stats['count'] / total if total else 0.0,
+                    'avg_ms': stats['seconds'] * 1000 / stats['count'] if stats['count'] else 0.0,
+                    'max_ms': stats['max_seconds'] * 1000,
+                }
+                for tier, stats in self._stats.items()
+            }
+            result['cache_entries'] = len(self._cache)
+        return result
+
+
+def create_intent_router(llm=None):
+    """
+    根据 model_config.yaml 的 intent_router 节创建意图路由。
+
+    参数:
+        llm (LLMClient, optional): 大模型层使用的客户端，默认在首次使用时创建。
+
+    返回:
+        IntentRouter: 意图路由。
+    """
+    config = get_section("model_config.yaml", "intent_router", DEFAULT_INTENT_ROUTER_CONFIG)
+    return IntentRouter(
+        llm=llm,
+        llm_fallback=config['llm_fallback'],
+        keywords=config['keywords'],
+        synonyms=config['synonyms'],
+        min_score=config['min_score'],
+        min_margin=config['min_margin'],
+        cache_size=config['cache_size'],
+    )
@@ -0,0 +1,44 @@
+import threading
+from utils.logger import logger
+
+logger.debug("Initializing lazy module")
+
+_UNSET = object()
+
+
+class lazy_property:
+    """
+    首次访问时才计算的实例属性，结果保存在实例的 __dict__ 中，之后的访问不再经过描述符。
+
+    用于推迟创建数据库连接池、大模型客户端、代理等开销较大或依赖外部配置的对象：
+    只构造而不使用时不产生这些开销，也不会因为缺少配置而失败。
+    与 functools.cached_property 相同，可以直接赋值覆盖（如构造函数传入的依赖）；
+    不同的是计算过程加锁，多个线程同时首次访问时只创建一个对象。
+
+    示例:
+        class DataQueryAgent:
+            @lazy_property
+            def db(self):
+                return Database()
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+        self._lock = threading.RLock()
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = instance.__dict__.get(self.name, _UNSET)
+        if value is _UNSET:
+            with self._lock:
+                value = instance.__dict__.get(self.name, _UNSET)
+                if value is _UNSET:
+                    value = self.func(instance)
+                    instance.__dict__[self.name] = value
+        return value
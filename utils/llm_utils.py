@@ -1,34 +1,206 @@
+import asyncio
 import requests
 import os
+import re
+import json
 import sys
+import time
+import random
+import threading
+from requests.adapters import HTTPAdapter
 # 将项目根目录添加到Python路径中
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-import logging
-from utils.logger import logger
+from utils.logger import logger  # noqa: E402
+from utils.config import get_section  # noqa: E402
+from utils.sql_cache import get_sql_cache  # noqa: E402
+from utils.sql_guard import get_sql_guard, SQLGuardError  # noqa: E402
+from utils.schema_retriever import format_schema_info  # noqa: E402
+from utils.tracing import get_tracer  # noqa: E402
+from utils.lazy import lazy_property  # noqa: E402
 
 logger.debug("Initializing llm_utils module")
 
+# 大模型调用默认配置，可在 config/model_config.yaml 的 llm 节中覆盖
+DEFAULT_LLM_CONFIG = {
+    'model': 'qwen-max',
+    'base_url': 'https://dashscope.aliyuncs.com/api/v1/services/aigc/text-generation/generation',
+    'connect_timeout': 5.0,     # 建立连接超时（秒）
+    'read_timeout': 60.0,       # 读取响应超时（秒）
+    'max_retries': 3,           # 429/5xx/网络错误的最大重试次数
+    'backoff_base': 0.5,        # 指数退避的基础等待时间（秒）
+    'backoff_max': 8.0,         # 单次退避的最大等待时间（秒）
+    'pool_maxsize': 10,         # keep-alive 连接池大小
+    'timeouts': {},             # 按调用类型覆盖超时，如 {'verify': [5, 30]}
+}
+
+# 需要重试的 HTTP 状态码
+RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+# 需要重试的网络错误：连接失败、超时、响应体传输中断
+RETRY_EXCEPTIONS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+
+def iter_sse_events(lines):
+    """
+    解析 Server-Sent Events 响应，按事件产出 (事件类型, 数据)。
+
+    DashScope 的流式响应形如：
+        id:1
+        event:result
+        :HTTP_STATUS/200
+        data:{"output":{"text":"..."}, ...}
+    以空行分隔事件；以冒号开头的行是注释，多行 data 以换行拼接。
+
+    参数:
+        lines (iterable): 已解码的响应行（不含换行符）。
+
+    返回:
+        generator: (event, data) 元组，event 缺省为 "message"。
+    """
+    event, data = None, []
+    for line in lines:
+        if not line:
+            if data:
+                yield event or "message", "\n".join(data)
+            event, data = None, []
+            continue
+        if line.startswith(":"):
+            continue
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if field == "event":
+            event = value
+        elif field == "data":
+            data.append(value)
+    if data:
+        yield event or "message", "\n".join(data)
+
+
+class LatencyStats:
+    """
+    按调用类型记录大模型调用耗时。
+
+    方法:
+        record: 记录一次调用
+        snapshot: 返回各调用类型的统计信息
+    """
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, call_type, seconds, ok=True, retries=0):
+        """
+        记录一次调用。
+
+        参数:
+            call_type (str): 调用类型，如 "sql"、"natural_language"。
+            seconds (float): 调用总耗时（含重试）。
+            ok (bool): 调用是否成功。
+            retries (int): 本次调用的重试次数。
+        """
+        with self._lock:
+            stat = self._stats.setdefault(call_type, {
+                'count': 0, 'errors': 0, 'retries': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0,
+            })
+            stat['count'] += 1
+            stat['errors'] += 0 if ok else 1
+            stat['retries'] += retries
+            stat['total'] += seconds
+            stat['max'] = max(stat['max'], seconds)
+            stat['last'] = seconds
+
+    def snapshot(self):
+        """
+        返回各调用类型的统计信息。
+
+        返回:
+            dict: {调用类型: {count, errors, retries, total, avg, max, last}}
+        """
+        with self._lock:
+            return {
+                call_type: dict(stat, avg=stat['total'] / stat['count'] if stat['count'] else 0.0)
+                for call_type, stat in self._stats.items()
+            }
+
+
+# 进程内共享的调用耗时统计
+llm_latency = LatencyStats()
+
+_shared_session = None
+_shared_session_lock = threading.Lock()
+
+
+def get_session(pool_maxsize=10):
+    """
+    获取进程内共享的 HTTP 会话，复用 keep-alive 连接，避免每次调用重新握手。
+
+    参数:
+        pool_maxsize (int): 每个主机保持的最大连接数，仅首次创建时生效。
+
+    返回:
+        requests.Session: 共享会话。
+    """
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _shared_session = session
+        return _shared_session
+
+
 class LLMClient:
     """
     大模型客户端，用于与 DashScope 的 Qwen 模型进行交互。
 
+    所有调用都经由 _call 传输层：共享 keep-alive 会话、按调用类型的超时、
+    429/5xx 抖动指数退避重试，以及按调用类型的耗时统计（llm_latency）和追踪（llm.<调用类型> span）。
+
     属性:
-        api_key (str): DashScope API 密钥。
+        api_key (str): DashScope API 密钥，首次调用时读取。
         base_url (str): DashScope API 基础 URL。
+        model (str): 使用的模型名称。
+        config (dict): 大模型调用配置，来自 config/model_config.yaml 的 llm 节。
+        session (requests.Session): 共享的 HTTP 会话，首次调用时创建。
+        sql_cache (SQLCache): 共享的自然语言到 SQL 缓存，未启用时为 None，首次使用时创建。
+        sql_guard (SQLGuard): 共享的 SQL 安全检查，用于拒绝不合格的生成结果，首次使用时创建。
+        tracer (Tracer): 共享的追踪器。
 
     方法:
         __init__: 初始化 LLM 客户端
         generate_sql: 将自然语言转换为 SQL 查询语句
         generate_natural_language: 将 SQL 查询结果转换为自然语言描述
+        stream_natural_language: 流式生成自然语言描述，逐段产出
         verify_output_format: 验证输出是否符合期望格式
+        verify_output_formats: 在一次调用中批量验证多个输出
+        generate_intent: 判断用户输入的意图类型
+        forget_sql: 从 SQL 缓存中删除某个问题的条目
     """
 
     def __init__(self):
         """
-        初始化 LLM 客户端，设置 API 密钥和基础 URL。
-        
-        如果环境变量 DASHSCOPE_API_KEY 未设置，抛出 ValueError。
+        初始化 LLM 客户端，设置模型和基础 URL。
+
+        API 密钥、HTTP 会话和 SQL 缓存在首次调用时才获取，只构造客户端而不调用大模型的流程
+        （如只执行规则）不需要设置 DASHSCOPE_API_KEY。
+        """
+        self.config = get_section("model_config.yaml", "llm", DEFAULT_LLM_CONFIG)
+        self.model = self.config['model']
+        self.base_url = self.config['base_url']
+        self.tracer = get_tracer()
+
+    @lazy_property
+    def api_key(self):
+        """
+        DashScope API 密钥，首次调用大模型时从环境变量读取。
+
+        抛出:
+            ValueError: 如果环境变量 DASHSCOPE_API_KEY 未设置。
         """
         # API密钥必须通过环境变量 DASHSCOPE_API_KEY 设置
         # 没有提供默认值，请务必在运行前设置该环境变量
@@ -39,41 +211,258 @@ class LLMClient:
         #   [Environment]::SetEnvironmentVariable("DASHSCOPE_API_KEY", "your_api_key_here", [EnvironmentVariableTarget]::Machine)
         # 在Windows系统中设置当前用户环境变量（推荐）：
         #   [Environment]::SetEnvironmentVariable("DASHSCOPE_API_KEY", "your_api_key_here", [EnvironmentVariableTarget]::User)
-        self.api_key = os.getenv("DASHSCOPE_API_KEY")  # 从环境变量获取API密钥
-        if not self.api_key:
+        api_key = os.getenv("DASHSCOPE_API_KEY")  # 从环境变量获取API密钥
+        if not api_key:
             raise ValueError("DASHSCOPE_API_KEY environment variable not set")
-        
-        self.base_url = "https://dashscope.aliyuncs.com/api/v1/services/aigc/text-generation/generation"
+        return api_key
 
-    def verify_output_format(self, expected_format, actual_output):
+    @lazy_property
+    def session(self):
+        return get_session(self.config['pool_maxsize'])
+
+    @lazy_property
+    def sql_cache(self):
+        return get_sql_cache()
+
+    @lazy_property
+    def sql_guard(self):
+        return get_sql_guard()
+
+    def _timeout_for(self, call_type):
+        """返回指定调用类型的 (连接超时, 读取超时)。"""
+        override = (self.config.get('timeouts') or {}).get(call_type)
+        if override:
+            return tuple(override)
+        return (self.config['connect_timeout'], self.config['read_timeout'])
+
+    def _backoff(self, attempt, response=None):
+        """计算第 attempt 次重试前的等待时间，优先遵循 Retry-After 响应头。"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.config['backoff_max'])
+        # 全抖动指数退避，避免多个请求同时重试
+        return random.uniform(0, min(self.config['backoff_max'], self.config['backoff_base'] * (2 ** attempt)))
+
+    def _call(self, call_type, prompt):
         """
-        验证输出格式是否符合要求。
+        调用 DashScope 文本生成接口，所有公开方法共用的传输层。
+
+        使用共享的 keep-alive 会话和按调用类型配置的超时；
+        遇到 429/5xx 或网络错误时按抖动指数退避重试，并记录调用耗时；
+        每次调用是一个 llm.<调用类型> span，记录提示词和响应长度、重试次数。
 
         参数:
-            expected_format (str): 期望输出格式描述。
-            actual_output (str): 实际输出内容。
+            call_type (str): 调用类型，用于超时配置和耗时统计。
+            prompt (str): 提示词。
 
         返回:
-            str: 格式验证结果（通过/失败）和理由。
+            str: 模型输出文本（已去除首尾空白），调用失败时返回 None。
+
+        抛出:
+            ValueError: 如果环境变量 DASHSCOPE_API_KEY 未设置。
         """
-        prompt_text = f"你是一个格式验证专家。请严格按以下步骤验证实际输出是否符合期望格式要求：\\n\\n1. 期望输出格式: {expected_format}\\n2. 实际输出: {actual_output}\\n\\n请回答'通过'或'失败'，然后给出验证理由。\\n\\n注意：只返回验证结果和理由，不要包含其他内容。\\n\\n示例回答：\\n通过: 输出符合期望的自然语言描述格式，正确报告了表数量。\\n或者\\n失败: 输出不符合表格格式要求，缺少psql风格的表格边框。\\n"
-        
         payload = {
-            "model": "qwen-max",
+            "model": self.model,
             "input": {
-                "prompt": prompt_text.replace("\\", "\\\\")
+                "prompt": prompt
             }
         }
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
-        response = requests.post(self.base_url, json=payload, headers=headers)
-        if response.status_code == 200:
-            return response.json()['output']['text'].strip()
-        else:
-            logger.error(f"API调用失败，状态码: {response.status_code}")
+        timeout = self._timeout_for(call_type)
+        max_retries = self.config['max_retries']
+        start = time.perf_counter()
+        attempt = 0
+        with self.tracer.span(f"llm.{call_type}", prompt_chars=len(prompt)) as span:
+            while True:
+                response = None
+                try:
+                    response = self.session.post(self.base_url, json=payload, headers=headers, timeout=timeout)
+                    if response.status_code == 200:
+                        try:
+                            text = response.json()['output']['text'].strip()
+                        except (ValueError, KeyError, TypeError):
+                            retryable = False
+                            error = "响应内容无法解析"
+                        else:
+                            llm_latency.record(call_type, time.perf_counter() - start, ok=True, retries=attempt)
+                            span.set(response_chars=len(text), retries=attempt)
+                            return text
+                    else:
+                        retryable = response.status_code in RETRY_STATUS_CODES
+                        error = f"状态码: {response.status_code}"
+                except RETRY_EXCEPTIONS as e:
+                    retryable = True
+                    error = f"网络错误: {str(e)}"
+
+                if not retryable or attempt >= max_retries:
+                    logger.error("API调用失败（%s），%s，已重试 %s 次", call_type, error, attempt)
+                    llm_latency.record(call_type, time.perf_counter() - start, ok=False, retries=attempt)
+                    span.set(retries=attempt).fail(error)
+                    return None
+
+                delay = self._backoff(attempt, response)
+                logger.warning("API调用失败（%s），%s，%.2f秒后进行第 %s 次重试", call_type, error, delay, attempt + 1)
+                time.sleep(delay)
+                attempt += 1
+
+    def _stream(self, call_type, prompt):
+        """
+        以 DashScope 的增量输出（SSE）调用文本生成接口，逐段产出模型输出。
+
+        与 _call 共用会话、超时和退避策略，但只在收到第一段输出之前重试；
+        输出开始后连接中断时结束生成器并记录错误，已产出的内容由调用方保留。
+        整个调用是一个 llm.<调用类型> span，从发送请求到收到第一段输出另记一个 llm.first_token span（首字延迟）。
+
+        参数:
+            call_type (str): 调用类型，用于超时配置和耗时统计。
+            prompt (str): 提示词。
+
+        返回:
+            generator: 依次产出的输出片段（str）。调用失败时不产出任何内容。
+
+        抛出:
+            ValueError: 如果环境变量 DASHSCOPE_API_KEY 未设置。
+        """
+        payload = {
+            "model": self.model,
+            "input": {
+                "prompt": prompt
+            },
+            "parameters": {
+                "incremental_output": True
+            }
+        }
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream",
+            "X-DashScope-SSE": "enable"
+        }
+        timeout = self._timeout_for(call_type)
+        max_retries = self.config['max_retries']
+        start = time.perf_counter()
+        attempt = 0
+        chars = 0
+        # 生成器会在调用方的上下文中挂起，因此不把这两个 span 设为当前 span
+        span = self.tracer.start_span(f"llm.{call_type}", prompt_chars=len(prompt), stream=True)
+        first_token = self.tracer.start_span("llm.first_token", call_type=call_type)
+        try:
+            while True:
+                response = None
+                error = None
+                try:
+                    response = self.session.post(
+                        self.base_url, json=payload, headers=headers, timeout=timeout, stream=True
+                    )
+                    if response.status_code == 200:
+                        response.encoding = "utf-8"
+                        for event, data in iter_sse_events(response.iter_lines(decode_unicode=True)):
+                            try:
+                                message = json.loads(data)
+                            except ValueError:
+                                error = "响应内容无法解析"
+                                break
+                            if event == "error" or message.get('code'):
+                                error = f"{message.get('code')}: {message.get('message')}"
+                                break
+                            text = (message.get('output') or {}).get('text')
+                            if text:
+                                if not chars:
+                                    first_token.end()
+                                chars += len(text)
+                                yield text
+                        if error is None:
+                            llm_latency.record(call_type, time.perf_counter() - start, ok=True, retries=attempt)
+                            span.set(response_chars=chars, retries=attempt)
+                            return
+                        retryable = False
+                    else:
+                        retryable = response.status_code in RETRY_STATUS_CODES
+                        error = f"状态码: {response.status_code}"
+                except RETRY_EXCEPTIONS as e:
+                    retryable = True
+                    error = f"网络错误: {str(e)}"
+                finally:
+                    if response is not None:
+                        response.close()
+
+                if chars or not retryable or attempt >= max_retries:
+                    logger.error("流式API调用失败（%s），%s，已输出 %s 字符，已重试 %s 次", call_type, error, chars, attempt)
+                    llm_latency.record(call_type, time.perf_counter() - start, ok=False, retries=attempt)
+                    span.set(response_chars=chars, retries=attempt).fail(error)
+                    return
+
+                delay = self._backoff(attempt, response)
+                logger.warning("流式API调用失败（%s），%s，%.2f秒后进行第 %s 次重试", call_type, error, delay, attempt + 1)
+                time.sleep(delay)
+                attempt += 1
+        finally:
+            first_token.end(error=None if chars else "未收到输出")
+            span.end()
+
+    def verify_output_format(self, expected_format, actual_output):
+        """
+        验证输出格式是否符合要求。
+
+        参数:
+            expected_format (str): 期望输出格式描述。
+            actual_output (str): 实际输出内容。
+
+        返回:
+            str: 格式验证结果（通过/失败）和理由。
+        """
+        prompt_text = f"你是一个格式验证专家。请严格按以下步骤验证实际输出是否符合期望格式要求：\\n\\n1. 期望输出格式: {expected_format}\\n2. 实际输出: {actual_output}\\n\\n请回答'通过'或'失败'，然后给出验证理由。\\n\\n注意：只返回验证结果和理由，不要包含其他内容。\\n\\n示例回答：\\n通过: 输出符合期望的自然语言描述格式，正确报告了表数量。\\n或者\\n失败: 输出不符合表格格式要求，缺少psql风格的表格边框。\\n"
+
+        result = self._call("verify", prompt_text.replace("\\", "\\\\"))
+        if result is None:
             return "失败: API调用失败，无法验证输出格式。"
+        return result
+
+    def verify_output_formats(self, items):
+        """
+        在一次调用中批量验证多个输出，模型以 JSON 数组返回每个用例的结论。
+
+        参数:
+            items (list): [(期望输出格式, 实际输出)]。
+
+        返回:
+            list: 与 items 顺序一致的验证结果（“通过: 理由”或“失败: 理由”）；
+                  模型返回中缺少或无法解析的用例为 None，由调用方单独验证。
+        """
+        cases = "\n\n".join(
+            f"用例 {number}:\n期望输出格式: {expected_format}\n实际输出: {actual_output}"
+            for number, (expected_format, actual_output) in enumerate(items, 1)
+        )
+        prompt_text = (
+            "你是一个格式验证专家。下面有若干个测试用例，请逐个严格验证实际输出是否符合期望格式要求。\n\n"
+            f"{cases}\n\n"
+            "请只返回一个 JSON 数组，每个用例一个元素，形如 "
+            '{"id": 用例编号, "verdict": "通过" 或 "失败", "reason": "验证理由"}，不要包含其他内容。'
+        )
+        result = self._call("verify", prompt_text)
+        verdicts = [None] * len(items)
+        if result is None:
+            return verdicts
+
+        match = re.search(r'\[.*\]', result, re.S)
+        try:
+            entries = json.loads(match.group(0)) if match else []
+        except ValueError:
+            logger.warning("批量验证结果无法解析: %s", result)
+            entries = []
+        for entry in entries:
+            try:
+                number = int(entry['id'])
+                verdict = str(entry['verdict']).strip()
+            except (KeyError, TypeError, ValueError):
+                continue
+            if 1 <= number <= len(items) and verdict in ("通过", "失败"):
+                verdicts[number - 1] = f"{verdict}: {entry.get('reason', '')}"
+        return verdicts
             
     def generate_sql(self, natural_language, table_schema=None):
         """
@@ -87,19 +476,23 @@ class LLMClient:
             str: 生成的 SQL 查询语句，如果失败则返回 None。
         """
         logger.info("生成SQL请求开始")
-        logger.debug(f"natural_language: {natural_language}")
+        logger.debug("natural_language: %s", natural_language)
         if table_schema:
-            logger.debug(f"table_schema: {table_schema}")
+            logger.debug("table_schema: %s", table_schema)
+
+        # 相同问题（规范化后）且表结构未变化时直接复用已校验的SQL
+        if self.sql_cache is not None:
+            cached_sql = self.sql_cache.get(natural_language, table_schema, self.model)
+            self.tracer.count("cache_lookups", cache="sql", result="miss" if cached_sql is None else "hit")
+            self.tracer.current_span().set(cache_hit=cached_sql is not None)
+            if cached_sql is not None:
+                logger.info("命中SQL缓存，跳过大模型调用: %s", cached_sql)
+                return cached_sql
         
         # 如果提供了表结构信息，则将其加入提示词
-        schema_info = ""
-        if table_schema:
-            schema_info = "\n".join([f"Table: {table}, Columns: {', '.join(columns)}" for table, columns in table_schema.items()])
+        schema_info = format_schema_info(table_schema)
         
-        payload = {
-            "model": "qwen-max",
-            "input": {
-                "prompt": f"""
+        prompt = f"""
                 根据以下自然语言描述和数据库表结构生成MySQL查询语句：
                 自然语言描述：{natural_language}
                 表结构信息：
@@ -107,42 +500,34 @@ class LLMClient:
                 注意：请直接返回SQL语句，无论如何都不要包含任何解释性文本，不要包含注释，结尾不要带有分号。
                 如果无法生成有效的SQL，请返回:SELECT '未查询到相关数据'
                 """
-            }
-        }
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        response = requests.post(self.base_url, json=payload, headers=headers)
-        if response.status_code == 200:
-            generated_sql = response.json()['output']['text'].strip()
-            logger.info(f"LLM原始响应: {generated_sql}")
+        generated_sql = self._call("sql", prompt)
+        if generated_sql is not None:
+            logger.info("LLM原始响应: %s", generated_sql)
             
-            # 检查生成的SQL是否符合基本格式
-            if not generated_sql.lower().startswith(("select", "update", "delete", "insert")):
-                logger.warning("生成的SQL格式不正确")
-                return None  # 返回None表示生成失败
-            
-            # 验证SQL是否包含非法字符或语法错误
+            # 解析生成的SQL：只允许单条只读查询，拒绝写操作、加锁读和注入特征（解析结果有缓存）
             try:
-                # 简单的语法检查（实际可使用更复杂的解析器）
-                if ";" in generated_sql or "--" in generated_sql:
-                    logger.warning("生成的SQL包含非法字符")
-                    return None
-                
-                # 检查是否有潜在的注入攻击风险
-                if "' OR '1'='1" in generated_sql:
-                    logger.warning("检测到潜在的SQL注入尝试")
-                    return None
-                
-                return generated_sql
-            except Exception as e:
-                logger.error(f"SQL验证过程中出错: {str(e)}")
-                return None
+                self.sql_guard.parse(generated_sql)
+            except SQLGuardError as e:
+                logger.warning("生成的SQL未通过检查: %s", e)
+                return None  # 返回None表示生成失败
+
+            if self.sql_cache is not None:
+                self.sql_cache.put(natural_language, generated_sql, table_schema, self.model)
+            return generated_sql
         else:
-            logger.error(f"API调用失败，状态码: {response.status_code}")
             return None
 
+    def forget_sql(self, natural_language, table_schema=None):
+        """
+        从 SQL 缓存中删除某个问题的条目，用于缓存的 SQL 执行失败时。
+
+        参数:
+            natural_language (str): 用户输入的自然语言描述。
+            table_schema (dict, optional): 生成 SQL 时使用的表结构。
+        """
+        if self.sql_cache is not None:
+            self.sql_cache.discard(natural_language, table_schema, self.model)
+
     def generate_intent(self, prompt):
         """
         分析用户输入并判断其意图类型。
@@ -153,21 +538,10 @@ class LLMClient:
         返回:
             str: 判断出的意图类型名称（如"data_query"、"rule_executor"、"rule_config"），如果失败则返回None。
         """
-        payload = {
-            "model": "qwen-max",
-            "input": {
-                "prompt": f"分析以下用户输入并判断其意图类型：{prompt}\n可能的意图类型包括：data_query、rule_executor、rule_config。请只返回一个意图类型名称。"
-            }
-        }
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        response = requests.post(self.base_url, json=payload, headers=headers)
-        if response.status_code == 200:
-            return response.json()['output']['text'].strip()
-        else:
-            return None
+        return self._call(
+            "intent",
+            f"分析以下用户输入并判断其意图类型：{prompt}\n可能的意图类型包括：data_query、rule_executor、rule_config。请只返回一个意图类型名称。"
+        )
 
     def generate_natural_language(self, prompt):
         """
@@ -180,29 +554,80 @@ class LLMClient:
             str: 生成的自然语言回答。
         """
         logger.info("生成自然语言请求开始")
-        logger.debug(f"prompt: {prompt}")
+        logger.debug("prompt: %s", prompt)
         
-        payload = {
-            "model": "qwen-max",
-            "input": {
-                "prompt": f"""
+        generated_text = self._call("natural_language", self._natural_language_prompt(prompt))
+        if generated_text is None:
+            return "无法生成自然语言回答。"
+        logger.info("LLM原始响应: %s", generated_text)
+        return generated_text
+
+    def stream_natural_language(self, prompt):
+        """
+        流式生成自然语言回答，模型输出的每个片段到达后立即产出。
+
+        参数:
+            prompt (str): 包含用户输入和 SQL 查询结果的提示词。
+
+        返回:
+            generator: 回答片段（str）；调用失败且没有任何输出时只产出 "无法生成自然语言回答。"。
+        """
+        logger.info("流式生成自然语言请求开始")
+        logger.debug("prompt: %s", prompt)
+
+        chunks = []
+        for chunk in self._stream("natural_language_stream", self._natural_language_prompt(prompt)):
+            chunks.append(chunk)
+            yield chunk
+        if not chunks:
+            yield "无法生成自然语言回答。"
+            return
+        logger.info("LLM原始响应: %s", "".join(chunks))
+
+    def _natural_language_prompt(self, prompt):
+        return f"""
                 根据以下信息生成自然语言的回答：
                 {prompt}
                 
                 请确保回答通顺、易于理解，并符合中文表达习惯。
                 不要使用代码块或特殊格式，只返回自然语言描述。
                 """
-            }
-        }
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        response = requests.post(self.base_url, json=payload, headers=headers)
-        if response.status_code == 200:
-            generated_text = response.json()['output']['text'].strip()
-            logger.info(f"LLM原始响应: {generated_text}")
-            return generated_text
-        else:
-            logger.error(f"API调用失败，状态码: {response.status_code}")
-            return "无法生成自然语言回答。"
+
+
+class AsyncLLMClient:
+    """
+    LLMClient 的 asyncio 版本，行为与同步版本一致。
+
+    DashScope 调用仍由同步传输层（共享 keep-alive 会话、超时与重试）完成，
+    这里将阻塞调用放到线程池执行，使事件循环可以并发处理多个请求。
+    这不是原生的异步 HTTP：每个进行中的调用占用默认线程池的一个线程，并发度受线程池大小限制。
+
+    属性:
+        client (LLMClient): 底层同步客户端。
+
+    方法:
+        generate_sql / generate_natural_language / verify_output_format / verify_output_formats / generate_intent:
+            与 LLMClient 同名方法一致的协程版本
+    """
+
+    def __init__(self, client=None):
+        """
+        参数:
+            client (LLMClient, optional): 复用的同步客户端，默认新建一个。
+        """
+        self.client = client or LLMClient()
+
+    async def generate_sql(self, natural_language, table_schema=None):
+        return await asyncio.to_thread(self.client.generate_sql, natural_language, table_schema)
+
+    async def generate_natural_language(self, prompt):
+        return await asyncio.to_thread(self.client.generate_natural_language, prompt)
+
+    async def verify_output_format(self, expected_format, actual_output):
+        return await asyncio.to_thread(self.client.verify_output_format, expected_format, actual_output)
+
+    async def verify_output_formats(self, items):
+        return await asyncio.to_thread(self.client.verify_output_formats, items)
+
+    async def generate_intent(self, prompt):
+        return await asyncio.to_thread(self.client.generate_intent, prompt)
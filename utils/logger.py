@@ -1,35 +1,302 @@
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import reprlib
+import threading
+from collections.abc import Mapping
 from datetime import datetime
 
+# 日志目录（项目根目录下的 logs/）
+LOGS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs')
+
+# 日志默认配置，可在 config/model_config.yaml 的 logging 节中覆盖（见 configure_logging）
+DEFAULT_LOGGING_CONFIG = {
+    'level': 'INFO',                   # 根日志记录器级别
+    'console_level': 'WARNING',        # 控制台输出级别
+    'format': 'json',                  # 日志文件格式：json（每行一条结构化记录）或 text
+    'max_bytes': 10 * 1024 * 1024,     # 单个日志文件的最大字节数，超过后轮转，0 表示不轮转
+    'backup_count': 5,                 # 保留的轮转文件数量
+    'max_payload_chars': 2000,         # 单条日志消息（及每个参数）的最大字符数，0 表示不截断
+    'queue_size': 10000,               # 待写日志队列的容量，写满时丢弃新日志而不阻塞业务线程
+}
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - [%(module)s] %(message)s'
+
+# 容器类参数的截断表示：只展开有限的层数和元素，不会完整转换大的表结构或结果集
+_payload_repr = reprlib.Repr()
+_payload_repr.maxlevel = 3
+_payload_repr.maxdict = _payload_repr.maxlist = _payload_repr.maxtuple = 20
+_payload_repr.maxset = _payload_repr.maxfrozenset = _payload_repr.maxdeque = 20
+_payload_repr.maxstring = _payload_repr.maxother = 200
+
+# 附加到每条日志记录上的上下文字段（如请求编号），名称 -> 取值函数
+_context_fields = {}
+
+_stats = {'dropped': 0, 'truncated': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def register_context_field(name, getter):
+    """
+    注册附加到每条日志记录上的上下文字段，在写日志的线程中取值。
+
+    参数:
+        name (str): 字段名，如 "request_id"。
+        getter (callable): 无参数的取值函数，返回 None 时不输出该字段。
+    """
+    _context_fields[name] = getter
+
+
+def truncate_payload(value, limit):
+    """
+    将日志参数转换为长度有限的字符串，超长部分替换为大小标记。
+
+    字符串按字符截断；字典、列表等容器用 reprlib 只展开有限的元素，避免完整转换大的表结构或结果集。
+
+    参数:
+        value: 日志参数。
+        limit (int): 最大字符数，<= 0 表示不截断。
+
+    返回:
+        str: 截断后的文本，如 "SELECT ...…[已截断，共 52341 字符]"。
+    """
+    if limit <= 0:
+        return value
+    if isinstance(value, (int, float, bool, type(None))):
+        return value
+    if isinstance(value, (dict, list, tuple, set, frozenset)):
+        text = _payload_repr.repr(value)
+        if len(value) > _payload_repr.maxlist or len(text) > limit:
+            _count('truncated')
+            return f"{text[:limit]}…[已截断，共 {len(value)} 项]"
+        return text
+    text = value if isinstance(value, str) else str(value)
+    if len(text) > limit:
+        _count('truncated')
+        return f"{text[:limit]}…[已截断，共 {len(text)} 字符]"
+    return text
+
+
+class JsonFormatter(logging.Formatter):
+    """将日志记录格式化为一行 JSON：时间、级别、记录器、模块、线程、消息、上下文字段和异常堆栈。"""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        for name in _context_fields:
+            value = getattr(record, name, None)
+            if value is not None:
+                data[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        if record.stack_info:
+            data['stack'] = record.stack_info
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class LazyFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    按大小轮转的文件处理器，首次写日志时才创建日志目录并打开文件。
+
+    导入模块、只打印帮助信息等不写日志的流程不会产生任何文件系统操作。
+    """
+
+    def __init__(self, filename, encoding=None, max_bytes=0, backup_count=0):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding, delay=True)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+class TruncatingQueueHandler(logging.handlers.QueueHandler):
+    """
+    将日志记录放入队列，由后台线程格式化并写出，业务线程不做文件 I/O。
+
+    入队前截断超长的消息和参数（只转换截断后的部分），附加上下文字段并展开异常堆栈；
+    队列写满时丢弃新日志并计数，不阻塞业务线程。后台线程在第一条日志入队时才启动。
+
+    属性:
+        max_payload_chars (int): 单条消息及每个参数的最大字符数。
+    """
+
+    def __init__(self, log_queue, max_payload_chars):
+        super().__init__(log_queue)
+        self.max_payload_chars = max_payload_chars
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        limit = self.max_payload_chars
+        if record.args:
+            # 只有一个字典参数时 LogRecord 会把它本身作为 args，消息中没有 %(name)s 时它是一个普通参数
+            if isinstance(record.args, Mapping) and '%(' in str(record.msg):
+                record.args = {key: truncate_payload(value, limit) for key, value in record.args.items()}
+            elif isinstance(record.args, Mapping):
+                record.args = (truncate_payload(record.args, limit),)
+            else:
+                record.args = tuple(truncate_payload(arg, limit) for arg in record.args)
+        message = truncate_payload(record.getMessage(), limit)
+        record.msg = record.message = message
+        record.args = None
+        for name, getter in _context_fields.items():
+            if getattr(record, name, None) is None:
+                setattr(record, name, getter())
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _text_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        _start_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _count('dropped')
+
+
+_text_formatter = logging.Formatter(TEXT_FORMAT)
+_log_queue = queue.Queue(DEFAULT_LOGGING_CONFIG['queue_size'])
+_listener = logging.handlers.QueueListener(_log_queue, respect_handler_level=True)
+_listener_started = False
+_listener_lock = threading.Lock()
+
+
+def _start_listener():
+    global _listener_started
+    if _listener_started:
+        return
+    with _listener_lock:
+        if not _listener_started:
+            _listener.start()
+            atexit.register(flush_logs)
+            _listener_started = True
+
+
+def flush_logs():
+    """等待队列中的日志全部写出并停止后台线程，之后的日志会重新启动后台线程。"""
+    global _listener_started
+    with _listener_lock:
+        if _listener_started:
+            _listener.stop()
+            _listener_started = False
+    for handler in _listener.handlers:
+        try:
+            handler.flush()
+        except (OSError, ValueError):
+            # 控制台流可能已被关闭（如测试框架退出时），此时无需再刷新
+            pass
+
+
+def add_file_handler(filename, logger_name=None, formatter=None, level=logging.INFO):
+    """
+    添加一个经由日志队列写出的文件（按 logging 节的 max_bytes / backup_count 轮转），同一文件只添加一次。
+
+    参数:
+        filename (str): 日志文件路径。
+        logger_name (str, optional): 只写入该记录器（及其子记录器）的日志，默认写入全部日志。
+        formatter (logging.Formatter, optional): 格式化器，默认与主日志文件相同。
+        level (int): 写入的最低级别。
+
+    返回:
+        LazyFileHandler: 写入该文件的处理器。
+    """
+    filename = os.path.abspath(filename)
+    with _listener_lock:
+        for handler in _listener.handlers:
+            if isinstance(handler, LazyFileHandler) and handler.baseFilename == filename:
+                return handler
+        handler = LazyFileHandler(
+            filename, encoding='utf-8', max_bytes=_file_handler.maxBytes, backup_count=_file_handler.backupCount
+        )
+        handler.setFormatter(formatter or _file_handler.formatter)
+        handler.setLevel(level)
+        if logger_name:
+            handler.addFilter(logging.Filter(logger_name))
+        _listener.handlers = _listener.handlers + (handler,)
+    return handler
+
+
+def configure_logging(config):
+    """
+    按配置调整日志级别、文件格式、轮转大小、截断长度和队列容量。
+
+    参数:
+        config (dict): 合并默认值后的 logging 配置节，见 DEFAULT_LOGGING_CONFIG。
+    """
+    root = logging.getLogger()
+    root.setLevel(config['level'])
+    _console_handler.setLevel(config['console_level'])
+    formatter = JsonFormatter() if config['format'] == 'json' else _text_formatter
+    for handler in _listener.handlers:
+        if isinstance(handler, LazyFileHandler):
+            handler.maxBytes = config['max_bytes']
+            handler.backupCount = config['backup_count']
+    _file_handler.setFormatter(formatter)
+    _file_handler.setLevel(config['level'])
+    _queue_handler.max_payload_chars = config['max_payload_chars']
+    _log_queue.maxsize = config['queue_size']
+
+
+def get_log_stats():
+    """
+    返回日志队列的统计信息。
+
+    返回:
+        dict: queued（待写出条数）、dropped（队列写满丢弃的条数）、truncated（被截断的消息和参数数）。
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['queued'] = _log_queue.qsize()
+    return stats
+
+
 def setup_logger():
-    """设置全局日志记录器"""
-    # 创建logs目录（如果不存在）
-    logs_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
-    if not os.path.exists(logs_dir):
-        os.makedirs(logs_dir)
-    
-    # 创建格式化器
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - [%(module)s] %(message)s')
-    
-    # 创建控制台处理器，并设置级别为WARNING
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
-    console_handler.setLevel(logging.WARNING)  # 仅记录WARNING及以上级别日志到控制台
-    
-    # 创建文件处理器
-    log_filename = f"logs/app_{datetime.now().strftime('%Y%m%d')}.log"
-    file_handler = logging.FileHandler(log_filename, encoding='utf-8')
-    file_handler.setFormatter(formatter)
-    file_handler.setLevel(logging.INFO)  # 文件记录INFO及以上级别日志
-    
-    # 获取根日志记录器并添加处理器
+    """设置全局日志记录器：业务线程只把日志放入队列，由后台线程写到控制台和按大小轮转的日志文件"""
     logger = logging.getLogger()
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
-    logger.setLevel(logging.INFO)
-    
+    if any(isinstance(handler, TruncatingQueueHandler) for handler in logger.handlers):
+        return logger
+
+    # 队列处理器：根日志记录器唯一的处理器
+    logger.addHandler(_queue_handler)
+    logger.setLevel(DEFAULT_LOGGING_CONFIG['level'])
     return logger
 
+
+# 控制台处理器，仅输出WARNING及以上级别日志
+_console_handler = logging.StreamHandler()
+_console_handler.setFormatter(_text_formatter)
+_console_handler.setLevel(DEFAULT_LOGGING_CONFIG['console_level'])
+
+# 文件处理器（logs目录和日志文件在首次写入时创建），记录INFO及以上级别日志
+_file_handler = LazyFileHandler(
+    os.path.join(LOGS_DIR, f"app_{datetime.now().strftime('%Y%m%d')}.log"),
+    encoding='utf-8',
+    max_bytes=DEFAULT_LOGGING_CONFIG['max_bytes'],
+    backup_count=DEFAULT_LOGGING_CONFIG['backup_count'],
+)
+_file_handler.setFormatter(JsonFormatter())
+_file_handler.setLevel(logging.INFO)
+
+_listener.handlers = (_console_handler, _file_handler)
+_queue_handler = TruncatingQueueHandler(_log_queue, DEFAULT_LOGGING_CONFIG['max_payload_chars'])
+
 # 全局日志记录器
-logger = setup_logger()
\ No newline at end of file
+logger = setup_logger()
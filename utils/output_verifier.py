@@ -0,0 +1,222 @@
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils.logger import logger
+from utils.config import get_section
+from utils.tracing import bind_context
+
+logger.debug("Initializing output_verifier module")
+
+# 输出格式验证默认配置，可在 config/model_config.yaml 的 verifier 节中覆盖
+DEFAULT_VERIFIER_CONFIG = {
+    'local_checks': True,      # 是否先用本地规则判定可机器检查的格式
+    'batch_size': 8,           # 每次批量验证提示词中包含的用例数
+    'max_output_chars': 2000,  # 批量验证时单个实际输出的最大字符数
+}
+
+# psql 风格表格的边框行（+----+-----+）和数据行（| a | b |）
+_PSQL_BORDER_RE = re.compile(r'^\s*\+(?:-+\+)+\s*$', re.M)
+_TABLE_ROW_RE = re.compile(r'^\s*\|.*\|\s*$', re.M)
+# “包含id、region、sales、order_date字段”
+_REQUIRED_COLUMNS_RE = re.compile(r'包含(.+?)(?:字段|列)')
+_COLUMN_SPLIT_RE = re.compile(r'\s*(?:、|,|，|和|及)\s*')
+# 期望格式中的示例句，如 如'数据库中现在有X张表。'
+_EXAMPLE_RE = re.compile(r"如\s*[:：]?\s*['‘“\"](.+?)['’”\"]")
+# 示例句中的数字占位符 X / N
+_PLACEHOLDER_RE = re.compile(r'(?<![A-Za-z])[XN](?![A-Za-z])')
+
+
+def _check_table(expected_format, actual_output):
+    """检查表格格式：边框（psql 风格）和要求的字段。"""
+    rows = _TABLE_ROW_RE.findall(actual_output)
+    if not rows:
+        return "失败: 输出不是表格，缺少以 | 分隔的表格行。"
+    if 'psql' in expected_format.lower() and len(_PSQL_BORDER_RE.findall(actual_output)) < 2:
+        return "失败: 输出不符合psql风格的表格格式，缺少 +---+ 形式的表格边框。"
+
+    match = _REQUIRED_COLUMNS_RE.search(expected_format)
+    if match:
+        required = [column for column in _COLUMN_SPLIT_RE.split(match.group(1)) if column]
+        header = [cell.strip().lower() for cell in rows[0].strip().strip('|').split('|')]
+        missing = [column for column in required if column.lower() not in header]
+        if missing:
+            return f"失败: 表头缺少要求的字段: {'、'.join(missing)}。"
+        return f"通过: 输出为表格格式，表头包含要求的字段 {'、'.join(required)}。"
+    return "通过: 输出为符合要求的表格格式。"
+
+
+def _template_pattern(example, placeholder):
+    """将示例句转换为正则：占位符匹配数字，空白可有可无，中英文逗号通用，忽略句末标点。"""
+    def literal(text):
+        parts = []
+        for char in text:
+            if char.isspace():
+                parts.append(r'\s*')
+            elif char in '，,':
+                parts.append(r'\s*[，,]\s*')
+            else:
+                parts.append(re.escape(char))
+        return ''.join(parts)
+    head = example[:placeholder.start()]
+    tail = example[placeholder.end():].rstrip('。.！!')
+    return re.compile(literal(head) + r'\s*\d+\s*' + literal(tail))
+
+
+def _check_numeric_sentence(expected_format, actual_output):
+    """检查“数据库中现在有X张表”这类含数量的自然语言句子，无法确定时返回 None。"""
+    match = _EXAMPLE_RE.search(expected_format)
+    if not match:
+        return None
+    example = match.group(1)
+    placeholder = _PLACEHOLDER_RE.search(example)
+    if not placeholder:
+        return None
+    if _TABLE_ROW_RE.search(actual_output):
+        return "失败: 期望自然语言描述，实际输出为表格。"
+    # 只有输出包含按示例句填入数字的句子时才在本地判定通过
+    if _template_pattern(example, placeholder).search(actual_output):
+        return f"通过: 输出符合示例句“{example}”的格式，并给出了具体数量。"
+    # 措辞不同或数字以中文书写，交给大模型判断
+    return None
+
+
+def verdict_passed(verdict):
+    """
+    根据验证结果开头的状态判断是否通过（“通过: 理由”），理由中出现的“通过”不计。
+
+    参数:
+        verdict (str): 验证结果。
+
+    返回:
+        bool: 是否通过。
+    """
+    return (verdict or '').lstrip(' \t\r\n*#【[').startswith("通过")
+
+
+def check_format_locally(expected_format, actual_output):
+    """
+    用确定性规则检查可机器判定的格式：psql 表格边框、要求的表头字段、含数量的句子。
+
+    参数:
+        expected_format (str): 期望输出格式描述。
+        actual_output (str): 实际输出内容。
+
+    返回:
+        str: 与 verify_output_format 相同格式的结果（“通过: 理由”或“失败: 理由”）；
+             无法在本地判定时返回 None。
+    """
+    expected_format = expected_format or ''
+    actual_output = actual_output or ''
+    if '表格' in expected_format and '自然语言' not in expected_format:
+        return _check_table(expected_format, actual_output)
+    return _check_numeric_sentence(expected_format, actual_output)
+
+
+class OutputVerifier:
+    """
+    测试输出验证器：本地规则优先，其余用例打包成批量提示词交给大模型验证。
+
+    属性:
+        llm (LLMClient): 大模型客户端。
+        local_checks (bool): 是否启用本地规则。
+        batch_size (int): 每次批量验证的用例数。
+        max_output_chars (int): 批量验证时单个实际输出的最大字符数。
+
+    方法:
+        verify_all: 验证一组 (期望格式, 实际输出)
+        stats: 返回本地判定数、大模型验证数和调用次数
+    """
+
+    def __init__(self, llm, local_checks=True, batch_size=8, max_output_chars=2000):
+        self.llm = llm
+        self.local_checks = local_checks
+        self.batch_size = max(int(batch_size), 1)
+        self.max_output_chars = max_output_chars
+        self._lock = threading.Lock()
+        self._stats = {'local': 0, 'llm': 0, 'llm_calls': 0}
+
+    def _count(self, key, value=1):
+        with self._lock:
+            self._stats[key] += value
+
+    def _verify_batch(self, batch):
+        """批量验证 [(序号, 期望格式, 实际输出)]，返回 {序号: 结果}。"""
+        if len(batch) == 1:
+            _, expected_format, actual_output = batch[0]
+            self._count('llm_calls')
+            return {batch[0][0]: self.llm.verify_output_format(expected_format, actual_output)}
+
+        items = [
+            (expected_format, actual_output[:self.max_output_chars])
+            for _, expected_format, actual_output in batch
+        ]
+        self._count('llm_calls')
+        verdicts = self.llm.verify_output_formats(items)
+        results = {}
+        for (index, expected_format, actual_output), verdict in zip(batch, verdicts):
+            if verdict is None:
+                # 批量结果中缺少该用例，单独验证
+                self._count('llm_calls')
+                verdict = self.llm.verify_output_format(expected_format, actual_output)
+            results[index] = verdict
+        return results
+
+    def verify_all(self, items, max_workers=1):
+        """
+        验证一组测试输出。
+
+        参数:
+            items (list): [(期望格式, 实际输出)]。
+            max_workers (int): 并发执行的批量验证数。
+
+        返回:
+            list: 与 items 顺序一致的 (结果, 来源)，结果为“通过: 理由”或“失败: 理由”，来源为 local 或 llm。
+        """
+        results = [None] * len(items)
+        pending = []
+        for index, (expected_format, actual_output) in enumerate(items):
+            verdict = check_format_locally(expected_format, actual_output) if self.local_checks else None
+            if verdict is not None:
+                results[index] = (verdict, 'local')
+                self._count('local')
+            else:
+                pending.append((index, expected_format or '', actual_output or ''))
+
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        workers = max(min(max_workers, len(batches)), 1)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="output-verifier") as executor:
+            for verdicts in executor.map(bind_context(self._verify_batch), batches):
+                for index, verdict in verdicts.items():
+                    results[index] = (verdict, 'llm')
+        self._count('llm', len(pending))
+        logger.info("输出格式验证完成：本地判定 %s 个，大模型验证 %s 个（%s 批）", len(items) - len(pending), len(pending), len(batches))
+        return results
+
+    def stats(self):
+        """
+        返回累计统计信息。
+
+        返回:
+            dict: local（本地判定数）、llm（大模型验证数）、llm_calls（大模型调用次数）。
+        """
+        with self._lock:
+            return dict(self._stats)
+
+
+def create_output_verifier(llm):
+    """
+    按配置创建输出验证器。
+
+    参数:
+        llm (LLMClient): 大模型客户端。
+
+    返回:
+        OutputVerifier: 验证器。
+    """
+    config = get_section("model_config.yaml", "verifier", DEFAULT_VERIFIER_CONFIG)
+    return OutputVerifier(
+        llm,
+        local_checks=config['local_checks'],
+        batch_size=config['batch_size'],
+        max_output_chars=config['max_output_chars'],
+    )
@@ -0,0 +1,251 @@
+import datetime
+from decimal import Decimal
+from collections import Counter, deque
+import numpy as np
+from utils.logger import logger
+from utils.config import get_section
+
+logger.debug("Initializing result_digest module")
+
+# 结果摘要默认配置，可在 config/model_config.yaml 的 result_digest 节中覆盖
+DEFAULT_DIGEST_CONFIG = {
+    'head_rows': 5,          # 保留的前几行样例
+    'tail_rows': 5,          # 保留的后几行样例
+    'top_k': 5,              # 文本列保留的高频值数量
+    'max_columns': 30,       # 摘要中最多描述的列数
+    'max_cell_chars': 64,    # 样例中单个值的最大字符数
+    'max_distinct': 10000,   # 每列最多精确计数的不同值数量，超出后改为近似计数
+}
+
+_NUMERIC_TYPES = (int, float, Decimal, np.integer, np.floating)
+_TEMPORAL_TYPES = (datetime.date, datetime.datetime, datetime.time, datetime.timedelta)
+
+
+def _format_number(value):
+    """格式化统计量：整数不带小数，其余保留至多 4 位小数，避免科学计数法。"""
+    if abs(value) < 1e15 and float(value).is_integer():
+        return str(int(value))
+    return f"{value:.4f}".rstrip('0').rstrip('.')
+
+
+class _ColumnStats:
+    """单列的增量统计。"""
+
+    def __init__(self):
+        self.kind = None  # numeric / temporal / text
+        self.nulls = 0
+        self.count = 0
+        self.minimum = None
+        self.maximum = None
+        self.total = 0.0
+        self.counter = Counter()
+        self.approximate = False
+
+
+class ResultDigest:
+    """
+    查询结果摘要：在本地增量计算统计信息，只把大小固定的摘要交给大模型。
+
+    支持分批调用 add_rows（例如流式读取大结果集），每批按列用 NumPy 向量化计算
+    数值列的 min/max/sum、文本列的取值计数，并保留首尾若干行样例。
+    无论结果多大，to_prompt_text 输出的长度都有上限。
+
+    属性:
+        row_count (int): 已处理的行数。
+        columns (list): 列名列表（按首次出现顺序）。
+        truncated (bool): 结果是否因达到行数上限而被截断，由调用方设置。
+
+    方法:
+        add_rows: 追加一批行（字典列表）
+        to_prompt_text: 生成给大模型的摘要文本
+        to_dict: 以字典形式返回摘要
+    """
+
+    def __init__(self, head_rows=5, tail_rows=5, top_k=5, max_columns=30, max_cell_chars=64, max_distinct=10000):
+        self.head_rows = head_rows
+        self.tail_rows = tail_rows
+        self.top_k = top_k
+        self.max_columns = max_columns
+        self.max_cell_chars = max_cell_chars
+        self.max_distinct = max_distinct
+        self.row_count = 0
+        self.columns = []
+        self.truncated = False
+        self._stats = {}
+        self._head = []
+        self._tail = deque(maxlen=tail_rows)
+
+    def add_rows(self, rows):
+        """
+        追加一批行。
+
+        参数:
+            rows (list): 字典列表，如 DictCursor 的 fetchall/fetchmany 结果。
+        """
+        if not rows:
+            return
+        rows = list(rows)
+        for row in rows[:max(self.head_rows - len(self._head), 0)]:
+            self._head.append(row)
+        if self.tail_rows:
+            self._tail.extend(rows[-self.tail_rows:])
+        self.row_count += len(rows)
+
+        for column in rows[0].keys():
+            if column not in self._stats:
+                self.columns.append(column)
+                self._stats[column] = _ColumnStats()
+        for column in self.columns[:self.max_columns]:
+            self._update_column(self._stats[column], [row.get(column) for row in rows])
+
+    def _update_column(self, stats, values):
+        non_null = [value for value in values if value is not None]
+        stats.nulls += len(values) - len(non_null)
+        if not non_null:
+            return
+        if stats.kind is None:
+            sample = non_null[0]
+            if isinstance(sample, _NUMERIC_TYPES) and not isinstance(sample, bool):
+                stats.kind = 'numeric'
+            elif isinstance(sample, _TEMPORAL_TYPES):
+                stats.kind = 'temporal'
+            else:
+                stats.kind = 'text'
+        stats.count += len(non_null)
+
+        if stats.kind == 'numeric':
+            try:
+                array = np.asarray(non_null, dtype=np.float64)
+            except (TypeError, ValueError):
+                # 混合类型的列降级为文本列
+                stats.kind = 'text'
+            else:
+                batch_min, batch_max = array.min(), array.max()
+                stats.minimum = batch_min if stats.minimum is None else min(stats.minimum, batch_min)
+                stats.maximum = batch_max if stats.maximum is None else max(stats.maximum, batch_max)
+                stats.total += float(array.sum())
+                return
+
+        if stats.kind == 'temporal':
+            try:
+                batch_min, batch_max = min(non_null), max(non_null)
+            except TypeError:
+                stats.kind = 'text'
+            else:
+                stats.minimum = batch_min if stats.minimum is None else min(stats.minimum, batch_min)
+                stats.maximum = batch_max if stats.maximum is None else max(stats.maximum, batch_max)
+                return
+
+        labels, counts = np.unique(np.asarray([str(value) for value in non_null]), return_counts=True)
+        for label, count in zip(labels.tolist(), counts.tolist()):
+            if label in stats.counter or len(stats.counter) < self.max_distinct:
+                stats.counter[label] += count
+            else:
+                stats.approximate = True
+        if len(stats.counter) >= self.max_distinct:
+            # 只保留高频的一半，为新值腾出空间，计数变为近似值
+            stats.counter = Counter(dict(stats.counter.most_common(self.max_distinct // 2)))
+            stats.approximate = True
+
+    def _cell(self, value):
+        text = str(value)
+        if len(text) > self.max_cell_chars:
+            return f"{text[:self.max_cell_chars]}…(共{len(text)}字符)"
+        return text
+
+    def _sample_rows(self):
+        if self.row_count <= self.head_rows + self.tail_rows:
+            rows = self._head + list(self._tail)[len(self._tail) - (self.row_count - len(self._head)):]
+            return rows, []
+        return self._head, list(self._tail)
+
+    def _format_row(self, row):
+        columns = self.columns[:self.max_columns]
+        return "{" + ", ".join(f"{column}: {self._cell(row.get(column))}" for column in columns) + "}"
+
+    def to_dict(self):
+        """
+        以字典形式返回摘要。
+
+        返回:
+            dict: row_count、columns（每列的类型、空值数和统计量）、head、tail。
+        """
+        columns = {}
+        for column in self.columns[:self.max_columns]:
+            stats = self._stats[column]
+            info = {'type': stats.kind or 'null', 'nulls': stats.nulls}
+            if stats.kind == 'numeric' and stats.count:
+                info.update({
+                    'min': float(stats.minimum), 'max': float(stats.maximum),
+                    'sum': stats.total, 'avg': stats.total / stats.count,
+                })
+            elif stats.kind == 'temporal' and stats.count:
+                info.update({'min': str(stats.minimum), 'max': str(stats.maximum)})
+            elif stats.kind == 'text':
+                info['distinct'] = len(stats.counter)
+                info['top'] = stats.counter.most_common(self.top_k)
+                info['approximate'] = stats.approximate
+            columns[column] = info
+        head, tail = self._sample_rows()
+        return {'row_count': self.row_count, 'columns': columns, 'head': head, 'tail': tail}
+
+    def to_prompt_text(self):
+        """
+        生成给大模型的摘要文本，长度与结果行数无关。
+
+        返回:
+            str: 摘要文本。
+        """
+        if not self.row_count:
+            return "查询结果为空（0行）。"
+
+        digest = self.to_dict()
+        lines = [f"共 {self.row_count} 行，{len(self.columns)} 列。"]
+        if self.truncated:
+            lines.append(f"（结果超过行数上限，仅统计了前 {self.row_count} 行）")
+        if len(self.columns) > self.max_columns:
+            lines.append(f"（仅描述前 {self.max_columns} 列）")
+        lines.append("列统计：")
+        for column, info in digest['columns'].items():
+            detail = f"- {column}（{info['type']}，空值 {info['nulls']}）"
+            if info['type'] == 'numeric' and 'min' in info:
+                detail += (
+                    f"：最小 {_format_number(info['min'])}，最大 {_format_number(info['max'])}，"
+                    f"合计 {_format_number(info['sum'])}，平均 {_format_number(info['avg'])}"
+                )
+            elif info['type'] == 'temporal' and 'min' in info:
+                detail += f"：最早 {info['min']}，最晚 {info['max']}"
+            elif info['type'] == 'text':
+                top = "，".join(f"{self._cell(value)}({count})" for value, count in info['top'])
+                prefix = "约" if info['approximate'] else ""
+                detail += f"：{prefix}{info['distinct']} 个不同值，高频值 {top}"
+            lines.append(detail)
+
+        head, tail = digest['head'], digest['tail']
+        if not tail:
+            lines.append("全部数据：")
+            lines.extend(self._format_row(row) for row in head)
+        else:
+            lines.append(f"前 {len(head)} 行：")
+            lines.extend(self._format_row(row) for row in head)
+            lines.append(f"后 {len(tail)} 行：")
+            lines.extend(self._format_row(row) for row in tail)
+        return "\n".join(lines)
+
+
+def create_result_digest():
+    """
+    按配置创建一个新的结果摘要对象。
+
+    返回:
+        ResultDigest: 摘要对象。
+    """
+    config = get_section("model_config.yaml", "result_digest", DEFAULT_DIGEST_CONFIG)
+    return ResultDigest(
+        head_rows=config['head_rows'],
+        tail_rows=config['tail_rows'],
+        top_k=config['top_k'],
+        max_columns=config['max_columns'],
+        max_cell_chars=config['max_cell_chars'],
+        max_distinct=config['max_distinct'],
+    )
@@ -0,0 +1,251 @@
+import re
+import json
+import hashlib
+from utils.logger import logger
+from utils.database import SchemaCache
+
+logger.debug("Initializing rule_registry module")
+
+# 编译后的规则缓存，与表结构缓存分开，各自的命中率互不影响
+rule_cache = SchemaCache(name="rules")
+
+# 合法的表名/列名，编译时校验后用反引号引用
+_IDENTIFIER_RE = re.compile(r'^[A-Za-z0-9_$]+$')
+
+
+def quote_identifier(name):
+    """
+    校验并用反引号引用表名或列名。
+
+    参数:
+        name (str): 表名或列名。
+
+    返回:
+        str: 引用后的标识符，如 `employees`。
+
+    抛出:
+        ValueError: 如果名称包含非法字符。
+    """
+    if not name or not _IDENTIFIER_RE.match(str(name)):
+        raise ValueError(f"非法的表名或列名: {name}")
+    return f"`{name}`"
+
+
+def parse_allowed_values(rule):
+    """
+    解析 in_list 规则的允许值列表。
+
+    优先使用 dq_rules 中的 allowed_values 列（JSON 数组或以 / 分隔的字符串），
+    没有该列时从描述中提取，如“地区必须为 East/West/North/South”。
+
+    参数:
+        rule (dict): dq_rules 表中的一行。
+
+    返回:
+        tuple: 允许值列表。
+
+    抛出:
+        ValueError: 如果无法解析出允许值。
+    """
+    raw = rule.get('allowed_values')
+    if raw:
+        if isinstance(raw, (list, tuple)):
+            values = list(raw)
+        else:
+            try:
+                values = json.loads(raw)
+            except ValueError:
+                values = str(raw).split('/')
+            if not isinstance(values, list):
+                values = [values]
+    else:
+        description = rule.get('description') or ''
+        if '必须为 ' not in description:
+            raise ValueError(f"无法从规则描述中解析允许值: {description}")
+        values = description.split('必须为 ')[1].split(' ')[0].split('/')
+    values = tuple(str(value).strip() for value in values if str(value).strip())
+    if not values:
+        raise ValueError("允许值列表为空")
+    return values
+
+
+class CompiledRule:
+    """
+    编译后的规则：违规条件以参数化 SQL 片段保存，执行时无需再查询或解析规则定义。
+
+    属性:
+        rule_id (str): 规则标识符。
+        table_name (str): 规则所在的表。
+        column_name (str): 规则检查的列。
+        condition_type (str): 条件类型（not_null / not_empty / in_list）。
+        description (str): 规则描述。
+        allowed_values (tuple): in_list 规则的允许值，其他类型为空元组。
+        condition (str): 违规行的 WHERE 条件（含 %s 占位符），无法编译时为 None。
+        params (tuple): condition 对应的参数。
+        error (str): 无法编译时的原因。
+
+    方法:
+        count_query: 返回统计违规行数的参数化查询
+        fingerprint: 返回规则定义的指纹
+    """
+
+    def __init__(self, rule_id, table_name, column_name, condition_type, description,
+                 allowed_values=(), condition=None, params=(), error=None):
+        self.rule_id = rule_id
+        self.table_name = table_name
+        self.column_name = column_name
+        self.condition_type = condition_type
+        self.description = description
+        self.allowed_values = allowed_values
+        self.condition = condition
+        self.params = params
+        self.error = error
+
+    def count_query(self):
+        """
+        返回统计违规行数的参数化查询。
+
+        返回:
+            tuple: (SQL, 参数)，结果列名为 violations。
+        """
+        return f"SELECT COUNT(*) AS violations FROM {quote_identifier(self.table_name)} WHERE {self.condition}", self.params
+
+    def fingerprint(self):
+        """
+        返回规则定义的指纹，表、列、条件或允许值变化后指纹随之变化。
+
+        返回:
+            str: 十六进制指纹。
+        """
+        raw = json.dumps([self.table_name, self.column_name, self.condition, list(self.params)], ensure_ascii=False)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def compile_rule(rule):
+    """
+    将 dq_rules 中的一行编译为 CompiledRule。
+
+    参数:
+        rule (dict): dq_rules 表中的一行。
+
+    返回:
+        CompiledRule: 编译结果；不支持或无法解析的规则 condition 为 None，原因记录在 error 中。
+    """
+    compiled = CompiledRule(
+        rule_id=rule['rule_id'],
+        table_name=rule['table_name'],
+        column_name=rule['column_name'],
+        condition_type=rule['condition_type'],
+        description=rule['description'],
+    )
+    try:
+        quote_identifier(compiled.table_name)
+        column = quote_identifier(compiled.column_name)
+        if compiled.condition_type == 'not_null':
+            compiled.condition = f"{column} IS NULL OR {column} = ''"
+        elif compiled.condition_type == 'not_empty':
+            compiled.condition = f"{column} = '' OR {column} IS NULL"
+        elif compiled.condition_type == 'in_list':
+            compiled.allowed_values = parse_allowed_values(rule)
+            placeholders = ", ".join(["%s"] * len(compiled.allowed_values))
+            compiled.condition = f"{column} NOT IN ({placeholders})"
+            compiled.params = compiled.allowed_values
+        else:
+            compiled.error = f"不支持的条件类型: {compiled.condition_type}"
+    except ValueError as e:
+        compiled.error = f"规则定义无效: {str(e)}"
+    if compiled.error:
+        logger.warning("规则 %s 无法编译: %s", compiled.rule_id, compiled.error)
+    return compiled
+
+
+class RuleRegistry:
+    """
+    规则注册表：一次性读取 dq_rules 并编译为参数化查询计划。
+
+    编译结果存放在专用的 rule_cache 中（键为 "<库名>#dq_rules"），在免校验窗口内直接命中；
+    超过窗口后查询 information_schema 中 dq_rules 的 CREATE_TIME / UPDATE_TIME（不扫描规则表），
+    变化时重新加载并编译。MySQL 8.0 会按 information_schema_stats_expiry 缓存 UPDATE_TIME，
+    未把该变量设为 0 时，在其他地方修改规则后应调用 invalidate 立即失效。
+
+    属性:
+        db (Database): 数据库操作对象。
+
+    方法:
+        get: 按规则编号获取编译后的规则
+        rules_for_table: 获取某张表（或全部）的编译后规则
+        table_names: 获取定义了规则的表名
+        invalidate: 使注册表失效
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def _cache_key(self):
+        return f"{self.db.db_name}#dq_rules"
+
+    def _load_fingerprint(self):
+        """dq_rules 表的创建和最后修改时间，重建表或增删改规则后随之变化。"""
+        rows = self.db.query(
+            "SELECT CREATE_TIME AS create_time, UPDATE_TIME AS update_time "
+            "FROM information_schema.tables WHERE table_schema = %s AND table_name = 'dq_rules'",
+            (self.db.db_name,)
+        )
+        return (rows[0]['create_time'], rows[0]['update_time']) if rows else None
+
+    def _load_rules(self):
+        rows = self.db.query("SELECT * FROM dq_rules ORDER BY table_name, rule_id")
+        rules = {}
+        for row in rows:
+            compiled = compile_rule(row)
+            rules[compiled.rule_id] = compiled
+        logger.info("加载并编译规则完成，共 %s 条", len(rules))
+        return rules
+
+    def _rules(self, refresh=False):
+        return rule_cache.get(self._cache_key(), self._load_fingerprint, self._load_rules, force_refresh=refresh)
+
+    def get(self, rule_id, refresh=False):
+        """
+        按规则编号获取编译后的规则。
+
+        参数:
+            rule_id (str): 规则标识符。
+            refresh (bool): 为 True 时忽略缓存，重新加载规则。
+
+        返回:
+            CompiledRule: 编译后的规则，不存在时返回 None。
+        """
+        return self._rules(refresh).get(rule_id)
+
+    def rules_for_table(self, table_name=None, refresh=False):
+        """
+        获取某张表上的编译后规则，按 (table_name, rule_id) 排序。
+
+        参数:
+            table_name (str, optional): 表名，默认返回全部规则。
+            refresh (bool): 为 True 时忽略缓存，重新加载规则。
+
+        返回:
+            list: CompiledRule 列表。
+        """
+        rules = self._rules(refresh).values()
+        if table_name:
+            return [rule for rule in rules if rule.table_name == table_name]
+        return list(rules)
+
+    def table_names(self, refresh=False):
+        """
+        获取定义了规则的表名。
+
+        参数:
+            refresh (bool): 为 True 时忽略缓存，重新加载规则。
+
+        返回:
+            list: 按字母排序的表名列表。
+        """
+        return sorted({rule.table_name for rule in self._rules(refresh).values()})
+
+    def invalidate(self):
+        """使注册表失效，下次访问时重新加载，适用于修改 dq_rules 之后。"""
+        rule_cache.invalidate(self._cache_key())
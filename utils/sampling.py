@@ -0,0 +1,64 @@
+import math
+import random
+from statistics import NormalDist
+from utils.logger import logger
+
+logger.debug("Initializing sampling module")
+
+
+def wilson_interval(violations, sampled, confidence=0.95):
+    """
+    计算违规率的 Wilson 置信区间，样本中违规数为 0 或很少时仍然可靠。
+
+    参数:
+        violations (int): 样本中的违规行数。
+        sampled (int): 样本行数。
+        confidence (float): 置信水平，如 0.95。
+
+    返回:
+        tuple: (下限, 上限)，均为 0 到 1 之间的比例；样本为空时返回 (0.0, 1.0)。
+    """
+    if sampled <= 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    rate = violations / sampled
+    denominator = 1 + z * z / sampled
+    center = (rate + z * z / (2 * sampled)) / denominator
+    margin = z * math.sqrt(rate * (1 - rate) / sampled + z * z / (4 * sampled * sampled)) / denominator
+    return max(center - margin, 0.0), min(center + margin, 1.0)
+
+
+def sample_key_ranges(min_key, max_key, fraction, blocks, rng=None):
+    """
+    在整数主键范围内随机选取若干个连续区间，用于主键范围抽样。
+
+    每个区间都能走主键索引做范围扫描，区间总长度约为键空间的 fraction；
+    重叠的区间会被合并。
+
+    参数:
+        min_key (int): 主键最小值。
+        max_key (int): 主键最大值。
+        fraction (float): 抽样比例（0 到 1）。
+        blocks (int): 区间个数。
+        rng (random.Random, optional): 随机数生成器，默认使用模块级随机数。
+
+    返回:
+        list: [(起始键, 结束键)] 的半开区间列表，按起始键排序。
+    """
+    rng = rng or random
+    span = max_key - min_key + 1
+    target = max(int(span * fraction), 1)
+    if target >= span:
+        return [(min_key, max_key + 1)]
+    blocks = max(min(blocks, target), 1)
+    block_size = max(target // blocks, 1)
+    starts = sorted(rng.randint(min_key, max_key - block_size + 1) for _ in range(blocks))
+
+    ranges = []
+    for start in starts:
+        end = start + block_size
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+        else:
+            ranges.append((start, end))
+    return ranges
@@ -0,0 +1,244 @@
+import re
+import math
+import threading
+from utils.logger import logger
+from utils.config import get_section
+from utils.sql_cache import normalize_question
+
+logger.debug("Initializing schema_retriever module")
+
+# 表结构裁剪默认配置，可在 config/model_config.yaml 的 schema_retriever 节中覆盖
+DEFAULT_RETRIEVER_CONFIG = {
+    'enabled': True,
+    'top_k': 3,               # 每个问题最多保留的相关表数量
+    'min_tables': 5,          # 表数量不超过该值时不裁剪
+    'include_related': True,  # 自动带上通过 xxx_id 列关联的表
+    'synonyms': {},           # 额外的同义词，如 {'部门': 'departments'}
+}
+
+# 内置同义词：中文业务词 -> 表名/列名
+DEFAULT_SYNONYMS = {
+    '员工': 'employees', '职员': 'employees', '雇员': 'employees', '人员': 'employees',
+    '销售': 'sales_data', '销量': 'sales_data', '销售额': 'sales',
+    '规则': 'dq_rules', '校验': 'dq_rules', '质量': 'dq_rules',
+    '部门': 'department', '邮箱': 'email', '电话': 'phone', '手机': 'phone',
+    '姓名': 'name', '名字': 'name', '地区': 'region', '区域': 'region', '日期': 'date',
+}
+
+# 各来源命中时的权重
+TABLE_NAME_WEIGHT = 3.0
+COMMENT_WEIGHT = 2.0
+COLUMN_WEIGHT = 1.0
+
+_WORD_RE = re.compile(r'[a-z][a-z0-9]*|[0-9]+')
+_CJK_RE = re.compile(r'[一-鿿]+')
+
+
+def _identifier_terms(name):
+    """将表名/列名拆分为检索词，如 sales_data -> {sales_data, sales, data}。"""
+    name = re.sub(r'([a-z0-9])([A-Z])', r'\1_\2', name).lower()
+    terms = {name}
+    terms.update(part for part in re.split(r'[_\W]+', name) if part)
+    return terms
+
+
+def _text_terms(text):
+    """将自然语言文本拆分为检索词：英文单词 + 中文字符二元组。"""
+    text = normalize_question(text)
+    terms = set(_WORD_RE.findall(text))
+    for run in _CJK_RE.findall(text):
+        if len(run) == 1:
+            terms.add(run)
+        terms.update(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def estimate_tokens(text):
+    """粗略估计文本的 token 数：中文约 1 字 1 token，其余约 4 字符 1 token。"""
+    cjk = sum(len(run) for run in _CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def format_schema_info(table_schema):
+    """按生成SQL提示词中的格式输出表结构，每张表一行。"""
+    if not table_schema:
+        return ""
+    return "\n".join([f"Table: {table}, Columns: {', '.join(columns)}" for table, columns in table_schema.items()])
+
+
+class SchemaRetriever:
+    """
+    本地表结构检索器：为每个问题挑选最相关的若干张表，只把它们放进生成SQL的提示词。
+
+    基于表名、列名、表/列注释和同义词建立倒排索引（按 IDF 加权），
+    索引在表结构对象或注释对象变化时重建（包括注释第一次加载失败、之后加载成功的情况）。没有任何表命中时返回完整表结构，保证不会比裁剪前更差。
+
+    属性:
+        top_k (int): 每个问题最多保留的表数量。
+        min_tables (int): 表数量不超过该值时不裁剪。
+        include_related (bool): 是否带上通过 xxx_id 列关联的表。
+
+    方法:
+        select: 为问题挑选相关表，返回裁剪后的表结构和节省情况
+        stats: 返回累计节省的提示词字符数和 token 数
+    """
+
+    def __init__(self, top_k=3, min_tables=5, include_related=True, synonyms=None):
+        self.top_k = top_k
+        self.min_tables = min_tables
+        self.include_related = include_related
+        self.synonyms = dict(DEFAULT_SYNONYMS)
+        self.synonyms.update(synonyms or {})
+        self._indexed_schema = None
+        self._indexed_comments = None
+        self._index = {}
+        self._full_size = (0, 0)  # 完整表结构提示词的 (字符数, 估计 token 数)
+        self._lock = threading.Lock()
+        self._stats = {'selections': 0, 'pruned': 0, 'fallbacks': 0, 'chars_saved': 0, 'tokens_saved': 0}
+
+    def _build_index(self, table_schema, comments):
+        postings = {}
+
+        def add(term, table, weight):
+            table_weights = postings.setdefault(term, {})
+            table_weights[table] = max(table_weights.get(table, 0.0), weight)
+
+        for table, columns in table_schema.items():
+            for term in _identifier_terms(table):
+                add(term, table, TABLE_NAME_WEIGHT)
+            for column in columns:
+                for term in _identifier_terms(column):
+                    add(term, table, COLUMN_WEIGHT)
+            table_comments = (comments or {}).get(table) or {}
+            for term in _text_terms(table_comments.get('comment', '')):
+                add(term, table, COMMENT_WEIGHT)
+            for column_comment in (table_comments.get('columns') or {}).values():
+                for term in _text_terms(column_comment):
+                    add(term, table, COLUMN_WEIGHT)
+
+        # 按 IDF 加权，出现在很多表中的词（如 id、name）区分度低
+        total = len(table_schema)
+        return {
+            term: {table: weight * math.log(1 + total / len(tables)) for table, weight in tables.items()}
+            for term, tables in postings.items()
+        }
+
+    def _question_terms(self, question):
+        terms = _text_terms(question)
+        normalized = normalize_question(question)
+        for word, target in self.synonyms.items():
+            if word in normalized:
+                terms.update(_identifier_terms(target))
+        return terms
+
+    def _related_tables(self, selected, table_schema):
+        """带上 selected 中 xxx_id 列指向的表（如 department_id -> departments）。"""
+        related = []
+        for table in selected:
+            for column in table_schema[table]:
+                if not column.endswith('_id'):
+                    continue
+                prefix = column[:-3]
+                for candidate in (prefix, prefix + 's', prefix + 'es'):
+                    if candidate in table_schema and candidate not in selected and candidate not in related:
+                        related.append(candidate)
+        return related
+
+    def select(self, question, table_schema, comments=None):
+        """
+        为问题挑选相关表。
+
+        参数:
+            question (str): 用户问题。
+            table_schema (dict): 完整表结构 {表名: [列名列表]}。
+            comments (dict, optional): get_schema_comments() 返回的注释信息。
+
+        返回:
+            tuple: (裁剪后的表结构, 报告 dict)。报告包含 tables、chars_saved、tokens_saved 等字段。
+        """
+        if not table_schema:
+            return table_schema, {'pruned': False, 'reason': 'empty'}
+
+        with self._lock:
+            self._stats['selections'] += 1
+            if len(table_schema) <= self.min_tables:
+                return table_schema, {'pruned': False, 'reason': 'small_schema'}
+            if self._indexed_schema is not table_schema or self._indexed_comments is not comments:
+                self._index = self._build_index(table_schema, comments)
+                self._indexed_schema = table_schema
+                self._indexed_comments = comments
+                full_info = format_schema_info(table_schema)
+                self._full_size = (len(full_info), estimate_tokens(full_info))
+                logger.info("重建表结构检索索引，共 %s 张表，%s 个检索词", len(table_schema), len(self._index))
+            index = self._index
+            full_chars, full_tokens = self._full_size
+
+        scores = {}
+        for term in self._question_terms(question):
+            for table, weight in index.get(term, {}).items():
+                scores[table] = scores.get(table, 0.0) + weight
+
+        if not scores:
+            with self._lock:
+                self._stats['fallbacks'] += 1
+            logger.info("表结构检索无命中，使用完整表结构")
+            return table_schema, {'pruned': False, 'reason': 'no_match'}
+
+        selected = sorted(scores, key=lambda table: -scores[table])[:self.top_k]
+        if self.include_related:
+            selected += self._related_tables(selected, table_schema)
+        pruned = {table: table_schema[table] for table in selected}
+
+        pruned_info = format_schema_info(pruned)
+        chars_saved = full_chars - len(pruned_info)
+        tokens_saved = full_tokens - estimate_tokens(pruned_info)
+        with self._lock:
+            self._stats['pruned'] += 1
+            self._stats['chars_saved'] += chars_saved
+            self._stats['tokens_saved'] += tokens_saved
+
+        report = {
+            'pruned': True,
+            'tables': selected,
+            'total_tables': len(table_schema),
+            'chars_saved': chars_saved,
+            'tokens_saved': tokens_saved,
+        }
+        logger.info("表结构裁剪: %s -> %s 张表，节省约 %s 字符 / %s token", len(table_schema), len(pruned), chars_saved, tokens_saved)
+        return pruned, report
+
+    def stats(self):
+        """
+        返回累计统计信息。
+
+        返回:
+            dict: 检索次数、裁剪次数、无命中回退次数、累计节省字符数和估计 token 数。
+        """
+        with self._lock:
+            return dict(self._stats)
+
+
+_shared_retriever = None
+_shared_retriever_lock = threading.Lock()
+
+
+def get_schema_retriever():
+    """
+    获取进程内共享的表结构检索器，首次调用时根据配置创建。
+
+    返回:
+        SchemaRetriever: 共享检索器；配置中 enabled 为 False 时返回 None。
+    """
+    global _shared_retriever
+    with _shared_retriever_lock:
+        if _shared_retriever is None:
+            config = get_section("model_config.yaml", "schema_retriever", DEFAULT_RETRIEVER_CONFIG)
+            if not config['enabled']:
+                return None
+            _shared_retriever = SchemaRetriever(
+                top_k=config['top_k'],
+                min_tables=config['min_tables'],
+                include_related=config['include_related'],
+                synonyms=config['synonyms'],
+            )
+        return _shared_retriever
@@ -0,0 +1,266 @@
+import re
+import time
+import zlib
+import threading
+import numpy as np
+from utils.logger import logger
+from utils.config import get_section
+from utils.sql_cache import normalize_question, schema_fingerprint
+
+logger.debug("Initializing similarity_cache module")
+
+# 相似问题缓存默认配置，可在 config/model_config.yaml 的 similarity_cache 节中覆盖
+DEFAULT_SIMILARITY_CONFIG = {
+    'enabled': True,
+    'capacity': 20000,      # 最大条目数，超出后淘汰最久未使用的条目
+    'num_perm': 64,         # MinHash 签名长度
+    'band_rows': 4,         # LSH 每个分段的签名行数，num_perm 需能被其整除
+    'ngram': 2,             # 字符 n-gram 长度
+    'threshold': 0.85,      # 估计 Jaccard 相似度达到该值才复用 SQL
+    'synonyms': {},         # 额外的同义词归一化，如 {'列出': '显示'}
+}
+
+# 内置同义词归一化：将常见的同义说法映射到同一个词，提高改写问题的相似度
+DEFAULT_SYNONYMS = {
+    '列出': '显示', '展示': '显示', '查看': '显示', '查询': '显示', '给出': '显示', '看看': '显示',
+    '全部': '所有', '全体': '所有', '一切': '所有',
+    '帮我': '', '一下': '',
+}
+
+# 字面量（英文单词、数字、引号内容）必须完全一致，避免“East”与“West”、“2023”与“2024”互相复用
+_LITERAL_RE = re.compile(r"'[^']*'|\"[^\"]*\"|[a-z0-9_.\-]+")
+
+# 中文的筛选值、否定词（未/不/非）和比较词（大于/小于）没有分隔，逐字比较：
+# 除虚词和填充字外，两个问题出现的汉字必须完全一致，避免“已完成”与“未完成”、“大于”与“小于”互相复用
+_CJK_RE = re.compile(r"[\u4e00-\u9fff]")
+_FILLER_CHARS = frozenset("的了吗呢吧啊请帮我们你给把将都也中里内现在目前所有全部一下个条些")
+
+# 字相同、顺序不同而含义相反的排序说法
+_ORDER_PHRASES = ("高到低", "低到高", "大到小", "小到大", "多到少", "少到多", "早到晚", "晚到早", "新到旧", "旧到新")
+
+
+def key_terms(text):
+    """
+    返回复用 SQL 时必须完全一致的关键项：字面量、除虚词外的汉字和排序说法。
+
+    参数:
+        text (str): 经过规范化和同义词归一化的问题。
+
+    返回:
+        frozenset: 关键项集合。
+    """
+    terms = set(_LITERAL_RE.findall(text))
+    terms.update(char for char in _CJK_RE.findall(text) if char not in _FILLER_CHARS)
+    terms.update(phrase for phrase in _ORDER_PHRASES if phrase in text)
+    return frozenset(terms)
+
+
+# 大于 2^32 的素数，保证 (a * h + b) 在 uint64 内不溢出
+_HASH_PRIME = np.uint64(4294967311)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+
+
+class SimilarityIndex:
+    """
+    基于字符 n-gram MinHash 的相似问题索引，完全在本地运行。
+
+    每个已成功执行的问题保存一个 MinHash 签名，并按 LSH 分段放入哈希桶；
+    查询时只取与问题至少有一个分段相同的候选，用 NumPy 比较签名估计 Jaccard 相似度，
+    因此查询耗时与候选数而不是总条目数相关。只有相似度达到阈值、表结构指纹一致
+    且关键项（字面量、除虚词外的汉字和排序说法，见 key_terms）完全一致时才复用 SQL。
+    条目数有上限，满后淘汰最久未使用的条目。
+
+    属性:
+        capacity (int): 最大条目数。
+        threshold (float): 复用 SQL 的相似度阈值。
+
+    方法:
+        lookup: 查找最相似的已知问题
+        add: 添加一个问题及其已验证的 SQL
+        discard: 使某条 SQL 对应的条目失效
+        stats: 返回命中率等统计信息
+    """
+
+    def __init__(self, capacity=20000, num_perm=64, band_rows=4, ngram=2, threshold=0.85, synonyms=None, seed=1):
+        if num_perm % band_rows:
+            raise ValueError("num_perm 必须能被 band_rows 整除")
+        self.capacity = capacity
+        self.num_perm = num_perm
+        self.band_rows = band_rows
+        self.ngram = ngram
+        self.threshold = threshold
+        self.synonyms = dict(DEFAULT_SYNONYMS)
+        self.synonyms.update(synonyms or {})
+        # 长词优先替换
+        self._synonym_items = sorted(self.synonyms.items(), key=lambda item: -len(item[0]))
+
+        rng = np.random.RandomState(seed)
+        self._perm_a = rng.randint(1, 2 ** 32 - 1, size=num_perm, dtype=np.uint64)
+        self._perm_b = rng.randint(0, 2 ** 32 - 1, size=num_perm, dtype=np.uint64)
+
+        self._signatures = np.zeros((capacity, num_perm), dtype=np.uint32)
+        self._schema_ids = np.full(capacity, -1, dtype=np.int64)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._entries = [None] * capacity  # (question, sql, literals, band_keys)
+        self._buckets = [{} for _ in range(num_perm // band_rows)]  # 分段签名 -> 条目槽位集合
+        self._size = 0
+        self._schema_id_map = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'literal_mismatches': 0, 'evictions': 0}
+
+    def _canonical(self, question):
+        text = normalize_question(question)
+        for word, replacement in self._synonym_items:
+            text = text.replace(word, replacement)
+        return text
+
+    def _signature(self, text):
+        n = self.ngram
+        grams = {text[i:i + n] for i in range(max(len(text) - n + 1, 1))}
+        hashes = np.array([zlib.crc32(gram.encode('utf-8')) for gram in grams], dtype=np.uint64)
+        permuted = (hashes[:, None] * self._perm_a + self._perm_b) % _HASH_PRIME
+        return (permuted & _MAX_HASH).min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        rows = self.band_rows
+        return [signature[i * rows:(i + 1) * rows].tobytes() for i in range(len(self._buckets))]
+
+    def _schema_id(self, table_schema):
+        fingerprint = schema_fingerprint(table_schema)
+        schema_id = self._schema_id_map.get(fingerprint)
+        if schema_id is None:
+            schema_id = len(self._schema_id_map)
+            self._schema_id_map[fingerprint] = schema_id
+        return schema_id
+
+    def lookup(self, question, table_schema=None, candidates=5):
+        """
+        查找与问题最相似的已知问题。
+
+        参数:
+            question (str): 用户问题。
+            table_schema (dict, optional): 当前表结构，仅匹配同一表结构下记录的条目。
+            candidates (int): 关键项不一致时最多尝试的候选数。
+
+        返回:
+            tuple: (sql, 相似度, 匹配到的问题)，未达到阈值返回 None。
+        """
+        text = self._canonical(question)
+        signature = self._signature(text)
+        literals = key_terms(text)
+        band_keys = self._band_keys(signature)
+        with self._lock:
+            schema_id = self._schema_id(table_schema)
+            slots = set()
+            for bucket, key in zip(self._buckets, band_keys):
+                slots.update(bucket.get(key, ()))
+            if slots:
+                slots = np.fromiter(slots, dtype=np.int64, count=len(slots))
+                scores = (self._signatures[slots] == signature).mean(axis=1)
+                scores[self._schema_ids[slots] != schema_id] = -1.0
+                order = np.argsort(-scores)[:candidates]
+                for slot, score in zip(slots[order], scores[order]):
+                    score = float(score)
+                    if score < self.threshold:
+                        break
+                    matched_question, sql, entry_literals, _ = self._entries[slot]
+                    if entry_literals != literals:
+                        self._stats['literal_mismatches'] += 1
+                        continue
+                    self._last_used[slot] = time.monotonic()
+                    self._stats['hits'] += 1
+                    return sql, score, matched_question
+            self._stats['misses'] += 1
+            return None
+
+    def add(self, question, sql, table_schema=None):
+        """
+        添加一个问题及其已验证（执行成功）的 SQL。
+
+        参数:
+            question (str): 用户问题。
+            sql (str): 已验证的 SQL。
+            table_schema (dict, optional): 生成 SQL 时的表结构。
+        """
+        text = self._canonical(question)
+        signature = self._signature(text)
+        literals = key_terms(text)
+        band_keys = self._band_keys(signature)
+        with self._lock:
+            if self._size < self.capacity:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(np.argmin(self._last_used))
+                self._remove_from_buckets(slot)
+                self._stats['evictions'] += 1
+            self._signatures[slot] = signature
+            self._schema_ids[slot] = self._schema_id(table_schema)
+            self._last_used[slot] = time.monotonic()
+            self._entries[slot] = (question, sql, literals, band_keys)
+            for bucket, key in zip(self._buckets, band_keys):
+                bucket.setdefault(key, set()).add(slot)
+
+    def _remove_from_buckets(self, slot):
+        for bucket, key in zip(self._buckets, self._entries[slot][3]):
+            slots = bucket.get(key)
+            if slots is not None:
+                slots.discard(slot)
+                if not slots:
+                    del bucket[key]
+
+    def discard(self, sql):
+        """
+        使所有对应该 SQL 的条目失效，用于复用的 SQL 执行失败时。
+
+        参数:
+            sql (str): 需要失效的 SQL。
+        """
+        with self._lock:
+            for slot in range(self._size):
+                entry = self._entries[slot]
+                if entry is not None and entry[1] == sql:
+                    self._schema_ids[slot] = -1
+                    self._last_used[slot] = 0.0
+
+    def stats(self):
+        """
+        返回统计信息。
+
+        返回:
+            dict: 命中、未命中、关键项不一致次数、淘汰次数、命中率和条目数。
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = self._size
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+_shared_index = None
+_shared_index_lock = threading.Lock()
+
+
+def get_similarity_index():
+    """
+    获取进程内共享的相似问题索引，首次调用时根据配置创建。
+
+    返回:
+        SimilarityIndex: 共享索引；配置中 enabled 为 False 时返回 None。
+    """
+    global _shared_index
+    with _shared_index_lock:
+        if _shared_index is None:
+            config = get_section("model_config.yaml", "similarity_cache", DEFAULT_SIMILARITY_CONFIG)
+            if not config['enabled']:
+                return None
+            _shared_index = SimilarityIndex(
+                capacity=config['capacity'],
+                num_perm=config['num_perm'],
+                band_rows=config['band_rows'],
+                ngram=config['ngram'],
+                threshold=config['threshold'],
+                synonyms=config['synonyms'],
+            )
+        return _shared_index
@@ -0,0 +1,315 @@
+import os
+import re
+import time
+import json
+import atexit
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from utils.logger import logger
+from utils.config import get_section
+
+logger.debug("Initializing sql_cache module")
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# SQL 缓存默认配置，可在 config/model_config.yaml 的 sql_cache 节中覆盖
+DEFAULT_SQL_CACHE_CONFIG = {
+    'enabled': True,
+    'memory_size': 512,                       # 内存 LRU 最大条目数
+    'disk_path': 'cache/sql_cache.sqlite3',   # SQLite 文件路径（相对项目根目录），为空则只用内存
+    'max_disk_entries': 10000,                # 磁盘最大条目数
+    'ttl': 7 * 24 * 3600,                     # 条目有效期（秒），<= 0 表示永不过期
+}
+
+# 命中条目的 last_used 先记在内存中，攒够这么多条或距上次写入超过这么多秒时再批量写回磁盘
+_TOUCH_BATCH_SIZE = 256
+_TOUCH_FLUSH_INTERVAL = 30
+
+# NFKC 不处理的中文标点，统一映射为半角
+_CJK_PUNCTUATION = str.maketrans({
+    '。': '.', '、': ',', '《': '<', '》': '>', '「': '"', '」': '"', '『': '"', '』': '"',
+    '【': '[', '】': ']', '〈': '<', '〉': '>', '～': '~', '·': '.',
+})
+_WHITESPACE_RE = re.compile(r'\s+')
+# 非 ASCII 字符两侧的空白没有语义（如“显示 East 地区”与“显示East地区”）
+_CJK_SPACE_RE = re.compile(r'\s*([^\x00-\x7f])\s*')
+_TRAILING_PUNCT_RE = re.compile(r'[\s.,!?;:]+$')
+
+
+def normalize_question(text):
+    """
+    规范化用户问题，用于缓存键。
+
+    全角字符转半角（NFKC）、统一中文标点、转小写、合并空白、
+    去除中文两侧空白和结尾标点。
+
+    参数:
+        text (str): 用户问题。
+
+    返回:
+        str: 规范化后的问题。
+    """
+    text = unicodedata.normalize('NFKC', text or '').translate(_CJK_PUNCTUATION).lower()
+    text = _WHITESPACE_RE.sub(' ', text).strip()
+    text = _CJK_SPACE_RE.sub(r'\1', text)
+    return _TRAILING_PUNCT_RE.sub('', text)
+
+
+# 最近计算过指纹的表结构对象（按对象身份比较），避免对同一个缓存对象重复哈希
+_FINGERPRINT_MEMO_SIZE = 8
+_fingerprint_memo = []
+_fingerprint_lock = threading.Lock()
+
+
+def schema_fingerprint(table_schema):
+    """
+    计算表结构指纹，表结构变化后缓存键随之变化。
+
+    最近使用过的表结构对象（如 SchemaCache 返回的缓存对象）只计算一次。
+
+    参数:
+        table_schema (dict): {表名: [列名列表]}，可以为 None。
+
+    返回:
+        str: 十六进制指纹。
+    """
+    if not table_schema:
+        return "no-schema"
+    with _fingerprint_lock:
+        for memo_schema, memo_digest in _fingerprint_memo:
+            if memo_schema is table_schema:
+                return memo_digest
+    serialized = json.dumps(sorted((table, list(columns)) for table, columns in table_schema.items()), ensure_ascii=False)
+    digest = hashlib.sha1(serialized.encode('utf-8')).hexdigest()
+    with _fingerprint_lock:
+        _fingerprint_memo.insert(0, (table_schema, digest))
+        del _fingerprint_memo[_FINGERPRINT_MEMO_SIZE:]
+    return digest
+
+
+class SQLCache:
+    """
+    自然语言到 SQL 的两级缓存：内存 LRU + SQLite 持久化存储。
+
+    缓存键由模型名、规范化问题和表结构指纹组成，表结构变化会自动使旧条目失效。
+    磁盘命中的条目会提升到内存层。命中时不立即更新磁盘上的 last_used，
+    而是批量写回（攒够一批、超过写回间隔、写入新条目或关闭时），磁盘淘汰顺序因此最多滞后一个写回间隔。
+
+    属性:
+        memory_size (int): 内存 LRU 最大条目数。
+        max_disk_entries (int): 磁盘最大条目数。
+        ttl (float): 条目有效期（秒），<= 0 表示永不过期。
+
+    方法:
+        make_key: 生成缓存键
+        get: 查询缓存
+        put: 写入缓存
+        discard: 删除条目（如生成的 SQL 执行失败）
+        clear: 清空缓存
+        stats: 返回命中率等统计信息
+        close: 写回未保存的使用时间并关闭磁盘缓存
+    """
+
+    def __init__(self, memory_size=512, disk_path=None, max_disk_entries=10000, ttl=0):
+        self.memory_size = memory_size
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()  # key -> (sql, created_at)
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'expired': 0, 'puts': 0}
+        self._touched = {}  # key -> 尚未写回磁盘的 last_used
+        self._last_touch_flush = time.monotonic()
+        self._disk = None
+        if disk_path:
+            directory = os.path.dirname(disk_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS sql_cache ("
+                "key TEXT PRIMARY KEY, question TEXT, sql TEXT, created_at REAL, last_used REAL)"
+            )
+            self._disk.execute("CREATE INDEX IF NOT EXISTS idx_sql_cache_last_used ON sql_cache(last_used)")
+            self._disk.commit()
+
+    @staticmethod
+    def make_key(question, table_schema=None, model=""):
+        """
+        生成缓存键。
+
+        参数:
+            question (str): 用户问题。
+            table_schema (dict, optional): 生成 SQL 时使用的表结构。
+            model (str): 模型名称。
+
+        返回:
+            str: 缓存键。
+        """
+        raw = "\x00".join([model, normalize_question(question), schema_fingerprint(table_schema)])
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _expired(self, created_at, now):
+        return self.ttl > 0 and now - created_at > self.ttl
+
+    def _remember(self, key, sql, created_at):
+        self._memory[key] = (sql, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _touch(self, key, now):
+        """记录条目的使用时间，需持有 self._lock；攒够一批或超过写回间隔时写回磁盘。"""
+        if self._disk is None:
+            return
+        self._touched[key] = now
+        if (len(self._touched) >= _TOUCH_BATCH_SIZE
+                or time.monotonic() - self._last_touch_flush >= _TOUCH_FLUSH_INTERVAL):
+            self._flush_touched()
+            self._disk.commit()
+
+    def _flush_touched(self):
+        """把攒下的 last_used 写回磁盘（不提交），需持有 self._lock。"""
+        self._last_touch_flush = time.monotonic()
+        if self._touched:
+            self._disk.executemany("UPDATE sql_cache SET last_used = ? WHERE key = ?",
+                                   [(last_used, key) for key, last_used in self._touched.items()])
+            self._touched.clear()
+
+    def get(self, question, table_schema=None, model=""):
+        """
+        查询缓存。
+
+        返回:
+            str: 缓存的 SQL，未命中或已过期返回 None。
+        """
+        key = self.make_key(question, table_schema, model)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[1], now):
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    self._touch(key, now)
+                    return entry[0]
+                del self._memory[key]
+                self._stats['expired'] += 1
+
+            if self._disk is not None:
+                row = self._disk.execute("SELECT sql, created_at FROM sql_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    if not self._expired(row[1], now):
+                        self._remember(key, row[0], row[1])
+                        self._touch(key, now)
+                        self._stats['disk_hits'] += 1
+                        return row[0]
+                    self._disk.execute("DELETE FROM sql_cache WHERE key = ?", (key,))
+                    self._disk.commit()
+                    self._touched.pop(key, None)
+                    self._stats['expired'] += 1
+
+            self._stats['misses'] += 1
+            return None
+
+    def put(self, question, sql, table_schema=None, model=""):
+        """写入缓存，仅应写入已通过校验的 SQL。"""
+        key = self.make_key(question, table_schema, model)
+        now = time.time()
+        with self._lock:
+            self._remember(key, sql, now)
+            self._stats['puts'] += 1
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO sql_cache (key, question, sql, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (key, question, sql, now, now)
+                )
+                # 超过容量时淘汰最久未使用的条目，淘汰前先写回攒下的使用时间
+                self._touched.pop(key, None)
+                self._flush_touched()
+                self._disk.execute(
+                    "DELETE FROM sql_cache WHERE key IN "
+                    "(SELECT key FROM sql_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_disk_entries,)
+                )
+                self._disk.commit()
+
+    def discard(self, question, table_schema=None, model=""):
+        """删除条目，用于缓存的 SQL 执行失败等情况。"""
+        key = self.make_key(question, table_schema, model)
+        with self._lock:
+            self._memory.pop(key, None)
+            self._touched.pop(key, None)
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM sql_cache WHERE key = ?", (key,))
+                self._disk.commit()
+
+    def clear(self):
+        """清空内存与磁盘缓存。"""
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM sql_cache")
+                self._disk.commit()
+
+    def stats(self):
+        """
+        返回缓存统计信息。
+
+        返回:
+            dict: 各级命中次数、未命中次数、命中率和当前条目数。
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+            if self._disk is not None:
+                stats['disk_entries'] = self._disk.execute("SELECT COUNT(*) FROM sql_cache").fetchone()[0]
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def close(self):
+        """写回未保存的使用时间并关闭磁盘缓存，之后只使用内存层。"""
+        with self._lock:
+            if self._disk is None:
+                return
+            try:
+                self._flush_touched()
+                self._disk.commit()
+            except sqlite3.Error as e:
+                logger.warning("写回SQL缓存使用时间失败: %s", e)
+            self._disk.close()
+            self._disk = None
+
+
+_shared_sql_cache = None
+_shared_sql_cache_lock = threading.Lock()
+
+
+def get_sql_cache():
+    """
+    获取进程内共享的 SQL 缓存，首次调用时根据配置创建。
+
+    返回:
+        SQLCache: 共享缓存；配置中 enabled 为 False 时返回 None。
+    """
+    global _shared_sql_cache
+    with _shared_sql_cache_lock:
+        if _shared_sql_cache is None:
+            config = get_section("model_config.yaml", "sql_cache", DEFAULT_SQL_CACHE_CONFIG)
+            if not config['enabled']:
+                return None
+            disk_path = config['disk_path']
+            if disk_path and not os.path.isabs(disk_path):
+                disk_path = os.path.join(PROJECT_ROOT, disk_path)
+            _shared_sql_cache = SQLCache(
+                memory_size=config['memory_size'],
+                disk_path=disk_path,
+                max_disk_entries=config['max_disk_entries'],
+                ttl=config['ttl'],
+            )
+            atexit.register(_shared_sql_cache.close)
+        return _shared_sql_cache
@@ -0,0 +1,425 @@
+import re
+import time
+import threading
+from collections import OrderedDict, namedtuple
+from utils.logger import logger
+from utils.config import get_section
+
+logger.debug("Initializing sql_guard module")
+
+# SQL 安全检查默认配置，可在 db_config.yaml 的 sql_guard 节中覆盖
+DEFAULT_SQL_GUARD_CONFIG = {
+    'max_rows': 10000,              # 查询最多返回的行数：没有 LIMIT 时加上，超过时收紧，0 表示不限制
+    'max_explain_rows': 1000000,    # EXPLAIN 估计扫描行数的上限，0 表示不执行 EXPLAIN
+    'downgrade_rows': 100,          # 超过扫描上限的简单查询（可以提前结束扫描）降级为只取这么多行，0 表示直接拒绝
+    'max_execution_time': 30,       # 为 SELECT 加上 MAX_EXECUTION_TIME 提示（秒），0 表示不加
+    'cache_size': 512,              # 解析结果的缓存条目数
+    'explain_ttl': 300,             # EXPLAIN 估计值的缓存时间（秒），0 表示不缓存
+}
+
+# 词法单元：类型、文本、在原始 SQL 中的起止位置、所在括号层数
+Token = namedtuple("Token", ["kind", "value", "start", "end", "depth"])
+
+# 解析结果：语句类型、引用的表、顶层 LIMIT 的行数及其在原始 SQL 中的位置、
+# 最后一个有效词法单元的结束位置（其后只有分号和注释）、是否可以提前结束扫描
+ParsedSQL = namedtuple("ParsedSQL", ["statement", "tables", "limit", "limit_span", "end", "streamable"])
+
+# 检查结果：改写后的 SQL、语句类型、生效的顶层 LIMIT、LIMIT 是否由检查加上或收紧、
+# EXPLAIN 估计的扫描行数（未执行或无法估计时为 None）、是否因超过扫描上限被降级
+GuardedSQL = namedtuple("GuardedSQL", ["sql", "statement", "limit", "limited", "explain_rows", "downgraded"])
+
+_TOKEN_RE = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<comment>--(?=\s|$)[^\n]*|\#[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+  | (?P<quoted>`(?:[^`]|``)*`)
+  | (?P<number>(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?)
+  | (?P<word>[^\W\d]\w*)
+  | (?P<variable>@@?[\w.$]*)
+  | (?P<placeholder>%s|\?)
+  | (?P<op><=>|<=|>=|<>|!=|:=|\|\||&&|<<|>>|[-+*/%=<>!~^&|(),.;:])
+""", re.X | re.S)
+
+# 允许的语句；只有查询语句会被加上 LIMIT 并执行 EXPLAIN
+READ_ONLY_STATEMENTS = ("SELECT", "WITH", "SHOW", "DESCRIBE", "DESC")
+LIMITABLE_STATEMENTS = ("SELECT", "WITH")
+
+# 出现在语句任意位置都表示写操作、加锁或导出文件的关键字（后面紧跟括号时是同名函数，如 REPLACE()）
+FORBIDDEN_KEYWORDS = frozenset((
+    "INSERT", "UPDATE", "DELETE", "REPLACE", "MERGE", "DROP", "ALTER", "CREATE", "TRUNCATE", "RENAME",
+    "GRANT", "REVOKE", "LOCK", "UNLOCK", "INTO", "CALL", "HANDLER", "LOAD", "OUTFILE", "DUMPFILE",
+))
+
+# 会长时间占用连接、读取服务器文件或持有锁的函数
+FORBIDDEN_FUNCTIONS = frozenset(("SLEEP", "BENCHMARK", "LOAD_FILE", "GET_LOCK", "RELEASE_LOCK", "RELEASE_ALL_LOCKS"))
+
+# 出现在语句（包括子查询）中时查询必须读完全部匹配行才能返回（LIMIT 不能提前结束扫描）
+_BLOCKING_KEYWORDS = frozenset(("ORDER", "GROUP", "DISTINCT", "HAVING", "UNION", "WINDOW", "OVER"))
+_AGGREGATE_FUNCTIONS = frozenset(("COUNT", "SUM", "AVG", "MIN", "MAX", "GROUP_CONCAT", "STD", "STDDEV", "VARIANCE"))
+
+_LITERAL_KINDS = ("string", "number")
+
+
+class SQLGuardError(ValueError):
+    """SQL 无法解析或未通过安全检查。"""
+
+
+def tokenize(sql):
+    """
+    将 SQL 切分为词法单元（不含空白和注释），关键字统一为大写。
+
+    参数:
+        sql (str): SQL 语句。
+
+    返回:
+        list: Token 列表。
+
+    抛出:
+        SQLGuardError: 如果包含无法识别的字符、未闭合的字符串或注释，括号不匹配，
+            或包含 MySQL 会执行其内容的 /*! */ 注释、/*+ */ 优化器提示。
+    """
+    tokens = []
+    depth = 0
+    position = 0
+    while position < len(sql):
+        match = _TOKEN_RE.match(sql, position)
+        if match is None:
+            raise SQLGuardError(f"SQL 无法解析：第 {position + 1} 个字符附近 {sql[position:position + 20]!r}")
+        kind = match.lastgroup
+        value = match.group()
+        position = match.end()
+        # MySQL 会执行 /*! ... */ 中的内容并解释 /*+ ... */ 提示，不能当作注释跳过；
+        # 检查通过后由 SQLGuard 自己加上执行时间提示
+        if kind == "comment" and value.startswith(("/*!", "/*+")):
+            raise SQLGuardError(f"不允许可执行注释或优化器提示 {value[:20]}")
+        if kind in ("space", "comment"):
+            continue
+        if kind == "word":
+            value = value.upper()
+        if value == ")":
+            depth -= 1
+            if depth < 0:
+                raise SQLGuardError("SQL 的括号不匹配")
+        tokens.append(Token(kind, value, match.start(), match.end(), depth))
+        if value == "(":
+            depth += 1
+    if depth:
+        raise SQLGuardError("SQL 的括号不匹配")
+    return tokens
+
+
+def _is_call(tokens, index):
+    """判断第 index 个单词是否为函数调用（后面紧跟左括号）。"""
+    return index + 1 < len(tokens) and tokens[index + 1].value == "("
+
+
+def _parse_limit(tokens, index):
+    """
+    解析顶层 LIMIT 子句：LIMIT n、LIMIT offset, n 或 LIMIT n OFFSET m。
+
+    返回:
+        Token: 表示返回行数的数字。
+    """
+    following = tokens[index + 1:index + 4]
+    if following and following[0].kind == "number":
+        if len(following) >= 3 and following[1].value == "," and following[2].kind == "number":
+            return following[2]
+        if following[0].value.isdigit():
+            return following[0]
+    raise SQLGuardError("无法解析 LIMIT 子句")
+
+
+def parse_sql(sql):
+    """
+    解析 SQL 并做静态检查：只允许单条只读语句，拒绝写操作、加锁读、导出文件、变量赋值、
+    长时间占用连接的函数和恒真条件（如 OR '1'='1'）。
+
+    参数:
+        sql (str): SQL 语句。
+
+    返回:
+        ParsedSQL: 解析结果。
+
+    抛出:
+        SQLGuardError: 如果无法解析或未通过检查。
+    """
+    tokens = tokenize(sql or "")
+    while tokens and tokens[-1].value == ";":
+        tokens.pop()
+    if not tokens:
+        raise SQLGuardError("SQL 为空")
+    if any(token.value == ";" for token in tokens):
+        raise SQLGuardError("只允许执行单条语句")
+
+    first_word = next((token for token in tokens if token.kind == "word"), None)
+    statement = first_word.value if first_word is not None else None
+    if statement not in READ_ONLY_STATEMENTS or any(token.value != "(" for token in tokens[:tokens.index(first_word)]):
+        raise SQLGuardError(f"只允许查询语句，收到的是 {statement or tokens[0].value}")
+
+    tables = []
+    limit_token = None
+    streamable = statement == "SELECT"
+    for index, token in enumerate(tokens):
+        if token.value == ":=":
+            raise SQLGuardError("不允许在查询中给变量赋值")
+        if token.kind != "word":
+            continue
+        word = token.value
+        if word in FORBIDDEN_KEYWORDS and not _is_call(tokens, index):
+            raise SQLGuardError(f"不允许的关键字 {word}")
+        if word in FORBIDDEN_FUNCTIONS and _is_call(tokens, index):
+            raise SQLGuardError(f"不允许调用函数 {word}()")
+        following = tokens[index + 1] if index + 1 < len(tokens) else None
+        if word == "FOR" and following is not None and following.value == "SHARE":
+            raise SQLGuardError("不允许加锁读")
+        if word == "OR" and index + 3 < len(tokens):
+            left, operator, right = tokens[index + 1:index + 4]
+            if (operator.value == "=" and left.kind in _LITERAL_KINDS and right.kind in _LITERAL_KINDS
+                    and left.value.strip("'\"") == right.value.strip("'\"")):
+                raise SQLGuardError("检测到恒真条件，疑似注入")
+        if word in ("FROM", "JOIN") and following is not None and following.kind in ("word", "quoted"):
+            tables.append(following.value.strip("`"))
+        if word == "LIMIT" and token.depth == 0:
+            limit_token = _parse_limit(tokens, index)
+        # 子查询（如派生表）中的排序、分组和聚合同样需要先读完全部匹配行
+        elif word in _BLOCKING_KEYWORDS or (word in _AGGREGATE_FUNCTIONS and _is_call(tokens, index)):
+            streamable = False
+
+    return ParsedSQL(
+        statement=statement,
+        tables=tuple(dict.fromkeys(tables)),
+        limit=int(limit_token.value) if limit_token is not None else None,
+        limit_span=(limit_token.start, limit_token.end) if limit_token is not None else None,
+        end=tokens[-1].end,
+        streamable=streamable,
+    )
+
+
+def estimate_explain_rows(rows):
+    """
+    根据 MySQL EXPLAIN 的输出估计扫描行数：同一查询块（id 相同）内的表按嵌套循环连接相乘，各查询块相加。
+
+    参数:
+        rows (list): EXPLAIN 的结果，每行为包含 id 和 rows 的字典。
+
+    返回:
+        int: 估计的扫描行数；输出中没有 rows 列时返回 None。
+    """
+    blocks = {}
+    for row in rows or ():
+        estimate = row.get('rows')
+        if estimate is None:
+            continue
+        blocks[row.get('id')] = blocks.get(row.get('id'), 1) * max(int(estimate), 1)
+    return sum(blocks.values()) if blocks else None
+
+
+class SQLGuard:
+    """
+    执行模型生成的 SQL 之前的安全检查。
+
+    1. 解析（结果按 SQL 文本缓存）：只允许单条只读语句，拒绝写操作、加锁读、导出文件和注入特征；
+    2. 限制返回行数：查询没有顶层 LIMIT 时加上 LIMIT max_rows，超过时收紧（都多取一行，用于判断结果是否被截断）；
+    3. 估计扫描行数：执行 EXPLAIN（估计值短时间缓存），超过 max_explain_rows 时，
+       可以提前结束扫描的简单查询降级为只取 downgrade_rows 行，其余查询拒绝执行；
+    4. 为 SELECT 加上 MAX_EXECUTION_TIME 提示，由 MySQL 服务端中止超时的查询。
+
+    属性:
+        max_rows (int): 查询最多返回的行数。
+        max_explain_rows (int): EXPLAIN 估计扫描行数的上限。
+        downgrade_rows (int): 降级后的行数。
+        max_execution_time (float): 查询的最长执行时间（秒）。
+
+    方法:
+        parse: 解析并做静态检查
+        check: 完整检查并返回改写后的 SQL
+        stats: 返回解析缓存命中率、拒绝和降级次数等统计信息
+    """
+
+    def __init__(self, max_rows=10000, max_explain_rows=1000000, downgrade_rows=100, max_execution_time=30,
+                 cache_size=512, explain_ttl=300):
+        self.max_rows = max_rows
+        self.max_explain_rows = max_explain_rows
+        self.downgrade_rows = downgrade_rows
+        self.max_execution_time = max_execution_time
+        self.cache_size = cache_size
+        self.explain_ttl = explain_ttl
+        self._parsed = OrderedDict()    # SQL -> ParsedSQL 或 SQLGuardError
+        self._explained = OrderedDict()  # 改写后的 SQL -> (估计行数, 时间)
+        self._lock = threading.Lock()
+        self._stats = {
+            'parses': 0, 'parse_cache_hits': 0, 'rejected': 0, 'limited': 0, 'downgraded': 0,
+            'explains': 0, 'explain_cache_hits': 0, 'explain_failures': 0,
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _remember(self, cache, key, value):
+        with self._lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > self.cache_size:
+                cache.popitem(last=False)
+
+    def parse(self, sql):
+        """
+        解析并做静态检查，相同的 SQL 只解析一次（包括检查失败的结果）。
+
+        参数:
+            sql (str): SQL 语句。
+
+        返回:
+            ParsedSQL: 解析结果。
+
+        抛出:
+            SQLGuardError: 如果无法解析或未通过检查。
+        """
+        with self._lock:
+            result = self._parsed.get(sql)
+            if result is not None:
+                self._parsed.move_to_end(sql)
+                self._stats['parse_cache_hits'] += 1
+        if result is None:
+            self._count('parses')
+            try:
+                result = parse_sql(sql)
+            except SQLGuardError as e:
+                result = e
+            self._remember(self._parsed, sql, result)
+        if isinstance(result, SQLGuardError):
+            self._count('rejected')
+            raise result
+        return result
+
+    def rewrite(self, sql, parsed, limit):
+        """
+        按解析结果改写 SQL：去掉结尾的分号和注释，查询语句的顶层 LIMIT 不超过 limit，SELECT 加上执行时间提示。
+        由此加上或收紧的 LIMIT 多取一行（limit + 1），调用方读到第 limit + 1 行时才说明结果被截断。
+
+        参数:
+            sql (str): 原始 SQL。
+            parsed (ParsedSQL): 解析结果。
+            limit (int): 行数上限，<= 0 表示不限制。
+
+        返回:
+            str: 改写后的 SQL。
+        """
+        rewritten = sql[:parsed.end]
+        if parsed.statement in LIMITABLE_STATEMENTS and limit > 0:
+            if parsed.limit is None:
+                rewritten = f"{rewritten} LIMIT {limit + 1}"
+            elif parsed.limit > limit:
+                start, end = parsed.limit_span
+                rewritten = f"{rewritten[:start]}{limit + 1}{rewritten[end:]}"
+        stripped = rewritten.lstrip()
+        if (self.max_execution_time > 0 and parsed.statement == "SELECT"
+                and stripped[:6].upper() == "SELECT"):
+            offset = len(rewritten) - len(stripped) + 6
+            hint = f" /*+ MAX_EXECUTION_TIME({int(self.max_execution_time * 1000)}) */"
+            rewritten = rewritten[:offset] + hint + rewritten[offset:]
+        return rewritten
+
+    def _estimate(self, sql, explain):
+        """执行 EXPLAIN 估计扫描行数，估计值缓存 explain_ttl 秒；EXPLAIN 失败或无法估计时返回 None。"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._explained.get(sql)
+        if cached is not None and now - cached[1] < self.explain_ttl:
+            self._count('explain_cache_hits')
+            return cached[0]
+        self._count('explains')
+        try:
+            estimate = estimate_explain_rows(explain(sql))
+        except Exception as e:
+            # EXPLAIN 不可用（如权限不足）时不阻止查询，仍有 LIMIT 和执行时间提示兜底
+            self._count('explain_failures')
+            logger.warning("EXPLAIN 失败，跳过扫描行数检查: %s", e)
+            return None
+        if self.explain_ttl > 0:
+            self._remember(self._explained, sql, (estimate, now))
+        return estimate
+
+    def check(self, sql, explain=None):
+        """
+        完整检查：解析、限制返回行数、估计扫描行数，返回可以执行的 SQL。
+
+        参数:
+            sql (str): 模型生成的 SQL。
+            explain (callable, optional): 执行 EXPLAIN 的函数，参数为 SQL，返回 EXPLAIN 的结果行；
+                为 None 时跳过扫描行数检查。
+
+        返回:
+            GuardedSQL: 改写后的 SQL 及检查结果。
+
+        抛出:
+            SQLGuardError: 如果未通过检查，或估计扫描行数超过上限且无法降级。
+        """
+        parsed = self.parse(sql)
+        limitable = parsed.statement in LIMITABLE_STATEMENTS
+        limit = parsed.limit
+        limited = False
+        if limitable and self.max_rows > 0 and (limit is None or limit > self.max_rows):
+            limit, limited = self.max_rows, True
+        guarded = self.rewrite(sql, parsed, self.max_rows)
+
+        estimate = None
+        downgraded = False
+        if limitable and explain is not None and self.max_explain_rows > 0:
+            estimate = self._estimate(guarded, explain)
+            if estimate is not None and estimate > self.max_explain_rows:
+                if not parsed.streamable or self.downgrade_rows <= 0:
+                    self._count('rejected')
+                    raise SQLGuardError(
+                        f"预计扫描约 {estimate} 行，超过上限 {self.max_explain_rows} 行，请缩小查询范围（如增加筛选条件）"
+                    )
+                limit = min(limit or self.downgrade_rows, self.downgrade_rows)
+                guarded = self.rewrite(sql, parsed, limit)
+                # 原有 LIMIT 已不超过降级行数时 SQL 不变，结果不会因降级而不完整
+                limited = limited or parsed.limit is None or parsed.limit > limit
+                downgraded = True
+                self._count('downgraded')
+                logger.warning("预计扫描约 %s 行，超过上限 %s 行，降级为只取 %s 行", estimate, self.max_explain_rows, limit)
+        if limited:
+            self._count('limited')
+        return GuardedSQL(guarded, parsed.statement, limit if limitable else None, limited, estimate, downgraded)
+
+    def stats(self):
+        """
+        返回统计信息。
+
+        返回:
+            dict: 解析次数、解析缓存命中数和命中率、拒绝/收紧 LIMIT/降级次数、EXPLAIN 次数和缓存命中数。
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['parses'] + stats['parse_cache_hits']
+        stats['parse_hit_rate'] = stats['parse_cache_hits'] / lookups if lookups else 0.0
+        return stats
+
+
+_shared_guard = None
+_shared_guard_lock = threading.Lock()
+
+
+def get_sql_guard():
+    """
+    获取进程内共享的 SQL 安全检查，首次调用时根据 db_config.yaml 的 sql_guard 节创建。
+
+    返回:
+        SQLGuard: 共享实例。
+    """
+    global _shared_guard
+    with _shared_guard_lock:
+        if _shared_guard is None:
+            config = get_section("db_config.yaml", "sql_guard", DEFAULT_SQL_GUARD_CONFIG)
+            _shared_guard = SQLGuard(
+                max_rows=config['max_rows'],
+                max_explain_rows=config['max_explain_rows'],
+                downgrade_rows=config['downgrade_rows'],
+                max_execution_time=config['max_execution_time'],
+                cache_size=config['cache_size'],
+                explain_ttl=config['explain_ttl'],
+            )
+        return _shared_guard
@@ -0,0 +1,496 @@
+import os
+import json
+import time
+import queue
+import uuid
+import atexit
+import threading
+import contextvars
+from contextlib import contextmanager
+from utils.logger import logger, register_context_field
+from utils.config import get_section
+from utils.sql_cache import PROJECT_ROOT
+
+logger.debug("Initializing tracing module")
+
+# 追踪与指标导出默认配置，可在 config/model_config.yaml 的 tracing 节中覆盖
+DEFAULT_TRACING_CONFIG = {
+    'enabled': True,
+    'jsonl_path': 'logs/traces.jsonl',       # 每个结束的 span 写一行 JSON，为空则不写
+    'prometheus_path': 'logs/metrics.prom',  # Prometheus 文本格式的指标文件，为空则不写
+    'export_interval': 15,                   # 指标文件的最短刷新间隔（秒）
+    'buckets': [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60],  # 耗时直方图的桶上界（秒）
+}
+
+# 当前请求编号和当前 span，随 asyncio 任务和 asyncio.to_thread 自动传递
+_request_id = contextvars.ContextVar("request_id", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def current_request_id():
+    """返回当前请求编号，不在请求内时返回 None。"""
+    return _request_id.get()
+
+
+# 请求内的每条日志都带上请求编号
+register_context_field("request_id", current_request_id)
+
+
+def bind_context(func):
+    """
+    让 func 在当前上下文（请求编号、当前 span）中执行，用于提交到线程池的任务。
+
+    参数:
+        func (callable): 要执行的函数。
+
+    返回:
+        callable: 包装后的函数。
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+    return run
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels) + "}"
+
+
+class Span:
+    """
+    一个计时区间，如一次大模型调用或一次 SQL 查询。
+
+    属性:
+        name (str): 阶段名，如 "llm.sql"、"db.query"。
+        request_id (str): 所属请求编号。
+        span_id (str): span 编号。
+        parent_id (str): 父 span 编号，顶层 span 为 None。
+        attributes (dict): 附加信息，如提示词长度、行数、是否命中缓存。
+        duration (float): 耗时（秒），结束前为 None。
+        error (str): 出错时的异常信息。
+
+    方法:
+        set: 设置附加信息
+        fail: 在不抛出异常的情况下将 span 标记为失败
+        end: 结束 span 并交给 tracer 汇总和导出
+    """
+
+    __slots__ = ('tracer', 'name', 'request_id', 'span_id', 'parent_id', 'attributes',
+                 'started_at', 'duration', 'error', '_start')
+
+    def __init__(self, tracer, name, request_id, parent_id, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.request_id = request_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.started_at = time.time()
+        self.duration = None
+        self.error = None
+        self._start = time.perf_counter()
+
+    def set(self, **attributes):
+        """设置附加信息，返回自身。"""
+        self.attributes.update(attributes)
+        return self
+
+    def fail(self, reason):
+        """将 span 标记为失败（用于以返回值而不是异常表示失败的调用），返回自身。"""
+        self.error = str(reason)
+        return self
+
+    def end(self, error=None):
+        """
+        结束 span，重复调用无效。
+
+        参数:
+            error (BaseException | str, optional): 导致 span 失败的异常或原因。
+        """
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._start
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}" if isinstance(error, BaseException) else str(error)
+        self.tracer._finish(self)
+
+    def to_dict(self):
+        record = {
+            'ts': round(self.started_at, 6),
+            'request_id': self.request_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'duration_ms': round(self.duration * 1000, 3) if self.duration is not None else None,
+            'status': 'error' if self.error else 'ok',
+        }
+        if self.error:
+            record['error'] = self.error
+        record.update(self.attributes)
+        return record
+
+
+class _NoopSpan:
+    """追踪关闭时使用的空 span。"""
+
+    name = request_id = span_id = parent_id = error = duration = None
+    attributes = {}
+
+    def set(self, **attributes):
+        return self
+
+    def fail(self, reason):
+        return self
+
+    def end(self, error=None):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+# 通知后台写出线程结束的标记
+_STOP = object()
+
+
+class Tracer:
+    """
+    轻量的追踪与指标汇总：span 计时、请求编号、按阶段的耗时直方图和事件计数。
+
+    每个结束的 span 以一行 JSON 追加到 jsonl_path；按阶段汇总的指标
+    （耗时直方图、出错数、数值型附加信息的累计值、count 记录的事件数）
+    以 Prometheus 文本格式写入 prometheus_path（可由 node_exporter 的 textfile collector 采集，
+    用 histogram_quantile 计算 p95），至多每 export_interval 秒刷新一次，进程退出时再刷新一次。
+    业务线程结束 span 时只在锁内更新内存中的汇总并把记录放入队列，
+    序列化和写文件都由后台线程完成。
+
+    属性:
+        enabled (bool): 是否启用，关闭时所有操作都是空操作。
+        buckets (tuple): 耗时直方图的桶上界（秒）。
+
+    方法:
+        request: 开始一个请求（生成请求编号并创建根 span）
+        span: 以上下文管理器方式创建子 span
+        start_span: 创建 span 但不设为当前 span（用于生成器等跨越调用方的区间）
+        current_span: 返回当前 span
+        count: 记录一次事件（如缓存命中）
+        snapshot: 返回按阶段汇总的指标
+        render_prometheus: 生成 Prometheus 文本格式的指标
+        flush: 立即写出指标文件
+    """
+
+    def __init__(self, enabled=True, jsonl_path=None, prometheus_path=None, export_interval=15, buckets=None):
+        self.enabled = enabled
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.export_interval = export_interval
+        self.buckets = tuple(sorted(buckets or DEFAULT_TRACING_CONFIG['buckets']))
+        self._lock = threading.Lock()
+        self._stages = {}    # 阶段名 -> {count, errors, sum, buckets, attributes}
+        self._counters = {}  # (名称, 标签) -> 值
+        self._last_export = time.monotonic()
+        self._export_lock = threading.Lock()
+        # 追踪记录文件在第一个 span 结束时才打开，只构造 tracer 不会创建任何文件
+        self._jsonl = None
+        self._closed = False
+        # 待写出的追踪记录，由后台线程在第一个 span 结束时启动后写出
+        self._queue = queue.SimpleQueue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+    @contextmanager
+    def request(self, name="request", request_id=None, **attributes):
+        """
+        开始一个请求：设置请求编号并创建根 span，请求内的所有 span 都带有该编号。
+
+        参数:
+            name (str): 根 span 的阶段名。
+            request_id (str, optional): 请求编号，默认自动生成。
+            **attributes: 根 span 的附加信息。
+
+        返回:
+            Span: 根 span（with 语句的目标）。
+        """
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+        token = _request_id.set(request_id or uuid.uuid4().hex[:12])
+        try:
+            with self.span(name, **attributes) as span:
+                yield span
+        finally:
+            _request_id.reset(token)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        创建子 span 并设为当前 span，with 语句块结束时结束；块内抛出的异常会记录在 span 上并继续抛出。
+
+        参数:
+            name (str): 阶段名。
+            **attributes: 附加信息。
+
+        返回:
+            Span: 新建的 span（with 语句的目标）。
+        """
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+        span = self.start_span(name, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.end(error=e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def start_span(self, name, **attributes):
+        """
+        创建 span 但不设为当前 span，调用方负责调用 span.end()。
+
+        参数:
+            name (str): 阶段名。
+            **attributes: 附加信息。
+
+        返回:
+            Span: 新建的 span。
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        parent = _current_span.get()
+        return Span(self, name, _request_id.get(), parent.span_id if parent else None, dict(attributes))
+
+    def current_span(self):
+        """返回当前 span，不在任何 span 内时返回空 span（调用 set 无效果）。"""
+        return _current_span.get() or _NOOP_SPAN
+
+    def count(self, name, value=1, **labels):
+        """
+        记录事件计数，导出为 dqa_<name>_total 计数器。
+
+        参数:
+            name (str): 指标名，如 "cache_lookups"。
+            value (int): 增加的数量。
+            **labels: 标签，如 cache="sql", result="hit"。
+        """
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def _finish(self, span):
+        with self._lock:
+            stage = self._stages.get(span.name)
+            if stage is None:
+                stage = self._stages[span.name] = {
+                    'count': 0, 'errors': 0, 'sum': 0.0, 'buckets': [0] * len(self.buckets), 'attributes': {},
+                }
+            stage['count'] += 1
+            stage['errors'] += 1 if span.error else 0
+            stage['sum'] += span.duration
+            for index, bound in enumerate(self.buckets):
+                if span.duration <= bound:
+                    stage['buckets'][index] += 1
+            for key, value in span.attributes.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    stage['attributes'][key] = stage['attributes'].get(key, 0) + value
+        if self._closed or not (self.jsonl_path or self.prometheus_path):
+            return
+        self._start_writer()
+        if self.jsonl_path:
+            self._queue.put(span.to_dict())
+
+    def _start_writer(self):
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None and not self._closed:
+                self._writer = threading.Thread(target=self._write_loop, name="tracer-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        """后台线程：批量写出追踪记录，并按 export_interval 刷新指标文件，收到结束标记时返回。"""
+        while True:
+            timeout = None
+            if self.prometheus_path:
+                timeout = max(self._last_export + self.export_interval - time.monotonic(), 0)
+            try:
+                records = [self._queue.get(timeout=timeout)]
+            except queue.Empty:
+                records = []
+            # 一次取出队列中已有的全部记录，只 flush 一次文件
+            while records and records[-1] is not _STOP:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = bool(records) and records[-1] is _STOP
+            self._write_records([record for record in records if record is not _STOP])
+            if stop:
+                return
+            if self.prometheus_path and time.monotonic() - self._last_export >= self.export_interval:
+                self.flush()
+
+    def _write_records(self, records):
+        if not records or not self.jsonl_path:
+            return
+        if self._jsonl is None:
+            try:
+                self._jsonl = _open_for_append(self.jsonl_path)
+            except OSError as e:
+                logger.warning("打开追踪记录文件失败: %s", e)
+                self.jsonl_path = None
+                return
+        try:
+            self._jsonl.write("".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records))
+            self._jsonl.flush()
+        except (OSError, ValueError) as e:
+            logger.warning("写入追踪记录失败: %s", e)
+
+    def snapshot(self):
+        """
+        返回按阶段汇总的指标。
+
+        返回:
+            dict: stages（{阶段名: {count, errors, sum, buckets, attributes}}）和 counters（{(名称, 标签): 值}）。
+        """
+        with self._lock:
+            stages = {
+                name: dict(stage, buckets=list(stage['buckets']), attributes=dict(stage['attributes']))
+                for name, stage in self._stages.items()
+            }
+            return {'stages': stages, 'counters': dict(self._counters)}
+
+    def render_prometheus(self):
+        """
+        生成 Prometheus 文本格式的指标。
+
+        返回:
+            str: 指标文本。
+        """
+        snapshot = self.snapshot()
+        stages = sorted(snapshot['stages'].items())
+        lines = [
+            "# HELP dqa_stage_duration_seconds 各阶段耗时",
+            "# TYPE dqa_stage_duration_seconds histogram",
+        ]
+        for name, stage in stages:
+            for bound, count in zip(self.buckets, stage['buckets']):
+                lines.append(f"dqa_stage_duration_seconds_bucket{_format_labels([('stage', name), ('le', bound)])} {count}")
+            lines.append(f"dqa_stage_duration_seconds_bucket{_format_labels([('stage', name), ('le', '+Inf')])} {stage['count']}")
+            lines.append(f"dqa_stage_duration_seconds_sum{_format_labels([('stage', name)])} {stage['sum']:.6f}")
+            lines.append(f"dqa_stage_duration_seconds_count{_format_labels([('stage', name)])} {stage['count']}")
+        lines.extend(["# HELP dqa_stage_errors_total 各阶段出错次数", "# TYPE dqa_stage_errors_total counter"])
+        for name, stage in stages:
+            lines.append(f"dqa_stage_errors_total{_format_labels([('stage', name)])} {stage['errors']}")
+        lines.extend([
+            "# HELP dqa_stage_attribute_total 各阶段数值型附加信息的累计值（提示词长度、行数等）",
+            "# TYPE dqa_stage_attribute_total counter",
+        ])
+        for name, stage in stages:
+            for key, value in sorted(stage['attributes'].items()):
+                lines.append(f"dqa_stage_attribute_total{_format_labels([('stage', name), ('attribute', key)])} {value}")
+        metrics = {}
+        for (name, labels), value in snapshot['counters'].items():
+            metrics.setdefault(name, []).append((labels, value))
+        for name, series in sorted(metrics.items()):
+            lines.append(f"# TYPE dqa_{name}_total counter")
+            for labels, value in sorted(series):
+                lines.append(f"dqa_{name}_total{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self, blocking=True):
+        """
+        写出指标文件（先写临时文件再替换，采集方不会读到写了一半的文件）。
+
+        参数:
+            blocking (bool): 为 False 时若其他线程正在写出则直接返回。
+        """
+        if not self.enabled or not self.prometheus_path:
+            return
+        with self._lock:
+            # 没有记录过任何指标（如只构造了组件就退出）时不写文件
+            if not self._stages and not self._counters:
+                return
+        if not self._export_lock.acquire(blocking=blocking):
+            return
+        try:
+            self._last_export = time.monotonic()
+            os.makedirs(os.path.dirname(self.prometheus_path) or '.', exist_ok=True)
+            temp_path = f"{self.prometheus_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                file.write(self.render_prometheus())
+            os.replace(temp_path, self.prometheus_path)
+        except OSError as e:
+            logger.warning("写出指标文件失败: %s", e)
+        finally:
+            self._export_lock.release()
+
+    def close(self, timeout=5):
+        """
+        等待后台线程写完队列中的追踪记录，写出指标文件并关闭追踪记录文件。
+
+        参数:
+            timeout (float): 等待后台线程的最长时间（秒）。
+        """
+        with self._writer_lock:
+            self._closed = True
+            writer = self._writer
+        if writer is not None:
+            self._queue.put(_STOP)
+            writer.join(timeout)
+        self.flush()
+        if writer is None or not writer.is_alive():
+            if self._jsonl is not None:
+                self._jsonl.close()
+                self._jsonl = None
+
+
+def _open_for_append(path):
+    """以追加方式打开文件，目录不存在时先创建。"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return open(path, 'a', encoding='utf-8')
+
+
+_shared_tracer = None
+_shared_tracer_lock = threading.Lock()
+
+
+def _resolve_path(path):
+    if path and not os.path.isabs(path):
+        return os.path.join(PROJECT_ROOT, path)
+    return path
+
+
+def get_tracer():
+    """
+    获取进程内共享的 tracer，首次调用时根据配置创建，并在进程退出时写出指标。
+
+    返回:
+        Tracer: 共享 tracer；配置中 enabled 为 False 时返回一个空操作的 tracer。
+    """
+    global _shared_tracer
+    with _shared_tracer_lock:
+        if _shared_tracer is None:
+            config = get_section("model_config.yaml", "tracing", DEFAULT_TRACING_CONFIG)
+            _shared_tracer = Tracer(
+                enabled=config['enabled'],
+                jsonl_path=_resolve_path(config['jsonl_path']),
+                prometheus_path=_resolve_path(config['prometheus_path']),
+                export_interval=config['export_interval'],
+                buckets=config['buckets'],
+            )
+            atexit.register(_shared_tracer.close)
+        return _shared_tracer
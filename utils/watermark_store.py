@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import sqlite3
+import datetime
+import threading
+from decimal import Decimal
+from utils.logger import logger
+from utils.config import get_section
+from utils.sql_cache import PROJECT_ROOT
+
+logger.debug("Initializing watermark_store module")
+
+# 增量校验水位线的默认存储位置，可在 db_config.yaml 的 rule_executor 节中覆盖
+DEFAULT_WATERMARK_PATH = 'cache/rule_watermarks.sqlite3'
+
+
+def encode_watermark(value):
+    """将水位线值（整数、小数、日期、时间、字符串）编码为可持久化的 JSON 字符串。"""
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        return json.dumps({'type': 'datetime', 'value': value.isoformat()})
+    if isinstance(value, datetime.date):
+        return json.dumps({'type': 'date', 'value': value.isoformat()})
+    if isinstance(value, Decimal):
+        return json.dumps({'type': 'decimal', 'value': str(value)})
+    if isinstance(value, (int, float, str)):
+        return json.dumps({'type': 'plain', 'value': value})
+    raise ValueError(f"不支持的水位线类型: {type(value).__name__}")
+
+
+def decode_watermark(text):
+    """encode_watermark 的逆操作。"""
+    if text is None:
+        return None
+    data = json.loads(text)
+    if data['type'] == 'datetime':
+        return datetime.datetime.fromisoformat(data['value'])
+    if data['type'] == 'date':
+        return datetime.date.fromisoformat(data['value'])
+    if data['type'] == 'decimal':
+        return Decimal(data['value'])
+    return data['value']
+
+
+class WatermarkStore:
+    """
+    增量规则校验的持久化状态：每条规则的水位线和累计违规数，保存在 SQLite 中。
+
+    属性:
+        path (str): SQLite 文件路径，为 ":memory:" 时只保存在内存中。
+
+    方法:
+        get: 读取规则的水位线状态
+        put: 写入规则的水位线状态
+        reset: 清除规则状态，下次执行时重新建立基线
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if path != ':memory:':
+            directory = os.path.dirname(path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rule_watermarks ("
+            "rule_id TEXT PRIMARY KEY, table_name TEXT, watermark_column TEXT, watermark TEXT, "
+            "violations INTEGER, rows_checked INTEGER, rule_fingerprint TEXT, updated_at REAL, baseline_at REAL)"
+        )
+        # 旧版本创建的存储没有 baseline_at 列
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(rule_watermarks)")}
+        if 'baseline_at' not in columns:
+            self._db.execute("ALTER TABLE rule_watermarks ADD COLUMN baseline_at REAL")
+        self._db.commit()
+
+    def get(self, rule_id):
+        """
+        读取规则的水位线状态。
+
+        参数:
+            rule_id (str): 规则标识符。
+
+        返回:
+            dict: watermark_column、watermark、violations、rows_checked、rule_fingerprint、updated_at、baseline_at；
+                  没有记录时返回 None。
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT watermark_column, watermark, violations, rows_checked, rule_fingerprint, updated_at, baseline_at "
+                "FROM rule_watermarks WHERE rule_id = ?",
+                (rule_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'watermark_column': row[0],
+            'watermark': decode_watermark(row[1]),
+            'violations': row[2],
+            'rows_checked': row[3],
+            'rule_fingerprint': row[4],
+            'updated_at': row[5],
+            'baseline_at': row[6],
+        }
+
+    def put(self, rule_id, table_name, watermark_column, watermark, violations, rows_checked, rule_fingerprint,
+            baseline_at=None):
+        """
+        写入规则的水位线状态。
+
+        参数:
+            rule_id (str): 规则标识符。
+            table_name (str): 规则所在的表。
+            watermark_column (str): 水位线列。
+            watermark: 已检查到的最大水位线值。
+            violations (int): 截至该水位线的累计违规数。
+            rows_checked (int): 截至该水位线的累计检查行数。
+            rule_fingerprint (str): 规则定义指纹，规则变化后需要重新建立基线。
+            baseline_at (float, optional): 最近一次全量建立基线的时间（时间戳）。
+        """
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO rule_watermarks "
+                "(rule_id, table_name, watermark_column, watermark, violations, rows_checked, rule_fingerprint, updated_at, baseline_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (rule_id, table_name, watermark_column, encode_watermark(watermark),
+                 violations, rows_checked, rule_fingerprint, time.time(), baseline_at)
+            )
+            self._db.commit()
+
+    def reset(self, rule_ids=None):
+        """
+        清除规则状态。
+
+        参数:
+            rule_ids (list, optional): 需要清除的规则编号，默认清除全部。
+        """
+        with self._lock:
+            if rule_ids is None:
+                self._db.execute("DELETE FROM rule_watermarks")
+            else:
+                self._db.executemany("DELETE FROM rule_watermarks WHERE rule_id = ?", [(rule_id,) for rule_id in rule_ids])
+            self._db.commit()
+
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+
+def get_watermark_store():
+    """
+    获取进程内共享的水位线存储，首次调用时根据配置创建。
+
+    返回:
+        WatermarkStore: 共享存储。
+    """
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            config = get_section("db_config.yaml", "rule_executor", {'watermark_path': DEFAULT_WATERMARK_PATH})
+            path = config.get('watermark_path') or DEFAULT_WATERMARK_PATH
+            if path != ':memory:' and not os.path.isabs(path):
+                path = os.path.join(PROJECT_ROOT, path)
+            _shared_store = WatermarkStore(path)
+        return _shared_store